@@ -5,8 +5,11 @@ import pandas as pd
 from dateutil import parser as dateutil_parser
 from typing import Any, Dict
 from sqlalchemy import text
-from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
+from app.utils.bd import insertar_lotes_con_respaldo, insertar_multifila
+from app.utils.normalizacion import a_valor_python, normalizar_enteros, normalizar_fechas
+from core.cache import marcar_modificadas
 
 logger = logging.getLogger(__name__)
 logging.getLogger("sqlalchemy").setLevel(logging.INFO)
@@ -128,6 +131,7 @@ def insertar_datos_en_bd(db: Session, df_programas, df):
 
     Se asume que el router ya renombró columnas.
     """
+    marcar_modificadas(db, "programas_formacion", "grupos")
     programas_insertados = 0
     programas_actualizados = 0
     grupos_insertados = 0
@@ -223,186 +227,129 @@ def insertar_datos_en_bd(db: Session, df_programas, df):
         "mensaje": "Carga completada con errores" if errores else "Carga completada exitosamente"
     }
 
-# insertar_estado_normas
 
-def insertar_estado_normas(db: Session, df_normas):
+# Columnas de estado_de_normas en el orden del INSERT
+COLUMNAS_ESTADO_NORMAS = [
+    "cod_programa", "cod_version", "fecha_elaboracion", "anio", "red_conocimiento",
+    "nombre_ncl", "cod_ncl", "ncl_version", "norma_corte_noviembre",
+    "version", "norma_version", "mesa_sectorial", "tipo_norma",
+    "observacion", "fecha_revision", "tipo_competencia", "vigencia", "fecha_indice",
+]
+
+# Nombres alternativos con los que puede llegar cada columna
+ALIAS_ESTADO_NORMAS = {
+    "cod_programa": ("cod_programa", "COD PROGRAMA"),
+    "cod_version": ("cod_version", "CODIGO VERSION"),
+    "fecha_elaboracion": ("fecha_elaboracion", "Fecha Elaboracion", "FECHA ELABORACION"),
+    "anio": ("anio", "Año", "ANIO"),
+    "red_conocimiento": ("red_conocimiento", "RED CONOCIMIENTO"),
+    "nombre_ncl": ("nombre_ncl", "NOMBRE_NCL", "NOMBRE NCL"),
+    "cod_ncl": ("cod_ncl", "NCL CODIGO", "NCL_CODIGO"),
+    "ncl_version": ("ncl_version", "NCL VERSION", "NCL_VERSION"),
+    "norma_corte_noviembre": ("norma_corte_noviembre", "Norma corte a NOVIEMBRE"),
+    "version": ("version", "Versión", "VERSION"),
+    "norma_version": ("norma_version", "Norma - Versión", "NORMA - VERSION"),
+    "mesa_sectorial": ("mesa_sectorial", "Mesa Sectorial"),
+    "tipo_norma": ("tipo_norma", "Tipo de Norma"),
+    "observacion": ("observacion", "Observación", "OBSERVACION"),
+    "fecha_revision": ("fecha_revision", "Fecha de revisión", "FECHA DE REVISION"),
+    "tipo_competencia": ("tipo_competencia", "Tipo de competencia"),
+    "vigencia": ("vigencia", "Vigencia"),
+    "fecha_indice": ("fecha_elaboracion_2", "Fecha de Elaboración"),
+}
+
+COLUMNAS_FECHA_ESTADO_NORMAS = ("fecha_elaboracion", "fecha_revision", "fecha_indice")
+COLUMNAS_ENTERAS_ESTADO_NORMAS = ("anio", "cod_ncl", "ncl_version")
+
+
+def _columna_estado_normas(df: pd.DataFrame, destino: str) -> pd.Series:
+    """Devuelve la primera columna del DataFrame que corresponde a `destino` (o una serie vacía)."""
+    for alias in ALIAS_ESTADO_NORMAS[destino]:
+        if alias in df.columns:
+            columna = df[alias]
+            # Encabezados repetidos devuelven un DataFrame; usar la primera aparición
+            return columna.iloc[:, 0] if isinstance(columna, pd.DataFrame) else columna
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+
+def _mapear_objeto(columna: pd.Series, funcion) -> pd.Series:
+    """Aplica `funcion` a cada valor conservando dtype object (evita que int + None se vuelva float)."""
+    return pd.Series([funcion(v) for v in columna], index=columna.index, dtype=object)
+
+
+def normalizar_estado_normas(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Inserta registros en la tabla estado_de_normas desde un DataFrame.
-    El router ya renombra las columnas, aquí solo se insertan los valores.
+    Normaliza de una vez todas las filas de un DataFrame de estado de normas.
+    Devuelve un DataFrame con exactamente `COLUMNAS_ESTADO_NORMAS` y valores listos para el INSERT.
     """
+    datos = pd.DataFrame(index=df.index)
+    for destino in COLUMNAS_ESTADO_NORMAS:
+        columna = _columna_estado_normas(df, destino)
+        if destino in COLUMNAS_FECHA_ESTADO_NORMAS:
+            datos[destino] = normalizar_fechas(columna)
+        elif destino in COLUMNAS_ENTERAS_ESTADO_NORMAS:
+            datos[destino] = _mapear_objeto(normalizar_enteros(columna, extraer_digitos=True), a_valor_python)
+        else:
+            datos[destino] = _mapear_objeto(columna, _safe_val)
+
+    # Si no se obtuvo `fecha_elaboracion`, usar la segunda columna alternativa
+    datos["fecha_elaboracion"] = datos["fecha_elaboracion"].where(
+        datos["fecha_elaboracion"].notna(), datos["fecha_indice"]
+    )
+    # Truncar campos que puedan exceder el tamaño de la columna
+    datos["nombre_ncl"] = _mapear_objeto(datos["nombre_ncl"], lambda v: v[:150] if isinstance(v, str) else v)
+    return datos.where(datos.notna(), None)
+
+
+def insertar_estado_normas_lote(db: Session, df_normas: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Inserta todas las filas de un DataFrame en estado_de_normas en una sola transacción.
 
-    insert_sql = text("""
-        INSERT INTO estado_de_normas (
-            cod_programa, cod_version, fecha_elaboracion, anio, red_conocimiento,
-            nombre_ncl, cod_ncl, ncl_version, norma_corte_noviembre,
-            version, norma_version, mesa_sectorial, tipo_norma,
-            observacion, fecha_revision, tipo_competencia, vigencia, fecha_indice
-        ) VALUES (
-            :cod_programa, :cod_version, :fecha_elaboracion, :anio, :red_conocimiento,
-            :nombre_ncl, :cod_ncl, :ncl_version, :norma_corte_noviembre,
-            :version, :norma_version, :mesa_sectorial, :tipo_norma,
-            :observacion, :fecha_revision, :tipo_competencia, :vigencia, :fecha_indice
-        )
-    """)
-
-    insertados = 0
+    Los programas que no existen se crean como placeholder con un único
+    INSERT IGNORE multi-fila y las normas se cargan con INSERT multi-fila por
+    lotes. Si un lote falla sus filas se reintentan una a una para reportar el
+    error de cada fila. El número de fila reportado es `índice + 1`.
+    """
+    marcar_modificadas(db, "estado_de_normas", "programas_formacion")
     errores = []
-
-    # Aceptar tanto Series como dicts
-    if hasattr(df_normas, "to_dict"):
-        row = df_normas.to_dict()
-    elif isinstance(df_normas, dict):
-        row = df_normas
-    else:
-        # intentar convertir
-        try:
-            row = dict(df_normas)
-        except Exception:
-            row = {}
-
-    def _get(r, *keys):
-        for k in keys:
-            if k in r:
-                return r[k]
-        return None
-
-    # Normalizar y parsear los valores esperados
     try:
-        cod_programa_raw = _get(row, 'cod_programa', 'COD PROGRAMA', 'cod_programa')
-        cod_programa = _safe_val(cod_programa_raw)
-
-        cod_version = _safe_val(_get(row, 'cod_version', 'CODIGO VERSION', 'cod_version'))
-        fecha_elaboracion = _parse_date(_get(row, 'fecha_elaboracion', 'Fecha Elaboracion', 'FECHA ELABORACION'))
-        anio = _to_int_safe(_safe_val(_get(row, 'anio', 'Año', 'ANIO')))
-        red_conocimiento = _safe_val(_get(row, 'red_conocimiento', 'RED CONOCIMIENTO'))
-        nombre_ncl = _safe_val(_get(row, 'nombre_ncl', 'NOMBRE_NCL', 'NOMBRE NCL'))
-        cod_ncl = _to_int_safe(_safe_val(_get(row, 'cod_ncl', 'NCL CODIGO', 'NCL_CODIGO')))
-        ncl_version = _to_int_safe(_safe_val(_get(row, 'ncl_version', 'NCL VERSION', 'NCL_VERSION')))
-        norma_corte_noviembre = _safe_val(_get(row, 'norma_corte_noviembre', 'Norma corte a NOVIEMBRE'))
-        version = _safe_val(_get(row, 'version', 'Versión', 'VERSION'))
-        norma_version = _safe_val(_get(row, 'norma_version', 'Norma - Versión', 'NORMA - VERSION'))
-        mesa_sectorial = _safe_val(_get(row, 'mesa_sectorial', 'Mesa Sectorial'))
-        tipo_norma = _safe_val(_get(row, 'tipo_norma', 'Tipo de Norma'))
-        observacion = _safe_val(_get(row, 'observacion', 'Observación', 'OBSERVACION'))
-        fecha_revision = _parse_date(_get(row, 'fecha_revision', 'Fecha de revisión', 'FECHA DE REVISION'))
-        tipo_competencia = _safe_val(_get(row, 'tipo_competencia', 'Tipo de competencia'))
-        vigencia = _safe_val(_get(row, 'vigencia', 'Vigencia'))
-        fecha_indice = _parse_date(_get(row, 'fecha_elaboracion_2', 'Fecha de Elaboración', 'fecha_elaboracion_2'))
-
-        # Si no se obtuvo `fecha_elaboracion`, intentar usar la segunda columna alternativa
-        if fecha_elaboracion is None and fecha_indice is not None:
-            fecha_elaboracion = fecha_indice
-        # Permitir NULL en fecha_elaboracion; no rechazar la fila por falta de fecha
-
-        data = {
-            "cod_programa": cod_programa,
-            "cod_version": cod_version,
-            "fecha_elaboracion": fecha_elaboracion,
-            "anio": anio,
-            "red_conocimiento": red_conocimiento,
-            "nombre_ncl": nombre_ncl,
-            "cod_ncl": cod_ncl,
-            "ncl_version": ncl_version,
-            "norma_corte_noviembre": norma_corte_noviembre,
-            "version": version,
-            "norma_version": norma_version,
-            "mesa_sectorial": mesa_sectorial,
-            "tipo_norma": tipo_norma,
-            "observacion": observacion,
-            "fecha_revision": fecha_revision,
-            "tipo_competencia": tipo_competencia,
-            "vigencia": vigencia,
-            "fecha_indice": fecha_indice,
+        datos = normalizar_estado_normas(df_normas)
+    except Exception as e:
+        logger.exception(f"Error preparando datos de estado de normas: {e}")
+        return {
+            "mensaje": "Carga finalizada",
+            "registros_cargados": 0,
+            "errores": [{"fila": None, "error_prepare": str(e)}],
         }
 
-        # Ejecutar INSERT
+    filas = datos.to_dict("records")
+    etiquetas = [idx + 1 for idx in datos.index]
+
+    # Asegurar que existan los programas en `programas_formacion` (una sola sentencia)
+    codigos = sorted({str(f["cod_programa"]) for f in filas if f["cod_programa"] is not None})
+    if codigos:
         try:
-            # Truncar campos que puedan exceder el tamaño de la columna
-            if data.get("nombre_ncl") and isinstance(data.get("nombre_ncl"), str):
-                data["nombre_ncl"] = data["nombre_ncl"][:150]
-
-            # Asegurar que exista el programa en `programas_formacion` para no violar la FK
-            cp = data.get("cod_programa")
-            if cp is not None:
-                try:
-                    placeholder_sql_pre = text("""
-                        INSERT IGNORE INTO programas_formacion (cod_programa, nombre_programa, estado)
-                        VALUES (:cod_programa, :nombre_programa, :estado)
-                    """)
-                    php = {
-                        "cod_programa": str(cp),
-                        "nombre_programa": f"AUTO-CREATED {cp}",
-                        "estado": True
-                    }
-                    db.execute(placeholder_sql_pre, php)
-                except Exception as e_ph_pre:
-                    logger.warning(f"No se pudo crear placeholder previo para programa {cp}: {e_ph_pre}")
-
-            db.execute(insert_sql, data)
-            insertados += 1
-        except IntegrityError as ie:
-            # IntegrityError, intentar crear placeholder en programas_formacion si es FK faltante
-            errstr = str(ie.__dict__.get('orig') or ie)
-            logger.warning(f"IntegrityError al insertar norma: {errstr}; intentando crear placeholder de programa")
-            try:
-                # Tras un IntegrityError la transacción puede quedar en estado erróneo; hacer rollback antes.
-                try:
-                    db.rollback()
-                except Exception:
-                    pass
-                # Preparar código de programa como string
-                cp = data.get("cod_programa")
-                if cp is None:
-                    raise Exception("cod_programa ausente, no se puede crear placeholder")
-                cod_prog_str = str(cp)
-                placeholder_sql = text("""
-                    INSERT IGNORE INTO programas_formacion (
-                        cod_programa, nombre_programa, nivel_formacion, estado
-                    ) VALUES (
-                        :cod_programa, :nombre_programa, :nivel_formacion, :estado
-                    )
-                """)
-                ph_data = {
-                    "cod_programa": cod_prog_str,
-                    "nombre_programa": f"AUTO-CREATED {cod_prog_str}",
-                    "nivel_formacion": data.get("nivel_formacion") or None,
-                    "estado": True
-                }
-                db.execute(placeholder_sql, ph_data)
-                db.commit()
-                # Reintentar la inserción
-                try:
-                    db.execute(insert_sql, data)
-                    insertados += 1
-                except SQLAlchemyError as e2:
-                    db.rollback()
-                    err2 = str(e2.__dict__.get('orig') or e2)
-                    errores.append({"error": err2})
-                    logger.exception(f"Error insertando norma tras crear placeholder: {err2}")
-            except Exception as e_ph:
-                db.rollback()
-                errph = str(e_ph)
-                errores.append({"error": errstr})
-                logger.exception(f"No se pudo crear placeholder para programa: {errph}")
+            with db.begin_nested():
+                insertar_multifila(
+                    db,
+                    "programas_formacion",
+                    ["cod_programa", "nombre_programa", "estado"],
+                    [{"cod_programa": cp, "nombre_programa": f"AUTO-CREATED {cp}", "estado": True} for cp in codigos],
+                    prefijo="INSERT IGNORE INTO",
+                )
         except SQLAlchemyError as e:
-            db.rollback()
-            errstr = str(e.__dict__.get('orig') or e)
-            errores.append({"error": errstr})
-            logger.exception(f"Error insertando norma en fila: {errstr}")
+            logger.warning(f"No se pudieron crear los programas placeholder: {e}")
 
-    except Exception as e:
-        # error al preparar datos
-        errstr = str(e)
-        errores.append({"error_prepare": errstr})
-        logger.exception(f"Error preparando datos para insertar norma: {errstr}")
+    resultado = insertar_lotes_con_respaldo(db, "estado_de_normas", COLUMNAS_ESTADO_NORMAS, filas, etiquetas)
+    errores.extend(resultado["errores"])
+    insertados = resultado["insertados"]
 
-    # Confirmar la transacción
     try:
         db.commit()
-
     except SQLAlchemyError as e:
         db.rollback()
-        errores.append({"error_commit": str(e)})
+        insertados = 0
+        errores.append({"fila": None, "error_commit": str(e)})
         logger.exception("Error al confirmar la transacción")
 
     return {
@@ -410,4 +357,3 @@ def insertar_estado_normas(db: Session, df_normas):
         "registros_cargados": insertados,
         "errores": errores
     }
-
@@ -3,11 +3,16 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 import logging
 import pandas as pd
+from app.utils.bd import upsert_por_prefetch
+from core.cache import marcar_modificadas
 
 logger = logging.getLogger(__name__)
 
+CATALOGO_COLUMNAS = ["cod_catalogo", "nombre_catalogo", "descripcion", "estado"]
+
 
 def insertar_catalogo_programas(db: Session, df_programas):
+    marcar_modificadas(db, "programas_formacion")
     programas_insertados = 0
     programas_actualizados = 0
     errores = []
@@ -124,6 +129,7 @@ def insertar_datos_en_bd(db: Session, df_catalogos: pd.DataFrame):
     - nombre_catalogo
     Opcionalmente acepta: descripcion, estado.
     """
+    marcar_modificadas(db, "catalogo")
     if df_catalogos is None or df_catalogos.empty:
         return {
             "insertados": 0,
@@ -132,63 +138,43 @@ def insertar_datos_en_bd(db: Session, df_catalogos: pd.DataFrame):
             "mensaje": "No hay datos para procesar"
         }
 
-    insertados = 0
-    actualizados = 0
     errores = []
-
-    select_sql = text("""
-        SELECT id_catalogo
-        FROM catalogo
-        WHERE cod_catalogo = :cod_catalogo
-    """)
-
-    insert_sql = text("""
-        INSERT INTO catalogo (
-            nombre_catalogo, descripcion, cod_catalogo, estado
-        ) VALUES (
-            :nombre_catalogo, :descripcion, :cod_catalogo, :estado
-        )
-    """)
-
-    update_sql = text("""
-        UPDATE catalogo
-        SET nombre_catalogo = :nombre_catalogo,
-            descripcion = :descripcion,
-            estado = :estado
-        WHERE cod_catalogo = :cod_catalogo
-    """)
+    filas = []
+    etiquetas = []
 
     for idx, row in df_catalogos.iterrows():
-        try:
-            cod_catalogo = row.get("cod_catalogo")
-            nombre_catalogo = row.get("nombre_catalogo")
-
-            if pd.isna(cod_catalogo) or cod_catalogo == "":
-                errores.append(f"Fila {idx}: 'cod_catalogo' es obligatorio")
-                continue
-
-            if pd.isna(nombre_catalogo) or nombre_catalogo == "":
-                errores.append(f"Fila {idx}: 'nombre_catalogo' es obligatorio")
-                continue
-
-            params = {
-                "cod_catalogo": str(cod_catalogo).strip(),
-                "nombre_catalogo": str(nombre_catalogo).strip(),
-                "descripcion": str(row.get("descripcion")).strip() if pd.notna(row.get("descripcion")) else None,
-                "estado": bool(row.get("estado")) if not pd.isna(row.get("estado")) else True
-            }
-
-            existente = db.execute(select_sql, {"cod_catalogo": params["cod_catalogo"]}).first()
-            if existente:
-                db.execute(update_sql, params)
-                actualizados += 1
-            else:
-                db.execute(insert_sql, params)
-                insertados += 1
-        except SQLAlchemyError as e:
-            msg = f"Error al procesar fila {idx} (cod_catalogo={row.get('cod_catalogo')}): {str(e)}"
-            errores.append(msg)
-            logger.error(msg)
+        cod_catalogo = row.get("cod_catalogo")
+        nombre_catalogo = row.get("nombre_catalogo")
+
+        if pd.isna(cod_catalogo) or cod_catalogo == "":
+            errores.append(f"Fila {idx}: 'cod_catalogo' es obligatorio")
+            continue
+
+        if pd.isna(nombre_catalogo) or nombre_catalogo == "":
+            errores.append(f"Fila {idx}: 'nombre_catalogo' es obligatorio")
+            continue
+
+        filas.append({
+            "cod_catalogo": str(cod_catalogo).strip(),
+            "nombre_catalogo": str(nombre_catalogo).strip(),
+            "descripcion": str(row.get("descripcion")).strip() if pd.notna(row.get("descripcion")) else None,
+            "estado": bool(row.get("estado")) if not pd.isna(row.get("estado")) else True
+        })
+        etiquetas.append(idx)
+
+    # Claves existentes en una sola consulta; inserciones y actualizaciones por lotes
+    resultado = upsert_por_prefetch(
+        db,
+        "catalogo",
+        "cod_catalogo",
+        CATALOGO_COLUMNAS,
+        filas,
+        etiquetas=etiquetas,
+    )
+    for error in resultado["errores"]:
+        msg = f"Error al procesar fila {error['fila']}: {error['error']}"
+        errores.append(msg)
+        logger.error(msg)
 
     try:
         db.commit()
@@ -197,8 +183,8 @@ def insertar_datos_en_bd(db: Session, df_catalogos: pd.DataFrame):
         errores.append(f"Error al confirmar la transacción: {str(e)}")
 
     return {
-        "insertados": insertados,
-        "actualizados": actualizados,
+        "insertados": resultado["insertados"],
+        "actualizados": resultado["actualizados"],
         "errores": errores,
         "mensaje": "Carga completada con errores" if errores else "Carga completada exitosamente"
     }
@@ -210,6 +196,7 @@ def insertar_municipios(db: Session, df_municipios: pd.DataFrame):
     El DataFrame debe incluir las columnas `cod_municipio` y
     `nombre` o `nombre_municipio`.
     """
+    marcar_modificadas(db, "municipios")
     if df_municipios is None or df_municipios.empty:
         return {
             "insertados": 0,
@@ -3,6 +3,18 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 import logging
 import pandas as pd
+from app.utils.bd import (
+    cargar_con_load_data,
+    consultar_claves_existentes,
+    dividir_en_lotes,
+    insertar_lotes_con_respaldo,
+    insertar_multifila,
+    local_infile_habilitado,
+    registros_a_parametros,
+)
+from app.crud.resumenes import claves_afectadas, refrescar_resumenes
+from core.cache import marcar_modificadas
+from core.config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -23,22 +35,45 @@ HISTORICO_COLUMNAS = [
     "num_aprendices_trasladados",
 ]
 
-def insertar_historico_completo_en_bd(db: Session, df_completo):
+# Columnas de grupos que se cargan desde el Excel de histórico
+GRUPOS_COLUMNAS = [
+    "ficha", "cod_programa", "cod_centro", "modalidad", "jornada", "etapa_ficha",
+    "estado_curso", "fecha_inicio", "fecha_fin", "cod_municipio", "cod_estrategia",
+    "nombre_responsable", "cupo_asignado", "num_aprendices_fem", "num_aprendices_mas",
+    "num_aprendices_nobin", "num_aprendices_matriculados", "num_aprendices_activos",
+    "tipo_doc_empresa", "num_doc_empresa", "nombre_empresa",
+]
+
+# Columnas que actualiza actualizar_grupos_desde_df cuando el grupo ya existe
+GRUPOS_COLUMNAS_ACTUALIZABLES = [
+    "cod_programa", "cod_centro", "modalidad", "jornada", "estado_curso",
+    "fecha_inicio", "fecha_fin", "cod_municipio", "cod_estrategia", "num_aprendices_matriculados",
+]
+
+
+def insertar_historico_completo_en_bd(db: Session, df_completo, fichas_reemplazadas=None, claves_resumenes=None):
     """
     Inserta/actualiza grupos e histórico desde un archivo Excel completo.
     
     Lógica:
     1. Compara con la tabla grupos usando el id (ficha)
-    2. Si el grupo existe: solo actualiza el histórico usando id_grupo
+    2. Si el grupo existe: reemplaza su histórico (se borran sus filas y se insertan las del archivo)
     3. Si el grupo NO existe: crea el grupo completo y luego el histórico
     
     Args:
         db: Sesión de SQLAlchemy
         df_completo: DataFrame con datos de grupos e histórico
+        fichas_reemplazadas: Fichas cuyo histórico ya se reemplazó en bloques
+            anteriores de la misma carga (no se vuelven a borrar); se le agregan
+            las fichas de este bloque
+        claves_resumenes: Si se indica ({nombre: claves}), se le suman las claves
+            anteriores de las fichas y los resúmenes no se recalculan aquí: el
+            llamador lo hace una sola vez con `refrescar_resumenes_historico`
         
     Returns:
         dict: Resumen de la operación con contadores y errores
     """
+    marcar_modificadas(db, "historico", "grupos", "programas_formacion", "centros_formacion", "municipios", "estrategia")
     registros_historico_insertados = 0
     registros_historico_actualizados = 0
     grupos_creados = 0
@@ -49,42 +84,68 @@ def insertar_historico_completo_en_bd(db: Session, df_completo):
     errores = []
 
     try:
-        fichas = df_completo["ficha"].unique().tolist()
-        query_grupos_existentes = text("""
-            SELECT ficha 
-            FROM grupos 
-            WHERE ficha IN :fichas
-        """)
-        result = db.execute(query_grupos_existentes, {"fichas": tuple(fichas)})
-        fichas_existentes = {row.ficha for row in result}
+        fichas = [int(f) for f in df_completo["ficha"].dropna().unique().tolist()]
+        fichas_existentes = consultar_claves_existentes(db, "grupos", "ficha", fichas)
 
         df_con_grupo = df_completo[df_completo["ficha"].isin(fichas_existentes)].copy()
         df_sin_grupo = df_completo[~df_completo["ficha"].isin(fichas_existentes)].copy()
 
         logger.info(f"Registros con grupo existente: {len(df_con_grupo)}, sin grupo: {len(df_sin_grupo)}")
 
+        # Programa/centro/municipio/mes actuales de las fichas existentes: si la carga
+        # los cambia, también hay que recalcular el resumen de la clave anterior
+        claves_previas = claves_afectadas(db, fichas_existentes)
+
+        # `historico` no tiene clave única por id_grupo: el histórico anterior de
+        # cada ficha se borra en la misma transacción en que se inserta el nuevo
+        if fichas_reemplazadas is None:
+            fichas_reemplazadas = set()
+        fichas_a_reemplazar = fichas_existentes - fichas_reemplazadas
+
         programas_creados, centros_creados, municipios_creados, estrategias_creadas, errores_aux = \
             crear_dependencias_grupos(db, df_completo)
         errores.extend(errores_aux)
 
-        if len(df_sin_grupo) > 0:
-            grupos_creados, errores_aux = crear_grupos_desde_df(db, df_sin_grupo)
-            errores.extend(errores_aux)
+        # Carga por tabla temporal + LOAD DATA si está habilitada; si falla se usa la ruta normal
+        resultado_staging = None
+        if settings.HISTORICO_LOAD_DATA and local_infile_habilitado(db):
+            resultado_staging = cargar_grupos_historico_por_staging(
+                db, df_completo, fichas_existentes, fichas_a_reemplazar
+            )
 
-        if len(df_con_grupo) > 0:
-            actualizados_grupos, errores_aux = actualizar_grupos_desde_df(db, df_con_grupo)
+        if resultado_staging is not None:
+            grupos_creados = resultado_staging["grupos_creados"]
+            actualizados_grupos = resultado_staging["grupos_actualizados"]
+            registros_historico_insertados = resultado_staging["historico_insertados"]
+            registros_historico_actualizados = resultado_staging["historico_actualizados"]
+            registros_historico_descartados = 0
+        else:
+            if len(df_sin_grupo) > 0:
+                grupos_creados, errores_aux = crear_grupos_desde_df(db, df_sin_grupo)
+                errores.extend(errores_aux)
+
+            if len(df_con_grupo) > 0:
+                actualizados_grupos, errores_aux = actualizar_grupos_desde_df(db, df_con_grupo)
+                errores.extend(errores_aux)
+
+            (
+                registros_historico_insertados,
+                registros_historico_actualizados,
+                registros_historico_descartados,
+                errores_aux,
+            ) = \
+                insertar_actualizar_historico(db, df_completo, fichas_a_reemplazar)
             errores.extend(errores_aux)
-
-        (
-            registros_historico_insertados,
-            registros_historico_actualizados,
-            registros_historico_descartados,
-            errores_aux,
-        ) = \
-            insertar_actualizar_historico(db, df_completo)
-        errores.extend(errores_aux)
         # Commit de la transacción
         db.commit()
+        fichas_reemplazadas.update(fichas)
+
+        if claves_resumenes is None:
+            resumenes_recalculados = refrescar_resumenes_historico(db, fichas, claves_previas)
+        else:
+            for nombre, valores in claves_previas.items():
+                claves_resumenes.setdefault(nombre, set()).update(valores)
+            resumenes_recalculados = 0
         
         logger.info(
             f"Carga completa - Grupos creados: {grupos_creados}, "
@@ -110,6 +171,7 @@ def insertar_historico_completo_en_bd(db: Session, df_completo):
         "centros_creados": centros_creados,
         "municipios_creados": municipios_creados,
         "estrategias_creadas": estrategias_creadas,
+        "resumenes_recalculados": resumenes_recalculados,
         "total_errores": len(errores),
         "errores": errores,
         "exitoso": len(errores) == 0,
@@ -117,6 +179,52 @@ def insertar_historico_completo_en_bd(db: Session, df_completo):
     }
 
 
+def refrescar_resumenes_historico(db: Session, fichas, claves_previas):
+    """
+    Recalcula las tablas resumen solo para las claves de las fichas cargadas
+    (las actuales y las de `claves_previas`, anteriores a la carga).
+    Un fallo aquí no invalida la carga (ya confirmada): se registra y los
+    resúmenes se pueden reconstruir con /admin/summaries/rebuild.
+    """
+    try:
+        claves = claves_afectadas(db, fichas)
+        for nombre, valores in claves_previas.items():
+            claves[nombre] |= valores
+        return refrescar_resumenes(db, claves)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.warning(f"No se pudieron actualizar los resúmenes del histórico: {e}")
+        return 0
+
+
+def _upsert_dimension(db: Session, tabla, clave, filas, update_clause, etiqueta):
+    """
+    Crea/actualiza filas de una tabla dimensión de forma set-based.
+
+    Un SELECT ... IN obtiene las claves ya existentes y un INSERT multi-fila con
+    ON DUPLICATE KEY UPDATE (por lotes) crea las nuevas y completa las existentes.
+
+    Returns:
+        tuple: (número de filas creadas, lista de errores)
+    """
+    if not filas:
+        return 0, []
+
+    existentes = consultar_claves_existentes(db, tabla, clave, [f[clave] for f in filas])
+    columnas = list(filas[0].keys())
+    sufijo = f"ON DUPLICATE KEY UPDATE {update_clause}"
+    resultado = insertar_lotes_con_respaldo(
+        db, tabla, columnas, filas, etiquetas=[f[clave] for f in filas], sufijo=sufijo
+    )
+
+    fallidas = {e["fila"] for e in resultado["errores"]}
+    creadas = sum(1 for f in filas if f[clave] not in existentes and f[clave] not in fallidas)
+    errores = [
+        f"Error al crear {etiqueta} ({clave}: {e['fila']}): {e['error']}" for e in resultado["errores"]
+    ]
+    return creadas, errores
+
+
 def crear_dependencias_grupos(db: Session, df):
     """Crea programas, centros, municipios y estrategias si no existen"""
     programas_creados = 0
@@ -127,284 +235,136 @@ def crear_dependencias_grupos(db: Session, df):
     
     # 1. Crear programas de formación
     if "cod_programa" in df.columns:
-        cols_programa = ["cod_programa"]
-        if "version" in df.columns:
-            cols_programa.append("version")
-        if "nombre_programa" in df.columns:
-            cols_programa.append("nombre_programa")
-        if "nivel" in df.columns:
-            cols_programa.append("nivel")
-        
-        df_programas = df[cols_programa].drop_duplicates()
-        df_programas = df_programas.dropna(subset=["cod_programa"])
-        
-        insert_programa_sql = text("""
-            INSERT INTO programas_formacion (
-                cod_programa, cod_version, nombre_programa, nivel_formacion
-            ) VALUES (
-                :cod_programa, :cod_version, :nombre_programa, :nivel_formacion
-            )
-            ON DUPLICATE KEY UPDATE
-                cod_version = COALESCE(VALUES(cod_version), cod_version),
+        df_programas = pd.DataFrame({
+            "cod_programa": df["cod_programa"],
+            "cod_version": df["version"] if "version" in df.columns else None,
+            "nombre_programa": df["nombre_programa"] if "nombre_programa" in df.columns else None,
+            "nivel_formacion": df["nivel"] if "nivel" in df.columns else None,
+        })
+        df_programas = df_programas.dropna(subset=["cod_programa"]).drop_duplicates(subset=["cod_programa"])
+        filas = registros_a_parametros(
+            df_programas, ["cod_programa", "cod_version", "nombre_programa", "nivel_formacion"]
+        )
+
+        programas_creados, errores_aux = _upsert_dimension(
+            db, "programas_formacion", "cod_programa", filas,
+            """cod_version = COALESCE(VALUES(cod_version), cod_version),
                 nombre_programa = COALESCE(VALUES(nombre_programa), nombre_programa),
-                nivel_formacion = COALESCE(VALUES(nivel_formacion), nivel_formacion)
-        """)
-        
-        for idx, row in df_programas.iterrows():
-            try:
-                params = {
-                    "cod_programa": str(row["cod_programa"]) if pd.notna(row["cod_programa"]) else None,
-                    "cod_version": str(row["version"]) if "version" in row and pd.notna(row.get("version")) else None,
-                    "nombre_programa": str(row["nombre_programa"]) if "nombre_programa" in row and pd.notna(row.get("nombre_programa")) else None,
-                    "nivel_formacion": str(row["nivel"]) if "nivel" in row and pd.notna(row.get("nivel")) else None
-                }
-                if params["cod_programa"]:
-                    result = db.execute(insert_programa_sql, params)
-                    if result.rowcount >= 0:  # Puede ser 0 si ya existe (ON DUPLICATE KEY UPDATE)
-                        programas_creados += 1
-            except SQLAlchemyError as e:
-                errores.append(f"Error al crear programa (índice {idx}, cod_programa: {row.get('cod_programa', 'N/A')}): {str(e)}")
-                logger.error(f"Error al crear programa: {e}")
+                nivel_formacion = COALESCE(VALUES(nivel_formacion), nivel_formacion)""",
+            "programa",
+        )
+        errores.extend(errores_aux)
     
     # 2. Crear/actualizar centros de formación
-    # Primero verificar si el centro existe en la BD para usar su información
+    # Los datos del Excel tienen prioridad; si faltan se conservan los de la BD (COALESCE)
     if "cod_centro" in df.columns:
-        cols_centro = ["cod_centro"]
-        if "nombre_centro" in df.columns:
-            cols_centro.append("nombre_centro")
-        if "cod_regional" in df.columns:
-            cols_centro.append("cod_regional")
-        if "nombre_regional" in df.columns:
-            cols_centro.append("nombre_regional")
-        
-        df_centros = df[cols_centro].drop_duplicates(subset=["cod_centro"])
-        df_centros = df_centros.dropna(subset=["cod_centro"])
-        
-        # Consultar centros existentes en la BD
-        cod_centros_existentes = df_centros["cod_centro"].unique().tolist()
-        query_centros_existentes = text("""
-            SELECT cod_centro, nombre_centro, cod_regional, nombre_regional
-            FROM centros_formacion
-            WHERE cod_centro IN :cod_centros
-        """)
-        
-        centros_bd = {}
-        if cod_centros_existentes:
-            try:
-                result = db.execute(query_centros_existentes, {"cod_centros": tuple(cod_centros_existentes)})
-                for row in result:
-                    centros_bd[int(row.cod_centro)] = {
-                        "nombre_centro": row.nombre_centro,
-                        "cod_regional": row.cod_regional,
-                        "nombre_regional": row.nombre_regional
-                    }
-            except SQLAlchemyError as e:
-                logger.warning(f"Error al consultar centros existentes: {e}")
-        
-        insert_centro_sql = text("""
-            INSERT INTO centros_formacion (
-                cod_centro, nombre_centro, cod_regional, nombre_regional
-            ) VALUES (
-                :cod_centro, :nombre_centro, :cod_regional, :nombre_regional
-            )
-            ON DUPLICATE KEY UPDATE
-                nombre_centro = COALESCE(VALUES(nombre_centro), nombre_centro),
+        df_centros = pd.DataFrame({
+            "cod_centro": df["cod_centro"],
+            "nombre_centro": df["nombre_centro"] if "nombre_centro" in df.columns else None,
+            "cod_regional": df["cod_regional"] if "cod_regional" in df.columns else None,
+            "nombre_regional": df["nombre_regional"] if "nombre_regional" in df.columns else None,
+        })
+        df_centros = df_centros.drop_duplicates(subset=["cod_centro"]).dropna(subset=["cod_centro"])
+        filas = [f for f in registros_a_parametros(df_centros, ["nombre_centro", "nombre_regional"]) if f["cod_centro"]]
+
+        centros_creados, errores_aux = _upsert_dimension(
+            db, "centros_formacion", "cod_centro", filas,
+            """nombre_centro = COALESCE(VALUES(nombre_centro), nombre_centro),
                 cod_regional = COALESCE(VALUES(cod_regional), cod_regional),
-                nombre_regional = COALESCE(VALUES(nombre_regional), nombre_regional)
-        """)
-        
-        for idx, row in df_centros.iterrows():
-            try:
-                cod_centro = int(row["cod_centro"]) if pd.notna(row["cod_centro"]) else None
-                if not cod_centro:
-                    continue
-                
-                # Si el centro existe en BD, usar sus datos como base
-                centro_existente = centros_bd.get(cod_centro, {})
-                
-                # Priorizar datos del Excel, pero si faltan, usar los de la BD
-                nombre_centro = str(row["nombre_centro"]) if "nombre_centro" in row and pd.notna(row.get("nombre_centro")) else centro_existente.get("nombre_centro")
-                cod_regional = int(row["cod_regional"]) if "cod_regional" in row and pd.notna(row.get("cod_regional")) else (centro_existente.get("cod_regional") if centro_existente.get("cod_regional") is not None else None)
-                nombre_regional = str(row["nombre_regional"]) if "nombre_regional" in row and pd.notna(row.get("nombre_regional")) else centro_existente.get("nombre_regional")
-                
-                params = {
-                    "cod_centro": cod_centro,
-                    "nombre_centro": nombre_centro,
-                    "cod_regional": cod_regional,
-                    "nombre_regional": nombre_regional
-                }
-                
-                result = db.execute(insert_centro_sql, params)
-                if result.rowcount == 1:
-                    centros_creados += 1
-            except (ValueError, SQLAlchemyError) as e:
-                errores.append(f"Error al crear/actualizar centro (índice {idx}, cod_centro: {row.get('cod_centro', 'N/A')}): {str(e)}")
-                logger.error(f"Error al crear/actualizar centro: {e}")
+                nombre_regional = COALESCE(VALUES(nombre_regional), nombre_regional)""",
+            "centro",
+        )
+        errores.extend(errores_aux)
     
     # 3. Crear municipios
     if "cod_municipio" in df.columns and "nombre_municipio" in df.columns:
-        df_municipios = df[["cod_municipio", "nombre_municipio"]].drop_duplicates()
-        df_municipios = df_municipios.dropna(subset=["cod_municipio"])
-        
-        insert_municipio_sql = text("""
-            INSERT INTO municipios (
-                cod_municipio, nombre
-            ) VALUES (
-                :cod_municipio, :nombre
-            )
-            ON DUPLICATE KEY UPDATE
-                nombre = COALESCE(VALUES(nombre), nombre)
-        """)
-        
-        for idx, row in df_municipios.iterrows():
-            try:
-                params = {
-                    "cod_municipio": str(row["cod_municipio"]) if pd.notna(row["cod_municipio"]) else None,
-                    "nombre": str(row["nombre_municipio"]) if pd.notna(row["nombre_municipio"]) else None
-                }
-                if params["cod_municipio"]:
-                    result = db.execute(insert_municipio_sql, params)
-                    if result.rowcount == 1:
-                        municipios_creados += 1
-            except SQLAlchemyError as e:
-                errores.append(f"Error al crear municipio (índice {idx}): {str(e)}")
-                logger.error(f"Error al crear municipio: {e}")
+        df_municipios = df[["cod_municipio", "nombre_municipio"]].dropna(subset=["cod_municipio"])
+        df_municipios = df_municipios.drop_duplicates(subset=["cod_municipio"])
+        df_municipios = df_municipios.rename(columns={"nombre_municipio": "nombre"})
+        filas = registros_a_parametros(df_municipios, ["cod_municipio", "nombre"])
+
+        municipios_creados, errores_aux = _upsert_dimension(
+            db, "municipios", "cod_municipio", filas,
+            "nombre = COALESCE(VALUES(nombre), nombre)",
+            "municipio",
+        )
+        errores.extend(errores_aux)
     
     # 4. Crear estrategias
     if "cod_estrategia" in df.columns:
-        df_estrategias = df[["cod_estrategia"]].drop_duplicates()
-        df_estrategias = df_estrategias.dropna(subset=["cod_estrategia"])
-        
-        insert_estrategia_sql = text("""
-            INSERT INTO estrategia (
-                cod_estrategia, nombre
-            ) VALUES (
-                :cod_estrategia, ''
-            )
-            ON DUPLICATE KEY UPDATE cod_estrategia = cod_estrategia
-        """)
-        
-        for idx, row in df_estrategias.iterrows():
-            try:
-                params = {
-                    "cod_estrategia": str(row["cod_estrategia"]) if pd.notna(row["cod_estrategia"]) else None
-                }
-                if params["cod_estrategia"]:
-                    result = db.execute(insert_estrategia_sql, params)
-                    if result.rowcount == 1:
-                        estrategias_creadas += 1
-            except SQLAlchemyError as e:
-                errores.append(f"Error al crear estrategia (índice {idx}): {str(e)}")
-                logger.error(f"Error al crear estrategia: {e}")
+        codigos = df["cod_estrategia"].dropna().map(str).unique().tolist()
+        filas = [{"cod_estrategia": c, "nombre": ""} for c in codigos if c]
+
+        estrategias_creadas, errores_aux = _upsert_dimension(
+            db, "estrategia", "cod_estrategia", filas,
+            "cod_estrategia = cod_estrategia",
+            "estrategia",
+        )
+        errores.extend(errores_aux)
     
     return programas_creados, centros_creados, municipios_creados, estrategias_creadas, errores
 
 
+# Columnas de grupos que se guardan como texto
+GRUPOS_COLUMNAS_TEXTO = [
+    "cod_programa", "modalidad", "jornada", "etapa_ficha", "estado_curso", "cod_municipio",
+    "cod_estrategia", "nombre_responsable", "tipo_doc_empresa", "num_doc_empresa", "nombre_empresa",
+]
+
+
+def _parametros_grupos(df, columnas):
+    """Parámetros de grupos (una fila por ficha, la primera aparición) con las columnas indicadas."""
+    datos = df.reindex(columns=columnas)
+    datos = datos[datos["ficha"].notna()].drop_duplicates(subset=["ficha"])
+    filas = registros_a_parametros(datos, GRUPOS_COLUMNAS_TEXTO)
+    return [f for f in filas if f["ficha"]]
+
+
 def crear_grupos_desde_df(db: Session, df):
-    """Crea grupos desde el DataFrame"""
-    grupos_creados = 0
-    errores = []
-    
-    insert_grupo_sql = text("""
-        INSERT INTO grupos (
-            ficha, cod_programa, cod_centro, modalidad, jornada, etapa_ficha,
-            estado_curso, fecha_inicio, fecha_fin, cod_municipio, cod_estrategia,
-            nombre_responsable, cupo_asignado, num_aprendices_fem, num_aprendices_mas,
-            num_aprendices_nobin, num_aprendices_matriculados, num_aprendices_activos,
-            tipo_doc_empresa, num_doc_empresa, nombre_empresa
-        ) VALUES (
-            :ficha, :cod_programa, :cod_centro, :modalidad, :jornada, :etapa_ficha,
-            :estado_curso, :fecha_inicio, :fecha_fin, :cod_municipio, :cod_estrategia,
-            :nombre_responsable, :cupo_asignado, :num_aprendices_fem, :num_aprendices_mas,
-            :num_aprendices_nobin, :num_aprendices_matriculados, :num_aprendices_activos,
-            :tipo_doc_empresa, :num_doc_empresa, :nombre_empresa
-        )
-    """)
-    
-    for idx, row in df.iterrows():
-        try:
-            params = {
-                "ficha": int(row["ficha"]) if "ficha" in row and pd.notna(row["ficha"]) else None,
-                "cod_programa": str(row["cod_programa"]) if "cod_programa" in row and pd.notna(row.get("cod_programa")) else None,
-                "cod_centro": int(row["cod_centro"]) if "cod_centro" in row and pd.notna(row.get("cod_centro")) else None,
-                "modalidad": str(row["modalidad"]) if "modalidad" in row and pd.notna(row.get("modalidad")) else None,
-                "jornada": str(row["jornada"]) if "jornada" in row and pd.notna(row.get("jornada")) else None,
-                "etapa_ficha": str(row["etapa_ficha"]) if "etapa_ficha" in row and pd.notna(row.get("etapa_ficha")) else None,
-                "estado_curso": str(row["estado_curso"]) if "estado_curso" in row and pd.notna(row.get("estado_curso")) else None,
-                "fecha_inicio": row.get("fecha_inicio") if "fecha_inicio" in row and pd.notna(row.get("fecha_inicio")) else None,
-                "fecha_fin": row.get("fecha_fin") if "fecha_fin" in row and pd.notna(row.get("fecha_fin")) else None,
-                "cod_municipio": str(row["cod_municipio"]) if "cod_municipio" in row and pd.notna(row.get("cod_municipio")) else None,
-                "cod_estrategia": str(row["cod_estrategia"]) if "cod_estrategia" in row and pd.notna(row.get("cod_estrategia")) else None,
-                "nombre_responsable": str(row["nombre_responsable"]) if "nombre_responsable" in row and pd.notna(row.get("nombre_responsable")) else None,
-                "cupo_asignado": int(row["cupo_asignado"]) if "cupo_asignado" in row and pd.notna(row.get("cupo_asignado")) else None,
-                "num_aprendices_fem": int(row["num_aprendices_fem"]) if "num_aprendices_fem" in row and pd.notna(row.get("num_aprendices_fem")) else None,
-                "num_aprendices_mas": int(row["num_aprendices_mas"]) if "num_aprendices_mas" in row and pd.notna(row.get("num_aprendices_mas")) else None,
-                "num_aprendices_nobin": int(row["num_aprendices_nobin"]) if "num_aprendices_nobin" in row and pd.notna(row.get("num_aprendices_nobin")) else None,
-                "num_aprendices_matriculados": int(row.get("num_aprendices_matriculados", 0)) if "num_aprendices_matriculados" in row and pd.notna(row.get("num_aprendices_matriculados")) else None,
-                "num_aprendices_activos": int(row["num_aprendices_activos"]) if "num_aprendices_activos" in row and pd.notna(row.get("num_aprendices_activos")) else None,
-                "tipo_doc_empresa": str(row["tipo_doc_empresa"]) if "tipo_doc_empresa" in row and pd.notna(row.get("tipo_doc_empresa")) else None,
-                "num_doc_empresa": str(row["num_doc_empresa"]) if "num_doc_empresa" in row and pd.notna(row.get("num_doc_empresa")) else None,
-                "nombre_empresa": str(row["nombre_empresa"]) if "nombre_empresa" in row and pd.notna(row.get("nombre_empresa")) else None
-            }
-            
-            if params["ficha"]:
-                result = db.execute(insert_grupo_sql, params)
-                if result.rowcount == 1:
-                    grupos_creados += 1
-        except SQLAlchemyError as e:
-            errores.append(f"Error al crear grupo (índice {idx}, ficha: {row.get('ficha', 'N/A')}): {str(e)}")
-            logger.error(f"Error al crear grupo: {e}")
-    
-    return grupos_creados, errores
+    """Crea grupos desde el DataFrame con INSERT multi-fila por lotes"""
+    filas = _parametros_grupos(df, GRUPOS_COLUMNAS)
+    resultado = insertar_lotes_con_respaldo(
+        db, "grupos", GRUPOS_COLUMNAS, filas, etiquetas=[f["ficha"] for f in filas]
+    )
+    errores = [f"Error al crear grupo (ficha: {e['fila']}): {e['error']}" for e in resultado["errores"]]
+    return resultado["insertados"], errores
 
 
 def actualizar_grupos_desde_df(db: Session, df):
-    actualizados = 0
-    errores = []
+    """
+    Actualiza los grupos existentes con un upsert multi-fila por lotes.
+    Solo se sobrescriben las columnas con valor en el Excel (COALESCE).
+    """
+    columnas = ["ficha"] + GRUPOS_COLUMNAS_ACTUALIZABLES
+    filas = _parametros_grupos(df, columnas)
+    update_clause = ", ".join(f"{c} = COALESCE(VALUES({c}), {c})" for c in GRUPOS_COLUMNAS_ACTUALIZABLES)
+    resultado = insertar_lotes_con_respaldo(
+        db, "grupos", columnas, filas,
+        etiquetas=[f["ficha"] for f in filas],
+        sufijo=f"ON DUPLICATE KEY UPDATE {update_clause}",
+    )
+    errores = [f"Error al actualizar grupo (ficha: {e['fila']}): {e['error']}" for e in resultado["errores"]]
+    # Igual que antes: se cuenta cada fila con grupo existente procesada sin error
+    fallidas = {e["fila"] for e in resultado["errores"]}
+    actualizados = int((df["ficha"].notna() & ~df["ficha"].isin(fallidas)).sum())
+    return actualizados, errores
 
-    update_sql = text("""
-        UPDATE grupos
-        SET
-            cod_programa = COALESCE(:cod_programa, cod_programa),
-            cod_centro = COALESCE(:cod_centro, cod_centro),
-            modalidad = COALESCE(:modalidad, modalidad),
-            jornada = COALESCE(:jornada, jornada),
-            estado_curso = COALESCE(:estado_curso, estado_curso),
-            fecha_inicio = COALESCE(:fecha_inicio, fecha_inicio),
-            fecha_fin = COALESCE(:fecha_fin, fecha_fin),
-            cod_municipio = COALESCE(:cod_municipio, cod_municipio),
-            cod_estrategia = COALESCE(:cod_estrategia, cod_estrategia),
-            num_aprendices_matriculados = COALESCE(:num_aprendices_matriculados, num_aprendices_matriculados)
-        WHERE ficha = :ficha
-    """)
-
-    for idx, row in df.iterrows():
-        try:
-            params = {
-                "ficha": int(row["ficha"]) if "ficha" in row and pd.notna(row["ficha"]) else None,
-                "cod_programa": str(row["cod_programa"]) if "cod_programa" in row and pd.notna(row.get("cod_programa")) else None,
-                "cod_centro": int(row["cod_centro"]) if "cod_centro" in row and pd.notna(row.get("cod_centro")) else None,
-                "modalidad": str(row["modalidad"]) if "modalidad" in row and pd.notna(row.get("modalidad")) else None,
-                "jornada": str(row["jornada"]) if "jornada" in row and pd.notna(row.get("jornada")) else None,
-                "estado_curso": str(row["estado_curso"]) if "estado_curso" in row and pd.notna(row.get("estado_curso")) else None,
-                "fecha_inicio": row.get("fecha_inicio") if "fecha_inicio" in row and pd.notna(row.get("fecha_inicio")) else None,
-                "fecha_fin": row.get("fecha_fin") if "fecha_fin" in row and pd.notna(row.get("fecha_fin")) else None,
-                "cod_municipio": str(row["cod_municipio"]) if "cod_municipio" in row and pd.notna(row.get("cod_municipio")) else None,
-                "cod_estrategia": str(row["cod_estrategia"]) if "cod_estrategia" in row and pd.notna(row.get("cod_estrategia")) else None,
-                "num_aprendices_matriculados": int(row.get("num_aprendices_matriculados", 0)) if "num_aprendices_matriculados" in row and pd.notna(row.get("num_aprendices_matriculados")) else None,
-            }
-            if params["ficha"]:
-                result = db.execute(update_sql, params)
-                if result.rowcount >= 0:
-                    actualizados += 1
-        except SQLAlchemyError as e:
-            errores.append(f"Error al actualizar grupo (índice {idx}, ficha: {row.get('ficha', 'N/A')}): {str(e)}")
-            logger.error(f"Error al actualizar grupo: {e}")
 
-    return actualizados, errores
+def _eliminar_historico(db: Session, fichas):
+    """Borra las filas de `historico` de `fichas` (por lotes). Devuelve cuántas se borraron."""
+    sql = text("DELETE FROM historico WHERE id_grupo IN :fichas")
+    borradas = 0
+    for lote in dividir_en_lotes(sorted(fichas)):
+        borradas += db.execute(sql, {"fichas": tuple(lote)}).rowcount or 0
+    return borradas
 
 
-def insertar_actualizar_historico(db: Session, df):
+def insertar_actualizar_historico(db: Session, df, fichas_a_reemplazar=()):
+    """
+    Inserta el histórico de `df` por lotes. Antes se borra el histórico guardado
+    de `fichas_a_reemplazar`; el borrado y las inserciones van en un SAVEPOINT,
+    así que si algo falla se conserva el histórico anterior.
+    """
     registros_insertados = 0
     registros_actualizados = 0
     registros_descartados = 0
@@ -415,32 +375,9 @@ def insertar_actualizar_historico(db: Session, df):
     chunk_size = 1000
 
     try:
-        total_afectadas = 0
-        for start in range(0, len(df), chunk_size):
-            batch = df.iloc[start:start+chunk_size]
-            values_parts = []
-            params = {}
-            for i, row in batch.iterrows():
-                idx = str(i)
-                placeholders = []
-                val_id = int(row["id_grupo"]) if "id_grupo" in row and pd.notna(row["id_grupo"]) else None
-                params[f"id_grupo_{idx}"] = val_id
-                placeholders.append(f":id_grupo_{idx}")
-                for col in HISTORICO_COLUMNAS:
-                    v = row.get(col, 0)
-                    val = int(v) if pd.notna(v) else 0
-                    params[f"{col}_{idx}"] = val
-                    placeholders.append(f":{col}_{idx}")
-                values_parts.append(f"({', '.join(placeholders)})")
-            if not values_parts:
-                continue
-            stmt = text(f"""
-                INSERT INTO historico ({', '.join(columnas)})
-                VALUES {', '.join(values_parts)}
-                ON DUPLICATE KEY UPDATE {update_clause}
-            """)
-            result = db.execute(stmt, params)
-            total_afectadas += result.rowcount or 0
+        with db.begin_nested():
+            _eliminar_historico(db, fichas_a_reemplazar)
+            total_afectadas = _insertar_historico_por_lotes(db, df, columnas, update_clause, chunk_size)
         registros_actualizados = total_afectadas
     except SQLAlchemyError as e:
         errores.append(f"Error en carga masiva de histórico: {str(e)}")
@@ -449,10 +386,153 @@ def insertar_actualizar_historico(db: Session, df):
     return registros_insertados, registros_actualizados, registros_descartados, errores
 
 
+def _insertar_historico_por_lotes(db: Session, df, columnas, update_clause, chunk_size):
+    """INSERT multi-fila del histórico de `df` en lotes de `chunk_size`; devuelve las filas afectadas."""
+    total_afectadas = 0
+    for start in range(0, len(df), chunk_size):
+        batch = df.iloc[start:start+chunk_size]
+        values_parts = []
+        params = {}
+        for i, row in batch.iterrows():
+            idx = str(i)
+            placeholders = []
+            val_id = int(row["id_grupo"]) if "id_grupo" in row and pd.notna(row["id_grupo"]) else None
+            params[f"id_grupo_{idx}"] = val_id
+            placeholders.append(f":id_grupo_{idx}")
+            for col in HISTORICO_COLUMNAS:
+                v = row.get(col, 0)
+                val = int(v) if pd.notna(v) else 0
+                params[f"{col}_{idx}"] = val
+                placeholders.append(f":{col}_{idx}")
+            values_parts.append(f"({', '.join(placeholders)})")
+        if not values_parts:
+            continue
+        stmt = text(f"""
+            INSERT INTO historico ({', '.join(columnas)})
+            VALUES {', '.join(values_parts)}
+            ON DUPLICATE KEY UPDATE {update_clause}
+        """)
+        result = db.execute(stmt, params)
+        total_afectadas += result.rowcount or 0
+    return total_afectadas
+
+
+STAGING_HISTORICO_SQL = """
+    CREATE TEMPORARY TABLE stg_historico (
+        ficha INTEGER UNSIGNED NOT NULL,
+        cod_programa VARCHAR(16),
+        cod_centro SMALLINT UNSIGNED,
+        modalidad VARCHAR(80),
+        jornada VARCHAR(80),
+        etapa_ficha VARCHAR(80),
+        estado_curso VARCHAR(80),
+        fecha_inicio DATE,
+        fecha_fin DATE,
+        cod_municipio CHAR(10),
+        cod_estrategia CHAR(5),
+        nombre_responsable VARCHAR(150),
+        cupo_asignado SMALLINT UNSIGNED,
+        num_aprendices_fem SMALLINT UNSIGNED,
+        num_aprendices_mas SMALLINT UNSIGNED,
+        num_aprendices_nobin SMALLINT UNSIGNED,
+        num_aprendices_matriculados SMALLINT UNSIGNED,
+        num_aprendices_activos SMALLINT UNSIGNED,
+        tipo_doc_empresa CHAR(5),
+        num_doc_empresa VARCHAR(30),
+        nombre_empresa VARCHAR(140),
+        {historico},
+        INDEX idx_stg_ficha (ficha)
+    )
+""".format(historico=",\n        ".join(f"{c} SMALLINT" for c in HISTORICO_COLUMNAS))
+
+
+def _filas_staging_historico(df):
+    """Genera las filas para stg_historico (grupo + histórico) a partir del DataFrame normalizado."""
+    columnas = GRUPOS_COLUMNAS + HISTORICO_COLUMNAS
+    datos = df.reindex(columns=columnas)
+    for col in ["cod_programa", "cod_municipio", "cod_estrategia"]:
+        # Mismo tratamiento que la ruta normal: se guardan como texto
+        datos[col] = datos[col].map(lambda v: str(v) if pd.notna(v) else None)
+    for col in HISTORICO_COLUMNAS:
+        datos[col] = datos[col].fillna(0)
+    datos = datos[datos["ficha"].notna()]
+    return datos.itertuples(index=False, name=None)
+
+
+def cargar_grupos_historico_por_staging(db: Session, df, fichas_existentes, fichas_a_reemplazar=()):
+    """
+    Carga grupos e histórico con una tabla temporal de sesión y sentencias set-based.
+
+    1. Escribe el DataFrame en un archivo temporal y lo carga con LOAD DATA LOCAL INFILE.
+    2. Actualiza los grupos existentes con un UPDATE ... JOIN.
+    3. Inserta los grupos nuevos con un INSERT ... SELECT.
+    4. Borra el histórico guardado de `fichas_a_reemplazar` e inserta el
+       nuevo con un INSERT ... SELECT.
+
+    Todo se ejecuta dentro de un SAVEPOINT: si algo falla (p. ej. local_infile
+    deshabilitado en el cliente) se revierte y se devuelve None para que el
+    llamador use la ruta normal.
+
+    Returns:
+        dict | None: Contadores de grupos e histórico, o None si no se pudo usar staging.
+    """
+    update_clause = ", ".join(f"g.{c} = COALESCE(s.{c}, g.{c})" for c in GRUPOS_COLUMNAS_ACTUALIZABLES)
+    columnas_grupo = ", ".join(GRUPOS_COLUMNAS)
+    columnas_historico = ", ".join(HISTORICO_COLUMNAS)
+    update_historico = ", ".join(f"{c} = VALUES({c})" for c in HISTORICO_COLUMNAS)
+
+    try:
+        with db.begin_nested():
+            db.execute(text("DROP TEMPORARY TABLE IF EXISTS stg_historico"))
+            db.execute(text(STAGING_HISTORICO_SQL))
+            cargadas = cargar_con_load_data(
+                db, "stg_historico", GRUPOS_COLUMNAS + HISTORICO_COLUMNAS, _filas_staging_historico(df)
+            )
+
+            db.execute(text(f"""
+                UPDATE grupos g
+                JOIN stg_historico s ON s.ficha = g.ficha
+                SET {update_clause}
+            """))
+
+            result = db.execute(text(f"""
+                INSERT IGNORE INTO grupos ({columnas_grupo})
+                SELECT {', '.join(f's.{c}' for c in GRUPOS_COLUMNAS)}
+                FROM stg_historico s
+                LEFT JOIN grupos g ON g.ficha = s.ficha
+                WHERE g.ficha IS NULL
+            """))
+            grupos_creados = result.rowcount or 0
+
+            _eliminar_historico(db, fichas_a_reemplazar)
+            result = db.execute(text(f"""
+                INSERT INTO historico (id_grupo, {columnas_historico})
+                SELECT s.ficha, {', '.join(f'COALESCE(s.{c}, 0)' for c in HISTORICO_COLUMNAS)}
+                FROM stg_historico s
+                ON DUPLICATE KEY UPDATE {update_historico}
+            """))
+            historico_afectadas = result.rowcount or 0
+
+            db.execute(text("DROP TEMPORARY TABLE IF EXISTS stg_historico"))
+    except SQLAlchemyError as e:
+        logger.warning(f"No se pudo cargar el histórico por staging, se usa la carga normal: {e}")
+        return None
+
+    logger.info(f"Histórico por staging: {cargadas} filas cargadas, {grupos_creados} grupos creados")
+    return {
+        "grupos_creados": grupos_creados,
+        # Igual que la ruta normal: una actualización por fila con grupo existente
+        "grupos_actualizados": int(df["ficha"].isin(fichas_existentes).sum()),
+        "historico_insertados": 0,
+        "historico_actualizados": historico_afectadas,
+    }
+
+
 def insertar_historico_en_bd(db: Session, df_historico):
     """
     Inserta registros históricos de aprendices por grupo en la base de datos.
     """
+    marcar_modificadas(db, "historico")
     registros_insertados = 0
     registros_actualizados = 0
     registros_descartados = 0
@@ -492,3 +572,29 @@ def insertar_historico_en_bd(db: Session, df_historico):
         "exitoso": len(errores) == 0,
         "mensaje": "Carga de histórico completada con errores" if errores else "Carga de histórico completada exitosamente"
     }
+
+
+def obtener_huellas_historico(db: Session, fichas):
+    """
+    Devuelve {ficha: huella} de la última carga para las `fichas` indicadas.
+    Las fichas sin huella guardada no aparecen en el resultado.
+    """
+    fichas = list(dict.fromkeys(int(f) for f in fichas))
+    huellas = {}
+    sql = text("SELECT ficha, huella FROM historico_huellas WHERE ficha IN :fichas")
+    for lote in dividir_en_lotes(fichas):
+        huellas.update({fila.ficha: fila.huella for fila in db.execute(sql, {"fichas": tuple(lote)})})
+    return huellas
+
+
+def guardar_huellas_historico(db: Session, huellas):
+    """Guarda (o reemplaza) la huella de cada ficha cargada. Recibe {ficha: huella}."""
+    if not huellas:
+        return 0
+    filas = [{"ficha": int(ficha), "huella": huella} for ficha, huella in huellas.items()]
+    guardadas = insertar_multifila(
+        db, "historico_huellas", ["ficha", "huella"], filas,
+        sufijo="ON DUPLICATE KEY UPDATE huella = VALUES(huella)",
+    )
+    db.commit()
+    return guardadas
@@ -6,10 +6,12 @@ from typing import Optional, List
 import logging
 
 from app.schemas.catalogo import CatalogoBase, EditarCatalogo
+from core.cache import marcar_modificadas
 
 logger = logging.getLogger(__name__)
 
 def create_catalogo(db: Session, catalogo: CatalogoBase) -> Optional[bool]:
+    marcar_modificadas(db, "catalogo")
     try:
         dataCatalogo = catalogo.model_dump() # convierte el esquema en diccionario
         
@@ -79,6 +81,7 @@ def get_catalogo_by_codigo(db: Session, cod_catalogo: str):
         raise Exception("Error de base de datos al buscar el catálogo por código")
 
 def update_catalogo(db: Session, catalogo_id: int, catalogo_update: EditarCatalogo) -> bool:
+    marcar_modificadas(db, "catalogo")
     try:
         fields = catalogo_update.model_dump(exclude_unset=True)
         if not fields:
@@ -96,6 +99,7 @@ def update_catalogo(db: Session, catalogo_id: int, catalogo_update: EditarCatalo
         raise Exception("Error de base de datos al actualizar el catálogo")
 
 def delete_catalogo(db: Session, id: int) -> bool:
+    marcar_modificadas(db, "catalogo")
     try:
         query = text("""
             DELETE FROM catalogo
@@ -2,13 +2,28 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 import logging
+from typing import Optional
+from app.utils.consultas import seleccionar_columnas
+from core.cache import marcar_modificadas
 
 logger = logging.getLogger(__name__)
 
+# Columnas que se pueden pedir con `fields`
+COLUMNAS_ESTADO_NORMAS = {
+    columna: columna
+    for columna in (
+        "id_estado_norma", "cod_programa", "cod_version", "fecha_elaboracion", "anio",
+        "red_conocimiento", "nombre_ncl", "cod_ncl", "ncl_version", "norma_corte_noviembre",
+        "version", "norma_version", "mesa_sectorial", "tipo_norma", "observacion",
+        "fecha_revision", "tipo_competencia", "vigencia", "fecha_indice",
+    )
+}
+
 
 #   CREAR REGISTRO
 
 def crear_estado_norma(db: Session, data: dict):
+    marcar_modificadas(db, "estado_de_normas")
     try:
         query = text("""
             INSERT INTO estado_de_normas (
@@ -37,10 +52,12 @@ def crear_estado_norma(db: Session, data: dict):
 
 #   LISTAR
 
-def listar_estado_normas(db: Session):
+def listar_estado_normas(db: Session, campos: Optional[list] = None):
+    """Lista los estados de normas; con `campos` solo se seleccionan esas columnas."""
+    columnas = seleccionar_columnas(campos, COLUMNAS_ESTADO_NORMAS) if campos else "*"
     try:
-        query = text("SELECT * FROM estado_de_normas ORDER BY id_estado_norma ASC")
-        return db.execute(query).mappings().all()
+        query = text(f"SELECT {columnas} FROM estado_de_normas ORDER BY id_estado_norma ASC")
+        return [dict(r) for r in db.execute(query).mappings().all()]
     except SQLAlchemyError as e:
         logger.error(f"Error listar_estado_normas: {e}")
         raise Exception(str(e))
@@ -65,6 +82,7 @@ def obtener_estado_norma(db: Session, id_norma: int):
 #   ACTUALIZAR
 
 def actualizar_estado_norma(db: Session, id_norma: int, data_update: dict):
+    marcar_modificadas(db, "estado_de_normas")
     try:
         if not data_update:
             return False
@@ -92,6 +110,7 @@ def actualizar_estado_norma(db: Session, id_norma: int, data_update: dict):
 #   ELIMINAR
 
 def eliminar_estado_norma(db: Session, id_norma: int):
+    marcar_modificadas(db, "estado_de_normas")
     try:
         query = text("""
             DELETE FROM estado_de_normas
@@ -118,15 +137,6 @@ def get_estado_by_cod_programa(db: Session, cod_programa: int):
         raise Exception(str(e))
 
 
-def get_distinct_anios(db: Session):
-    try:
-        query = text("SELECT DISTINCT anio FROM estado_de_normas WHERE anio IS NOT NULL ORDER BY anio ASC")
-        return db.execute(query).scalars().all()
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_anios: {e}")
-        raise Exception(str(e))
-
-
 def get_estado_by_anio(db: Session, anio: int):
     try:
         query = text("SELECT * FROM estado_de_normas WHERE anio = :anio ORDER BY id_estado_norma ASC")
@@ -136,15 +146,6 @@ def get_estado_by_anio(db: Session, anio: int):
         raise Exception(str(e))
 
 
-def get_distinct_vigencias(db: Session):
-    try:
-        query = text("SELECT DISTINCT vigencia FROM estado_de_normas WHERE vigencia IS NOT NULL ORDER BY vigencia ASC")
-        return db.execute(query).scalars().all()
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_vigencias: {e}")
-        raise Exception(str(e))
-
-
 def get_estado_by_vigencia(db: Session, vigencia: str):
     try:
         query = text("SELECT * FROM estado_de_normas WHERE vigencia = :vigencia ORDER BY id_estado_norma ASC")
@@ -154,15 +155,6 @@ def get_estado_by_vigencia(db: Session, vigencia: str):
         raise Exception(str(e))
 
 
-def get_distinct_tipo_norma(db: Session):
-    try:
-        query = text("SELECT DISTINCT tipo_norma FROM estado_de_normas WHERE tipo_norma IS NOT NULL ORDER BY tipo_norma ASC")
-        return db.execute(query).scalars().all()
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_tipo_norma: {e}")
-        raise Exception(str(e))
-
-
 def get_estado_by_tipo_norma(db: Session, tipo_norma: str):
     try:
         query = text("SELECT * FROM estado_de_normas WHERE tipo_norma = :tipo_norma ORDER BY id_estado_norma ASC")
@@ -172,15 +164,6 @@ def get_estado_by_tipo_norma(db: Session, tipo_norma: str):
         raise Exception(str(e))
 
 
-def get_distinct_mesa_sectorial(db: Session):
-    try:
-        query = text("SELECT DISTINCT mesa_sectorial FROM estado_de_normas WHERE mesa_sectorial IS NOT NULL ORDER BY mesa_sectorial ASC")
-        return db.execute(query).scalars().all()
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_mesa_sectorial: {e}")
-        raise Exception(str(e))
-
-
 def get_estado_by_mesa_sectorial(db: Session, mesa: str):
     try:
         query = text("SELECT * FROM estado_de_normas WHERE mesa_sectorial = :mesa ORDER BY id_estado_norma ASC")
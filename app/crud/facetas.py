@@ -0,0 +1,104 @@
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+import logging
+from typing import Dict, List
+
+from app.utils.consultas import FiltroInvalidoError
+from core.cache import cache_consulta
+from core.esquema import columnas_existentes
+
+logger = logging.getLogger(__name__)
+
+# Facetas (valores distintos para los filtros del front) por recurso:
+# nombre -> (tabla, {faceta: columnas candidatas}). Si hay varias candidatas se
+# usa COALESCE de las que existan en la tabla, como en los antiguos get_distinct_*.
+FACETAS = {
+    "programas_formacion": ("programas_formacion", {
+        "nivel": ["nivel", "nivel_formacion"],
+        "tipo_programa": ["tipo_programa", "tipo_formacion"],
+        "red_conocimiento": ["red_conocimiento"],
+        "estado": ["estado"],
+    }),
+    "registro_calificado": ("registro_calificado", {
+        "modalidad": ["modalidad"],
+        "clasificacion": ["clasificacion"],
+        "vigencia": ["vigencia"],
+        "estado_catalogo": ["estado_catalogo"],
+        "tipo_tramite": ["tipo_tramite"],
+    }),
+    "estado_normas": ("estado_de_normas", {
+        "anio": ["anio"],
+        "vigencia": ["vigencia"],
+        "tipo_norma": ["tipo_norma"],
+        "mesa_sectorial": ["mesa_sectorial"],
+    }),
+}
+
+# Facetas que se ordenan de mayor a menor (como el antiguo /valores-estado)
+FACETAS_DESCENDENTES = {("programas_formacion", "estado")}
+
+# Facetas que incluyen los nulos (el antiguo /valores-estado no los filtraba)
+FACETAS_CON_NULOS = {("programas_formacion", "estado")}
+
+
+def _expresiones(db: Session, tabla: str, facetas: Dict[str, List[str]]) -> Dict[str, str]:
+    """Expresión SQL de cada faceta según las columnas que existen en la tabla."""
+    expresiones = {}
+    for faceta, candidatas in facetas.items():
+        columnas = columnas_existentes(db, tabla, candidatas)
+        if not columnas:
+            continue
+        expresiones[faceta] = columnas[0] if len(columnas) == 1 else f"COALESCE({', '.join(columnas)})"
+    return expresiones
+
+
+def calcular_facetas(db: Session, recurso: str) -> Dict[str, List[dict]]:
+    """
+    Calcula las facetas de `recurso` con un `GROUP BY ... ORDER BY` por faceta.
+
+    La agrupación y el orden los hace la base de datos, así que siguen su
+    collation igual que los antiguos `SELECT DISTINCT` (p. ej. "Virtual" y
+    "virtual" son un solo valor).
+
+    Returns:
+        {faceta: [{"valor": ..., "total": n}, ...]} ordenado por valor, sin
+        nulos salvo en `FACETAS_CON_NULOS`.
+    """
+    tabla, facetas = FACETAS[recurso]
+    expresiones = _expresiones(db, tabla, facetas)
+
+    resultado: Dict[str, List[dict]] = {faceta: [] for faceta in facetas}
+    for faceta, expr in expresiones.items():
+        filtro = "" if (recurso, faceta) in FACETAS_CON_NULOS else f"WHERE {expr} IS NOT NULL "
+        orden = "DESC" if (recurso, faceta) in FACETAS_DESCENDENTES else "ASC"
+        query = text(
+            f"SELECT {expr} AS valor, COUNT(*) AS total FROM {tabla} {filtro}"
+            f"GROUP BY {expr} ORDER BY {expr} {orden}"
+        )
+        try:
+            filas = db.execute(query).mappings().all()
+        except SQLAlchemyError as e:
+            logger.error(f"Error al calcular la faceta {faceta} de {recurso}: {e}")
+            raise
+        resultado[faceta] = [{"valor": fila["valor"], "total": fila["total"]} for fila in filas]
+    return resultado
+
+
+def obtener_facetas(db: Session, recurso: str) -> Dict[str, List[dict]]:
+    """
+    Facetas de `recurso` desde memoria. Se recalculan en la primera consulta
+    después de cada carga o escritura sobre la tabla (generación de la caché).
+
+    Raises:
+        FiltroInvalidoError: Si el recurso no tiene facetas.
+    """
+    if recurso not in FACETAS:
+        raise FiltroInvalidoError(f"Recurso sin facetas: '{recurso}'. Disponibles: {', '.join(FACETAS)}")
+    tabla, _ = FACETAS[recurso]
+    return cache_consulta("facetas", (tabla,), {"recurso": recurso}, lambda: calcular_facetas(db, recurso))
+
+
+def valores_faceta(db: Session, recurso: str, faceta: str) -> list:
+    """Solo los valores de una faceta (lo que devuelven los endpoints `/valores-*`)."""
+    return [item["valor"] for item in obtener_facetas(db, recurso)[faceta]]
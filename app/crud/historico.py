@@ -3,34 +3,31 @@ from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
-from typing import Optional, List
+from typing import Any, Dict, List, Optional, Tuple
 import logging
+from app.utils.bd import dividir_en_lotes
+from app.utils.consultas import FiltroInvalidoError, seleccionar_columnas
+from app.utils.paginacion import condicion_keyset
 
 
 logger = logging.getLogger(__name__)
 
-def get_all_historicos(db: Session, skip: int = 0, limit: int = 100) -> List[dict]:
+def get_all_historicos(
+    db: Session, skip: int = 0, limit: int = 100, campos: Optional[List[str]] = None
+) -> List[dict]:
+    """
+    Página de históricos por `OFFSET`, ordenada por `id_historico`.
+    Con `campos` solo se seleccionan esas columnas de COLUMNAS_HISTORICO.
+    """
+    columnas = seleccionar_columnas(campos, COLUMNAS_HISTORICO)
     try:
-        query = text("""
-            SELECT 
-                centros_formacion.cod_regional, centros_formacion.nombre_regional,
-                grupos.ficha, grupos.cod_programa, grupos.cod_centro, grupos.modalidad,
-                grupos.jornada, grupos.etapa_ficha, grupos.estado_curso, grupos.fecha_inicio,
-                grupos.fecha_fin, grupos.cod_municipio, grupos.cod_estrategia, grupos.cupo_asignado,
-                grupos.num_aprendices_matriculados, grupos.num_aprendices_activos,
-                historico.id_historico, historico.id_grupo,
-                historico.num_aprendices_inscritos, historico.num_aprendices_en_transito,
-                historico.num_aprendices_formacion, historico.num_aprendices_induccion,
-                historico.num_aprendices_condicionados, historico.num_aprendices_aplazados,
-                historico.num_aprendices_retirado_voluntario, historico.num_aprendices_cancelados,
-                historico.num_aprendices_reprobados, historico.num_aprendices_no_aptos,
-                historico.num_aprendices_reingresados, historico.num_aprendices_por_certificar,
-                historico.num_aprendices_certificados, historico.num_aprendices_trasladados
-            FROM historico
-            INNER JOIN grupos ON historico.id_grupo = grupos.ficha
-            INNER JOIN centros_formacion ON grupos.cod_centro = centros_formacion.cod_centro
+        query = text(
+            f"SELECT {columnas} {HISTORICO_FROM}"
+            + """
+            ORDER BY historico.id_historico
             LIMIT :limit OFFSET :skip
-        """)
+            """
+        )
 
         result = db.execute(query, {"limit": limit, "skip": skip}).mappings().all()
         return result
@@ -39,6 +36,315 @@ def get_all_historicos(db: Session, skip: int = 0, limit: int = 100) -> List[dic
         logger.error(f"Error al obtener historicos: {e}")
         raise Exception("Error de base de datos al obtener los historicos")
 
+# Columnas que devuelven las consultas de histórico: nombre en la respuesta -> expresión SQL
+COLUMNAS_HISTORICO = {
+    "cod_regional": "centros_formacion.cod_regional",
+    "nombre_regional": "centros_formacion.nombre_regional",
+    "ficha": "grupos.ficha",
+    "cod_programa": "grupos.cod_programa",
+    "cod_centro": "grupos.cod_centro",
+    "modalidad": "grupos.modalidad",
+    "jornada": "grupos.jornada",
+    "etapa_ficha": "grupos.etapa_ficha",
+    "estado_curso": "grupos.estado_curso",
+    "fecha_inicio": "grupos.fecha_inicio",
+    "fecha_fin": "grupos.fecha_fin",
+    "cod_municipio": "grupos.cod_municipio",
+    "cod_estrategia": "grupos.cod_estrategia",
+    "cupo_asignado": "grupos.cupo_asignado",
+    "num_aprendices_matriculados": "grupos.num_aprendices_matriculados",
+    "num_aprendices_activos": "grupos.num_aprendices_activos",
+    "id_historico": "historico.id_historico",
+    "id_grupo": "historico.id_grupo",
+    "num_aprendices_inscritos": "historico.num_aprendices_inscritos",
+    "num_aprendices_en_transito": "historico.num_aprendices_en_transito",
+    "num_aprendices_formacion": "historico.num_aprendices_formacion",
+    "num_aprendices_induccion": "historico.num_aprendices_induccion",
+    "num_aprendices_condicionados": "historico.num_aprendices_condicionados",
+    "num_aprendices_aplazados": "historico.num_aprendices_aplazados",
+    "num_aprendices_retirado_voluntario": "historico.num_aprendices_retirado_voluntario",
+    "num_aprendices_cancelados": "historico.num_aprendices_cancelados",
+    "num_aprendices_reprobados": "historico.num_aprendices_reprobados",
+    "num_aprendices_no_aptos": "historico.num_aprendices_no_aptos",
+    "num_aprendices_reingresados": "historico.num_aprendices_reingresados",
+    "num_aprendices_por_certificar": "historico.num_aprendices_por_certificar",
+    "num_aprendices_certificados": "historico.num_aprendices_certificados",
+    "num_aprendices_trasladados": "historico.num_aprendices_trasladados",
+}
+
+HISTORICO_FROM = """
+    FROM historico
+    INNER JOIN grupos ON historico.id_grupo = grupos.ficha
+    INNER JOIN centros_formacion ON grupos.cod_centro = centros_formacion.cod_centro
+"""
+
+# Tablas que leen las consultas de histórico (dependencias de su caché)
+TABLAS_HISTORICO = ("historico", "grupos", "centros_formacion")
+
+# Columnas y joins comunes de las consultas de histórico
+HISTORICO_SELECT = "SELECT " + ", ".join(COLUMNAS_HISTORICO.values()) + HISTORICO_FROM
+
+# Filtros por igualdad (uno o varios valores) de `consultar_historicos`
+FILTROS_HISTORICO = {
+    nombre: COLUMNAS_HISTORICO[nombre]
+    for nombre in (
+        "cod_regional", "cod_centro", "cod_programa", "ficha", "modalidad", "jornada",
+        "etapa_ficha", "estado_curso", "cod_municipio", "cod_estrategia",
+    )
+}
+
+# Filtros por rango: fechas (desde/hasta) y contadores (mínimo/máximo)
+FILTROS_FECHA_HISTORICO = ("fecha_inicio", "fecha_fin")
+COLUMNAS_RANGO_HISTORICO = tuple(
+    nombre for nombre in COLUMNAS_HISTORICO
+    if nombre.startswith("num_aprendices_") or nombre == "cupo_asignado"
+)
+
+# Columnas por las que se puede ordenar `consultar_historicos`
+ORDEN_HISTORICO = (
+    "id_historico", "ficha", "cod_centro", "cod_programa", "fecha_inicio", "fecha_fin",
+    "jornada", "estado_curso", "cod_municipio", *COLUMNAS_RANGO_HISTORICO,
+)
+
+
+def get_historicos_pagina(
+    db: Session,
+    despues_de: Optional[int] = None,
+    limit: int = 1000,
+    campos: Optional[List[str]] = None,
+):
+    """
+    Página de históricos ordenada por `id_historico` (paginación por cursor).
+
+    En lugar de `OFFSET`, se filtra `id_historico > despues_de` y se recorre la
+    clave primaria desde ese punto, así que cualquier página cuesta lo mismo
+    que la primera. Se pide una fila de más para saber si hay otra página.
+    Con `campos` solo se seleccionan esas columnas de COLUMNAS_HISTORICO.
+
+    Returns:
+        tuple: (filas de la página, último `id_historico` si hay más páginas o None)
+    """
+    columnas = seleccionar_columnas(campos, COLUMNAS_HISTORICO, obligatorias=("id_historico",))
+    try:
+        query = text(
+            f"SELECT {columnas} {HISTORICO_FROM}"
+            + """
+            WHERE historico.id_historico > :despues_de
+            ORDER BY historico.id_historico
+            LIMIT :limite
+            """
+        )
+        filas = db.execute(
+            query, {"despues_de": despues_de if despues_de is not None else 0, "limite": limit + 1}
+        ).mappings().all()
+
+        siguiente = None
+        if len(filas) > limit:
+            filas = filas[:limit]
+            siguiente = filas[-1]["id_historico"]
+        if campos:
+            filas = [{campo: fila[campo] for campo in campos} for fila in filas]
+        return filas, siguiente
+
+    except SQLAlchemyError as e:
+        logger.error(f"Error al obtener la página de historicos: {e}")
+        raise Exception("Error de base de datos al obtener los historicos")
+
+
+def _condiciones_historico(filtros=None, fechas=None, rangos=None):
+    """
+    Traduce los filtros de `consultar_historicos` / `agregar_historicos` a
+    condiciones `WHERE` parametrizadas.
+
+    Returns:
+        tuple: (lista de condiciones SQL, parámetros)
+
+    Raises:
+        FiltroInvalidoError: Si algún filtro no está en las listas permitidas.
+    """
+    filtros = filtros or {}
+    fechas = fechas or {}
+    rangos = rangos or {}
+
+    invalidos = (
+        [f for f in filtros if f not in FILTROS_HISTORICO]
+        + [f for f in fechas if f not in FILTROS_FECHA_HISTORICO]
+        + [f for f in rangos if f not in COLUMNAS_RANGO_HISTORICO]
+    )
+    if invalidos:
+        raise FiltroInvalidoError(f"Filtros no permitidos: {', '.join(invalidos)}")
+
+    condiciones = []
+    parametros: Dict[str, Any] = {}
+    for nombre, valores in filtros.items():
+        if valores:
+            condiciones.append(f"{FILTROS_HISTORICO[nombre]} IN :{nombre}")
+            parametros[nombre] = tuple(valores)
+    for nombre, (desde, hasta) in {**fechas, **rangos}.items():
+        if desde is not None:
+            condiciones.append(f"{COLUMNAS_HISTORICO[nombre]} >= :{nombre}_desde")
+            parametros[f"{nombre}_desde"] = desde
+        if hasta is not None:
+            condiciones.append(f"{COLUMNAS_HISTORICO[nombre]} <= :{nombre}_hasta")
+            parametros[f"{nombre}_hasta"] = hasta
+    return condiciones, parametros
+
+
+def consultar_historicos(
+    db: Session,
+    filtros: Optional[Dict[str, List[Any]]] = None,
+    fechas: Optional[Dict[str, Tuple[Optional[date], Optional[date]]]] = None,
+    rangos: Optional[Dict[str, Tuple[Optional[int], Optional[int]]]] = None,
+    campos: Optional[List[str]] = None,
+    orden: str = "id_historico",
+    descendente: bool = False,
+    limit: int = 1000,
+    cursor: Optional[Dict[str, Any]] = None,
+):
+    """
+    Consulta de histórico con cualquier combinación de filtros, en una sola sentencia SQL.
+
+    Args:
+        filtros: {columna de FILTROS_HISTORICO: [valores]} -> `columna IN (...)`.
+        fechas: {columna de FILTROS_FECHA_HISTORICO: (desde, hasta)}, extremos inclusivos u omitidos (None).
+        rangos: {columna de COLUMNAS_RANGO_HISTORICO: (mínimo, máximo)}, igual que `fechas`.
+        campos: Columnas de COLUMNAS_HISTORICO a devolver (por defecto, todas).
+        orden: Columna de ORDEN_HISTORICO; `id_historico` desempata.
+        cursor: Posición devuelta por la página anterior ({"valor", "id_historico"}).
+
+    Returns:
+        tuple: (filas de la página, posición para la página siguiente o None)
+
+    Raises:
+        FiltroInvalidoError: Si algún filtro, campo u orden no está en las listas permitidas.
+    """
+    if orden not in ORDEN_HISTORICO:
+        raise FiltroInvalidoError(f"No se puede ordenar por '{orden}'. Permitidos: {', '.join(ORDEN_HISTORICO)}")
+    columnas_select = seleccionar_columnas(campos, COLUMNAS_HISTORICO, obligatorias=("id_historico", orden))
+    condiciones, parametros = _condiciones_historico(filtros, fechas, rangos)
+
+    columna_orden = COLUMNAS_HISTORICO[orden]
+    if cursor is not None:
+        condicion, parametros_cursor = condicion_keyset(
+            columna_orden, cursor.get("valor"), "historico.id_historico", cursor["id_historico"], descendente
+        )
+        condiciones.append(condicion)
+        parametros.update(parametros_cursor)
+
+    direccion = "DESC" if descendente else "ASC"
+    orden_sql = (
+        f"historico.id_historico {direccion}" if orden == "id_historico"
+        else f"{columna_orden} {direccion}, historico.id_historico {direccion}"
+    )
+    sql = f"SELECT {columnas_select} {HISTORICO_FROM}"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += f" ORDER BY {orden_sql} LIMIT :limite"
+    parametros["limite"] = limit + 1
+
+    try:
+        filas = [dict(fila) for fila in db.execute(text(sql), parametros).mappings().all()]
+    except SQLAlchemyError as e:
+        logger.error(f"Error al consultar historicos: {e}")
+        raise Exception("Error de base de datos al consultar los historicos")
+
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = {"valor": filas[-1][orden], "id_historico": filas[-1]["id_historico"]}
+    if campos:
+        filas = [{campo: fila[campo] for campo in campos} for fila in filas]
+    return filas, siguiente
+
+
+# Dimensiones de agrupación de `agregar_historicos`: nombre -> expresión SQL
+DIMENSIONES_HISTORICO = {
+    "regional": "centros_formacion.cod_regional",
+    "nombre_regional": "centros_formacion.nombre_regional",
+    "centro": "grupos.cod_centro",
+    "programa": "grupos.cod_programa",
+    "municipio": "grupos.cod_municipio",
+    "jornada": "grupos.jornada",
+    "modalidad": "grupos.modalidad",
+    "estado_curso": "grupos.estado_curso",
+    "anio_inicio": "YEAR(grupos.fecha_inicio)",
+}
+
+# Funciones de agregación permitidas en las medidas (`funcion:columna`)
+FUNCIONES_AGREGADO = {"sum": "SUM", "avg": "AVG", "count": "COUNT", "min": "MIN", "max": "MAX"}
+
+
+def agregar_historicos(
+    db: Session,
+    dimensiones: List[str],
+    medidas: List[str],
+    filtros: Optional[Dict[str, List[Any]]] = None,
+    fechas: Optional[Dict[str, Tuple[Optional[date], Optional[date]]]] = None,
+    rangos: Optional[Dict[str, Tuple[Optional[int], Optional[int]]]] = None,
+    limit: int = 10000,
+) -> List[dict]:
+    """
+    Agrega el histórico con un único `GROUP BY` sobre el join historico/grupos/centros_formacion.
+
+    Args:
+        dimensiones: Claves de DIMENSIONES_HISTORICO (vacío = un solo total).
+        medidas: `funcion:columna` con funcion en FUNCIONES_AGREGADO y columna en
+            COLUMNAS_RANGO_HISTORICO (p. ej. `sum:num_aprendices_certificados`),
+            o `count` para contar registros. Cada medida se devuelve como `funcion_columna`.
+        filtros, fechas, rangos: Igual que en `consultar_historicos`.
+        limit: Máximo de grupos. Se pide uno de más para no devolver totales
+            recortados sin avisar.
+
+    Raises:
+        FiltroInvalidoError: Si alguna dimensión, medida o filtro no está
+            permitido, o si el resultado tiene más de `limit` grupos.
+    """
+    invalidas = [d for d in dimensiones if d not in DIMENSIONES_HISTORICO]
+    if invalidas:
+        raise FiltroInvalidoError(
+            f"Dimensiones no permitidas: {', '.join(invalidas)}. Permitidas: {', '.join(DIMENSIONES_HISTORICO)}"
+        )
+    if not medidas:
+        raise FiltroInvalidoError("Debe indicar al menos una medida (p. ej. `sum:num_aprendices_certificados`)")
+
+    columnas_medida = []
+    for medida in dict.fromkeys(medidas):
+        if medida == "count":
+            columnas_medida.append("COUNT(*) AS total_registros")
+            continue
+        funcion, _, columna = medida.partition(":")
+        if funcion not in FUNCIONES_AGREGADO or columna not in COLUMNAS_RANGO_HISTORICO:
+            raise FiltroInvalidoError(
+                f"Medida no permitida: '{medida}'. Use funcion:columna con funcion en "
+                f"{', '.join(FUNCIONES_AGREGADO)} y columna num_aprendices_* o cupo_asignado"
+            )
+        columnas_medida.append(f"{FUNCIONES_AGREGADO[funcion]}({COLUMNAS_HISTORICO[columna]}) AS {funcion}_{columna}")
+
+    dimensiones = list(dict.fromkeys(dimensiones))
+    columnas_dimension = [f"{DIMENSIONES_HISTORICO[d]} AS {d}" for d in dimensiones]
+    condiciones, parametros = _condiciones_historico(filtros, fechas, rangos)
+
+    sql = f"SELECT {', '.join(columnas_dimension + columnas_medida)} {HISTORICO_FROM}"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    if dimensiones:
+        expresiones = ", ".join(DIMENSIONES_HISTORICO[d] for d in dimensiones)
+        sql += f" GROUP BY {expresiones} ORDER BY {expresiones}"
+    sql += " LIMIT :limite"
+    parametros["limite"] = limit + 1
+
+    try:
+        filas = [dict(fila) for fila in db.execute(text(sql), parametros).mappings().all()]
+    except SQLAlchemyError as e:
+        logger.error(f"Error al agregar historicos: {e}")
+        raise Exception("Error de base de datos al agregar los historicos")
+    if len(filas) > limit:
+        raise FiltroInvalidoError(
+            f"La agrupación devuelve más de {limit} grupos. Use menos dimensiones, más filtros o un `limit` mayor"
+        )
+    return filas
+
+
 def get_historico_by_id(db: Session, id_historico: int):
     try:
         query = text("""
@@ -138,6 +444,35 @@ def get_historico_by_ficha(db: Session, ficha: int) -> Optional[dict]:
         raise Exception("Error de base de datos al obtener el historico por ficha")
 
 
+def get_historicos_by_fichas(
+    db: Session, fichas: List[int], campos: Optional[List[str]] = None
+) -> Tuple[Dict[int, dict], List[int]]:
+    """
+    Versión por lotes de `get_historico_by_ficha`: resuelve muchas fichas con
+    consultas `IN` por bloques en lugar de una consulta por ficha.
+
+    Returns:
+        tuple: ({ficha: histórico}, fichas sin histórico en el orden recibido)
+    """
+    fichas = list(dict.fromkeys(fichas))
+    columnas = seleccionar_columnas(campos, COLUMNAS_HISTORICO, obligatorias=("ficha",))
+    query = text(
+        f"SELECT {columnas} {HISTORICO_FROM} WHERE historico.id_grupo IN :fichas ORDER BY historico.id_historico"
+    )
+    encontrados: Dict[int, dict] = {}
+    try:
+        for lote in dividir_en_lotes(fichas):
+            for fila in db.execute(query, {"fichas": tuple(lote)}).mappings():
+                # Como en get_historico_by_ficha, se devuelve el primer histórico de cada ficha
+                if fila["ficha"] not in encontrados:
+                    encontrados[fila["ficha"]] = {campo: fila[campo] for campo in campos} if campos else dict(fila)
+    except SQLAlchemyError as e:
+        logger.error(f"Error al obtener historicos por fichas: {e}")
+        raise Exception("Error de base de datos al obtener los historicos por fichas")
+
+    return encontrados, [ficha for ficha in fichas if ficha not in encontrados]
+
+
 def get_historico_by_cod_programa(db: Session, cod_programa: str) -> Optional[dict]:
     """
     Obtiene el histórico asociado a un codigo de programa específico.
@@ -3,10 +3,12 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from typing import Optional
+from core.cache import marcar_modificadas
 
 
 
 def update_url_pdf(db: Session, cod: int, url: str) -> bool:
+    marcar_modificadas(db, "programas_formacion")
     try:
 
         query = text(f""" UPDATE programas_formacion SET url_pdf = :url_pdf 
@@ -2,27 +2,48 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 import logging
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 from app.schemas.programas_formacion import CrearPrograma, EditarPrograma
+from app.utils.bd import dividir_en_lotes
+from app.utils.consultas import seleccionar_columnas
+from core.cache import marcar_modificadas
+from core.esquema import columnas_existentes
 
 logger = logging.getLogger(__name__)
 
+# Campos de RetornoPrograma -> expresión SQL, para las consultas con `fields`
+COLUMNAS_PROGRAMA = {
+    "cod_programa": "cod_programa",
+    "version": "COALESCE(cod_version, CAST(PRF_version AS CHAR))",
+    "nombre": "nombre_programa",
+    "nivel": "nivel_formacion",
+    "meses_duracion": "duracion_maxima",
+    "duracion_programa": "COALESCE(dur_etapa_productiva, duracion_maxima)",
+    "unidad_medida": "alamedida",
+    "estado": "estado",
+    "tipo_programa": "tipo_formacion",
+    "url_pdf": "url_pdf",
+    "red_conocimiento": "red_conocimiento",
+    "programa_especial": "NULL",
+}
+
+
+# Columnas alternativas según la versión del esquema (la primera tiene prioridad)
+COLUMNAS_NIVEL = ("nivel", "nivel_formacion")
+COLUMNAS_TIPO_PROGRAMA = ("tipo_programa", "tipo_formacion")
+
+
+@lru_cache(maxsize=None)
+def _sql_programas_por(columnas: tuple, parametro: str):
+    """SELECT de programas filtrando por cualquiera de `columnas` (se compila una vez por esquema)."""
+    condicion = " OR ".join(f"{columna} = :{parametro}" for columna in columnas)
+    return text(f"SELECT * FROM programas_formacion WHERE {condicion} ORDER BY cod_programa ASC")
 
-def _existing_columns(db: Session, table: str, candidates: list) -> list:
-    """Devuelve la lista de columnas existentes de `candidates` en `table`."""
-    try:
-        # MySQL: usar information_schema
-        query = text("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_schema = DATABASE() AND table_name = :table AND column_name IN :candidates
-        """)
-        rows = db.execute(query, {"table": table, "candidates": tuple(candidates)}).scalars().all()
-        return rows
-    except Exception:
-        return []
 
 def crear_programa(db: Session, programa: CrearPrograma) -> bool:
+    marcar_modificadas(db, "programas_formacion")
     try:
         data = programa.model_dump()
         query = text("""
@@ -44,7 +65,13 @@ def crear_programa(db: Session, programa: CrearPrograma) -> bool:
         logger.error(f"Error crear_programa: {e}")
         raise Exception("Error de base de datos al crear programa")
 
-def listar_programas(db: Session):
+def listar_programas(db: Session, campos: Optional[list] = None):
+    """
+    Lista los programas de formación. Con `campos` solo se seleccionan esas
+    columnas (ver COLUMNAS_PROGRAMA) y cada fila trae únicamente esas claves.
+    """
+    if campos:
+        return _listar_programas_campos(db, campos)
     try:
         query = text("SELECT * FROM programas_formacion ORDER BY cod_programa ASC")
         rows = db.execute(query).mappings().all()
@@ -70,31 +97,72 @@ def listar_programas(db: Session):
         logger.error(f"Error listar_programas: {e}")
         raise Exception("Error de base de datos al listar programas")
 
+def _listar_programas_campos(db: Session, campos: list):
+    columnas = seleccionar_columnas(campos, COLUMNAS_PROGRAMA)
+    try:
+        query = text(f"SELECT {columnas} FROM programas_formacion ORDER BY cod_programa ASC")
+        rows = [dict(r) for r in db.execute(query).mappings().all()]
+        if "cod_programa" in campos:
+            for r in rows:
+                if r["cod_programa"] is not None:
+                    r["cod_programa"] = str(r["cod_programa"])
+        return rows
+    except SQLAlchemyError as e:
+        logger.error(f"Error listar_programas: {e}")
+        raise Exception("Error de base de datos al listar programas")
+
+def _mapear_programa(r) -> dict:
+    """Fila de programas_formacion -> campos de RetornoPrograma."""
+    return {
+        "cod_programa": str(r.get("cod_programa")) if r.get("cod_programa") is not None else None,
+        "version": r.get("cod_version") or (str(r.get("PRF_version")) if r.get("PRF_version") is not None else None),
+        "nombre": r.get("nombre_programa") or r.get("nombre"),
+        "nivel": r.get("nivel_formacion") or r.get("nivel"),
+        "meses_duracion": r.get("duracion_maxima"),
+        "duracion_programa": r.get("dur_etapa_productiva") or r.get("duracion_maxima"),
+        "unidad_medida": r.get("alamedida") or r.get("unidad_medida"),
+        "estado": r.get("estado"),
+        "tipo_programa": r.get("tipo_formacion") or r.get("tipo_programa"),
+        "url_pdf": r.get("url_pdf"),
+        "red_conocimiento": r.get("red_conocimiento"),
+        "programa_especial": r.get("programa_especial")
+    }
+
+
 def obtener_programa_por_id(db: Session, cod_programa: int):
     try:
         query = text("SELECT * FROM programas_formacion WHERE cod_programa = :id")
         r = db.execute(query, {"id": cod_programa}).mappings().first()
         if not r:
             return None
-        return {
-            "cod_programa": str(r.get("cod_programa")) if r.get("cod_programa") is not None else None,
-            "version": r.get("cod_version") or (str(r.get("PRF_version")) if r.get("PRF_version") is not None else None),
-            "nombre": r.get("nombre_programa") or r.get("nombre"),
-            "nivel": r.get("nivel_formacion") or r.get("nivel"),
-            "meses_duracion": r.get("duracion_maxima"),
-            "duracion_programa": r.get("dur_etapa_productiva") or r.get("duracion_maxima"),
-            "unidad_medida": r.get("alamedida") or r.get("unidad_medida"),
-            "estado": r.get("estado"),
-            "tipo_programa": r.get("tipo_formacion") or r.get("tipo_programa"),
-            "url_pdf": r.get("url_pdf"),
-            "red_conocimiento": r.get("red_conocimiento"),
-            "programa_especial": r.get("programa_especial")
-        }
+        return _mapear_programa(r)
     except SQLAlchemyError as e:
         logger.error(f"Error obtener_programa_por_id: {e}")
         raise Exception("Error de base de datos al obtener programa")
 
+
+def obtener_programas_por_codigos(db: Session, codigos: List[str]) -> Tuple[Dict[str, dict], List[str]]:
+    """
+    Versión por lotes de `obtener_programa_por_id` con consultas `IN` por bloques.
+
+    Returns:
+        tuple: ({cod_programa: programa}, códigos no encontrados en el orden recibido)
+    """
+    codigos = list(dict.fromkeys(str(c).strip() for c in codigos))
+    query = text("SELECT * FROM programas_formacion WHERE cod_programa IN :codigos")
+    encontrados: Dict[str, dict] = {}
+    try:
+        for lote in dividir_en_lotes(codigos):
+            for r in db.execute(query, {"codigos": tuple(lote)}).mappings():
+                programa = _mapear_programa(r)
+                encontrados[programa["cod_programa"]] = programa
+    except SQLAlchemyError as e:
+        logger.error(f"Error obtener_programas_por_codigos: {e}")
+        raise Exception("Error de base de datos al obtener programas")
+    return encontrados, [codigo for codigo in codigos if codigo not in encontrados]
+
 def actualizar_programa(db: Session, cod_programa: int, data_update: EditarPrograma) -> bool:
+    marcar_modificadas(db, "programas_formacion")
     try:
         fields = data_update.model_dump(exclude_unset=True)
         if not fields:
@@ -111,6 +179,7 @@ def actualizar_programa(db: Session, cod_programa: int, data_update: EditarProgr
         raise Exception("Error de base de datos al actualizar programa")
 
 def eliminar_programa(db: Session, cod_programa: int) -> bool:
+    marcar_modificadas(db, "programas_formacion")
     try:
         query = text("DELETE FROM programas_formacion WHERE cod_programa = :id")
         db.execute(query, {"id": cod_programa})
@@ -125,18 +194,11 @@ def eliminar_programa(db: Session, cod_programa: int) -> bool:
 # Funciones de solo lectura para consultas por campo y valores únicos
 def get_programas_by_nivel(db: Session, nivel: str):
     try:
-        # Determinar columnas existentes para nivel
-        cols = _existing_columns(db, 'programas_formacion', ['nivel', 'nivel_formacion'])
+        # Columnas de nivel que existen en el esquema registrado
+        cols = columnas_existentes(db, 'programas_formacion', COLUMNAS_NIVEL)
         if not cols:
             return []
-        if len(cols) == 1:
-            col = cols[0]
-            query = text(f"SELECT * FROM programas_formacion WHERE {col} = :nivel ORDER BY cod_programa ASC")
-            rows = db.execute(query, {"nivel": nivel}).mappings().all()
-        else:
-            # Ambas existen
-            query = text("SELECT * FROM programas_formacion WHERE nivel = :nivel OR nivel_formacion = :nivel ORDER BY cod_programa ASC")
-            rows = db.execute(query, {"nivel": nivel}).mappings().all()
+        rows = db.execute(_sql_programas_por(tuple(cols), "nivel"), {"nivel": nivel}).mappings().all()
         mapped = []
         for r in rows:
             mapped.append({
@@ -159,37 +221,13 @@ def get_programas_by_nivel(db: Session, nivel: str):
         raise Exception("Error de base de datos al obtener programas por nivel")
 
 
-def get_distinct_niveles(db: Session):
-    try:
-        cols = _existing_columns(db, 'programas_formacion', ['nivel', 'nivel_formacion'])
-        if not cols:
-            return []
-        if len(cols) == 1:
-            col = cols[0]
-            query = text(f"SELECT DISTINCT {col} FROM programas_formacion WHERE {col} IS NOT NULL ORDER BY {col} ASC")
-            rows = db.execute(query).scalars().all()
-            return [r for r in rows]
-        # Ambas existen
-        query = text("SELECT DISTINCT COALESCE(nivel, nivel_formacion) AS nivel FROM programas_formacion WHERE COALESCE(nivel, nivel_formacion) IS NOT NULL ORDER BY nivel ASC")
-        rows = db.execute(query).scalars().all()
-        return [r for r in rows]
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_niveles: {e}")
-        raise Exception("Error de base de datos al obtener niveles distintos")
-
-
 def get_programas_by_tipo_programa(db: Session, tipo_programa: str):
     try:
-        cols = _existing_columns(db, 'programas_formacion', ['tipo_programa', 'tipo_formacion'])
+        cols = columnas_existentes(db, 'programas_formacion', COLUMNAS_TIPO_PROGRAMA)
         if not cols:
             return []
-        if len(cols) == 1:
-            col = cols[0]
-            query = text(f"SELECT * FROM programas_formacion WHERE {col} = :tipo_programa ORDER BY cod_programa ASC")
-            rows = db.execute(query, {"tipo_programa": tipo_programa}).mappings().all()
-        else:
-            query = text("SELECT * FROM programas_formacion WHERE tipo_programa = :tipo_programa OR tipo_formacion = :tipo_programa ORDER BY cod_programa ASC")
-            rows = db.execute(query, {"tipo_programa": tipo_programa}).mappings().all()
+        query = _sql_programas_por(tuple(cols), "tipo_programa")
+        rows = db.execute(query, {"tipo_programa": tipo_programa}).mappings().all()
         mapped = []
         for r in rows:
             mapped.append({
@@ -212,23 +250,6 @@ def get_programas_by_tipo_programa(db: Session, tipo_programa: str):
         raise Exception("Error de base de datos al obtener programas por tipo_programa")
 
 
-def get_distinct_tipo_programa(db: Session):
-    try:
-        cols = _existing_columns(db, 'programas_formacion', ['tipo_programa', 'tipo_formacion'])
-        if not cols:
-            return []
-        if len(cols) == 1:
-            col = cols[0]
-            query = text(f"SELECT DISTINCT {col} FROM programas_formacion WHERE {col} IS NOT NULL ORDER BY {col} ASC")
-            return db.execute(query).scalars().all()
-        # Ambas existen
-        query = text("SELECT DISTINCT COALESCE(tipo_programa, tipo_formacion) AS tipo FROM programas_formacion WHERE COALESCE(tipo_programa, tipo_formacion) IS NOT NULL ORDER BY tipo ASC")
-        return db.execute(query).scalars().all()
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_tipo_programa: {e}")
-        raise Exception("Error de base de datos al obtener tipos de programa distintos")
-
-
 def get_programas_by_red_conocimiento(db: Session, red: str):
     try:
         query = text("SELECT * FROM programas_formacion WHERE red_conocimiento = :red ORDER BY cod_programa ASC")
@@ -255,15 +276,6 @@ def get_programas_by_red_conocimiento(db: Session, red: str):
         raise Exception("Error de base de datos al obtener programas por red_conocimiento")
 
 
-def get_distinct_red_conocimiento(db: Session):
-    try:
-        query = text("SELECT DISTINCT red_conocimiento FROM programas_formacion WHERE red_conocimiento IS NOT NULL ORDER BY red_conocimiento ASC")
-        return db.execute(query).scalars().all()
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_red_conocimiento: {e}")
-        raise Exception("Error de base de datos al obtener redes de conocimiento distintas")
-
-
 def get_programas_by_estado(db: Session, estado: bool):
     try:
         query = text("SELECT * FROM programas_formacion WHERE estado = :estado ORDER BY cod_programa ASC")
@@ -289,11 +301,3 @@ def get_programas_by_estado(db: Session, estado: bool):
         logger.error(f"Error get_programas_by_estado: {e}")
         raise Exception("Error de base de datos al obtener programas por estado")
 
-
-def get_distinct_estados(db: Session):
-    try:
-        query = text("SELECT DISTINCT estado FROM programas_formacion ORDER BY estado DESC")
-        return db.execute(query).scalars().all()
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_estados: {e}")
-        raise Exception("Error de base de datos al obtener estados distintos")
@@ -2,13 +2,27 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 import logging
+from typing import Optional
 
 from app.schemas.registro_calificado import CrearRegistroCalificado, EditarRegistroCalificado
+from app.utils.consultas import seleccionar_columnas
+from core.cache import marcar_modificadas
 
 logger = logging.getLogger(__name__)
 
+# Columnas que se pueden pedir con `fields`
+COLUMNAS_REGISTRO_CALIFICADO = {
+    columna: columna
+    for columna in (
+        "id", "cod_programa", "tipo_tramite", "fecha_radicado", "numero_resolucion",
+        "fecha_resolucion", "fecha_vencimiento", "vigencia", "modalidad",
+        "clasificacion", "estado_catalogo",
+    )
+}
+
 
 def crear_registro(db: Session, registro: CrearRegistroCalificado) -> bool:
+    marcar_modificadas(db, "registro_calificado")
     try:
         data = registro.model_dump()
         query = text("""
@@ -31,10 +45,12 @@ def crear_registro(db: Session, registro: CrearRegistroCalificado) -> bool:
         raise Exception("Error de base de datos al crear registro calificado")
 
 
-def listar_registros(db: Session):
+def listar_registros(db: Session, campos: Optional[list] = None):
+    """Lista los registros calificados; con `campos` solo se seleccionan esas columnas."""
+    columnas = seleccionar_columnas(campos, COLUMNAS_REGISTRO_CALIFICADO) if campos else "*"
     try:
-        query = text("SELECT * FROM registro_calificado ORDER BY cod_programa ASC")
-        return db.execute(query).mappings().all()
+        query = text(f"SELECT {columnas} FROM registro_calificado ORDER BY cod_programa ASC")
+        return [dict(r) for r in db.execute(query).mappings().all()]
     except SQLAlchemyError as e:
         logger.error(f"Error listar_registros: {e}")
         raise Exception("Error de base de datos al listar registros calificados")
@@ -50,6 +66,7 @@ def obtener_registro_por_id(db: Session, cod_programa: str):
 
 
 def actualizar_registro(db: Session, cod_programa: str, data_update: EditarRegistroCalificado) -> bool:
+    marcar_modificadas(db, "registro_calificado")
     try:
         fields = data_update.model_dump(exclude_unset=True)
         if not fields:
@@ -67,6 +84,7 @@ def actualizar_registro(db: Session, cod_programa: str, data_update: EditarRegis
 
 
 def eliminar_registro(db: Session, cod_programa: str) -> bool:
+    marcar_modificadas(db, "registro_calificado")
     try:
         query = text("DELETE FROM registro_calificado WHERE cod_programa = :id")
         db.execute(query, {"id": cod_programa})
@@ -88,16 +106,6 @@ def get_registros_by_modalidad(db: Session, modalidad: str):
         raise Exception("Error de base de datos al obtener registros por modalidad")
 
 
-def get_distinct_modalidades(db: Session):
-    try:
-        query = text("SELECT DISTINCT modalidad FROM registro_calificado WHERE modalidad IS NOT NULL ORDER BY modalidad ASC")
-        result = db.execute(query).scalars().all()
-        return result
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_modalidades: {e}")
-        raise Exception("Error de base de datos al obtener modalidades distintas")
-
-
 def get_registros_by_clasificacion(db: Session, clasificacion: str):
     try:
         query = text("SELECT * FROM registro_calificado WHERE clasificacion = :clasificacion ORDER BY cod_programa ASC")
@@ -107,16 +115,6 @@ def get_registros_by_clasificacion(db: Session, clasificacion: str):
         raise Exception("Error de base de datos al obtener registros por clasificacion")
 
 
-def get_distinct_clasificaciones(db: Session):
-    try:
-        query = text("SELECT DISTINCT clasificacion FROM registro_calificado WHERE clasificacion IS NOT NULL ORDER BY clasificacion ASC")
-        result = db.execute(query).scalars().all()
-        return result
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_clasificaciones: {e}")
-        raise Exception("Error de base de datos al obtener clasificaciones distintas")
-
-
 def get_registros_by_vigencia(db: Session, vigencia: str):
     try:
         query = text("SELECT * FROM registro_calificado WHERE vigencia = :vigencia ORDER BY cod_programa ASC")
@@ -126,16 +124,6 @@ def get_registros_by_vigencia(db: Session, vigencia: str):
         raise Exception("Error de base de datos al obtener registros por vigencia")
 
 
-def get_distinct_vigencias(db: Session):
-    try:
-        query = text("SELECT DISTINCT vigencia FROM registro_calificado WHERE vigencia IS NOT NULL ORDER BY vigencia ASC")
-        result = db.execute(query).scalars().all()
-        return result
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_vigencias: {e}")
-        raise Exception("Error de base de datos al obtener vigencias distintas")
-
-
 def get_registros_by_estado_catalogo(db: Session, estado_catalogo: str):
     try:
         query = text("SELECT * FROM registro_calificado WHERE estado_catalogo = :estado_catalogo ORDER BY cod_programa ASC")
@@ -145,16 +133,6 @@ def get_registros_by_estado_catalogo(db: Session, estado_catalogo: str):
         raise Exception("Error de base de datos al obtener registros por estado_catalogo")
 
 
-def get_distinct_estado_catalogo(db: Session):
-    try:
-        query = text("SELECT DISTINCT estado_catalogo FROM registro_calificado WHERE estado_catalogo IS NOT NULL ORDER BY estado_catalogo ASC")
-        result = db.execute(query).scalars().all()
-        return result
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_estado_catalogo: {e}")
-        raise Exception("Error de base de datos al obtener estados de catalogo distintos")
-
-
 def get_registros_by_tipo_tramite(db: Session, tipo_tramite: str):
     try:
         query = text("SELECT * FROM registro_calificado WHERE tipo_tramite = :tipo_tramite ORDER BY cod_programa ASC")
@@ -163,12 +141,3 @@ def get_registros_by_tipo_tramite(db: Session, tipo_tramite: str):
         logger.error(f"Error get_registros_by_tipo_tramite: {e}")
         raise Exception("Error de base de datos al obtener registros por tipo_tramite")
 
-
-def get_distinct_tipo_tramite(db: Session):
-    try:
-        query = text("SELECT DISTINCT tipo_tramite FROM registro_calificado WHERE tipo_tramite IS NOT NULL ORDER BY tipo_tramite ASC")
-        result = db.execute(query).scalars().all()
-        return result
-    except SQLAlchemyError as e:
-        logger.error(f"Error get_distinct_tipo_tramite: {e}")
-        raise Exception("Error de base de datos al obtener tipos de tramite distintos")
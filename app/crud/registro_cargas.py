@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LECTURA_HASH = 1024 * 1024
+
+
+def calcular_sha256(fuente) -> str:
+    """SHA-256 del archivo (ruta u objeto tipo archivo) leyéndolo por porciones de 1 MB."""
+    sha = hashlib.sha256()
+    if isinstance(fuente, (str, os.PathLike)):
+        with open(fuente, "rb") as archivo:
+            for porcion in iter(lambda: archivo.read(TAMANO_LECTURA_HASH), b""):
+                sha.update(porcion)
+        return sha.hexdigest()
+
+    fuente.seek(0)
+    for porcion in iter(lambda: fuente.read(TAMANO_LECTURA_HASH), b""):
+        sha.update(porcion)
+    fuente.seek(0)
+    return sha.hexdigest()
+
+
+def _json_default(valor: Any):
+    """Serializa tipos de numpy/pandas y fechas presentes en los resúmenes."""
+    if hasattr(valor, "item"):
+        return valor.item()
+    if hasattr(valor, "isoformat"):
+        return valor.isoformat()
+    return str(valor)
+
+
+def obtener_carga_registrada(db: Session, cargador: str, sha256: str) -> Optional[Dict[str, Any]]:
+    """Devuelve la carga registrada para (cargador, sha256) o None."""
+    try:
+        query = text("""
+            SELECT nombre_archivo, resumen, fecha_carga
+            FROM registro_cargas
+            WHERE cargador = :cargador AND sha256 = :sha256
+        """)
+        fila = db.execute(query, {"cargador": cargador, "sha256": sha256}).mappings().first()
+        if fila is None:
+            return None
+        return {
+            "nombre_archivo": fila["nombre_archivo"],
+            "resumen": json.loads(fila["resumen"]) if fila["resumen"] else {},
+            "fecha_carga": fila["fecha_carga"],
+        }
+    except SQLAlchemyError as e:
+        # Si el registro no está disponible se procesa el archivo normalmente
+        logger.warning(f"No se pudo consultar el registro de cargas: {e}")
+        db.rollback()
+        return None
+
+
+def registrar_carga(db: Session, cargador: str, sha256: str, nombre_archivo: Optional[str], resumen: Dict) -> None:
+    """Guarda (o reemplaza) el resumen de la carga de un archivo."""
+    try:
+        query = text("""
+            INSERT INTO registro_cargas (cargador, sha256, nombre_archivo, resumen)
+            VALUES (:cargador, :sha256, :nombre_archivo, :resumen)
+            ON DUPLICATE KEY UPDATE
+                nombre_archivo = VALUES(nombre_archivo),
+                resumen = VALUES(resumen),
+                fecha_carga = CURRENT_TIMESTAMP
+        """)
+        db.execute(query, {
+            "cargador": cargador,
+            "sha256": sha256,
+            "nombre_archivo": (nombre_archivo or "")[:255],
+            "resumen": json.dumps(resumen, default=_json_default, ensure_ascii=False),
+        })
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.warning(f"No se pudo registrar la carga de {nombre_archivo}: {e}")
+
+
+def resumen_carga_repetida(registro: Dict[str, Any], sha256: str) -> Dict[str, Any]:
+    """Resumen guardado marcado como respuesta de un archivo ya cargado."""
+    resumen = dict(registro["resumen"])
+    resumen["archivo_repetido"] = True
+    resumen["sha256"] = sha256
+    resumen["fecha_carga_original"] = str(registro["fecha_carga"])
+    resumen["mensaje_registro"] = (
+        "El archivo ya había sido cargado; se devuelve el resumen de esa carga. "
+        "Use force=true para recargarlo."
+    )
+    return resumen
+
+
+def carga_exitosa(resumen: Dict[str, Any]) -> bool:
+    """Solo se registran cargas que leyeron el archivo completo y no fueron rechazadas."""
+    return isinstance(resumen, dict) and "filas_leidas" in resumen and resumen.get("exitoso", True) is not False
+
+
+def cargar_con_registro(
+    db: Session,
+    cargador: str,
+    fuente,
+    nombre_archivo: Optional[str],
+    procesar: Callable[..., Dict],
+    force: bool = False,
+    sha256: Optional[str] = None,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    Ejecuta `procesar(db, fuente, **kwargs)` salvo que el mismo archivo ya se haya cargado.
+
+    Si el SHA-256 del archivo está en `registro_cargas` para este cargador (y no
+    se pide `force`), se devuelve el resumen guardado sin leer el Excel ni tocar
+    las tablas de datos. Tras una carga exitosa se guarda su resumen.
+    """
+    sha256 = sha256 or calcular_sha256(fuente)
+
+    if not force:
+        registro = obtener_carga_registrada(db, cargador, sha256)
+        if registro is not None:
+            logger.info(f"Archivo repetido para {cargador} ({sha256[:12]}), se omite la carga")
+            return resumen_carga_repetida(registro, sha256)
+
+    resumen = procesar(db, fuente, **kwargs)
+    if carga_exitosa(resumen):
+        registrar_carga(db, cargador, sha256, nombre_archivo, resumen)
+    if isinstance(resumen, dict):
+        resumen["sha256"] = sha256
+    return resumen
@@ -1,41 +1,95 @@
-from typing import List, Dict, Any
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 from sqlalchemy import text
-import pandas as pd
 
+from app.utils.bd import dividir_en_lotes
+from app.utils.consultas import FiltroInvalidoError
+from app.utils.xlsx_stream import xlsx_en_streaming, zip_en_streaming
+from core.config import settings
+from core.consultas_paralelas import ejecutar_consultas
 
-def _rows_to_dicts(result_proxy) -> List[Dict[str, Any]]:
-    try:
-        return [dict(r) for r in result_proxy.mappings().all()]
-    except Exception:
-        cols = result_proxy.keys()
-        return [dict(zip(cols, row)) for row in result_proxy.fetchall()]
 
+# Tablas que lee el reporte final (su generación define el ETag del reporte)
+TABLAS_REPORTE_FINAL = (
+    "programas_formacion", "registro_calificado", "estado_de_normas", "grupos", "historico", "centros_formacion",
+)
 
-def get_unified_rows(db) -> pd.DataFrame:
-    """Construye un DataFrame con las columnas solicitadas a partir de tablas existentes.
 
-    Tablas usadas: `programas_formacion`, `registro_calificado`, `estado_de_normas`,
-    `grupos`, `historico`, `centros_formacion`.
-    """
-    # Consulta base de programas con datos de registro y normas
-    sql_programas = text("""
-        SELECT p.cod_programa, p.cod_version, p.PRF_version, p.tipo_formacion, p.nombre_programa,
-            p.nivel_formacion, p.duracion_maxima, p.resolucion, p.fecha_resolucion as prf_fecha_resolucion,
-            p.modalidad, p.apuestas_prioritarias, p.red_conocimiento,
-            r.tipo_tramite AS registro_tipo_tramite,
-            r.numero_resolucion AS registro_num_resolucion,
-            r.fecha_resolucion AS registro_fecha_resolucion,
-            e.nombre_ncl AS norma_nombre_ncl, e.version AS norma_version
-        FROM programas_formacion p
-        LEFT JOIN registro_calificado r ON p.cod_programa = r.cod_programa
-        LEFT JOIN estado_de_normas e ON p.cod_programa = e.cod_programa
-    """)
+# Columnas del reporte final, en orden
+COLUMNAS_REPORTE_FINAL = [
+    'OFERTA','CÓDIGO CENTRO','CENTRO DE FORMACIÓN','DENOMINACIÓN','TIPO OFERTA','NIVEL',
+    '1. DENOMINACIÓN DE LA FORMACIÓN','2. MODALIDAD','3. CÓDIGO PROGRAMA','4. VERSIÓN DEL PROGRAMA',
+    'CÓDIGO-VERSIÓN','NOMBRE DENOMINACIÓN DEL PROGRAMA EN EL CATALOGO','VALIDACIÓN','RESOLUCIÓN',
+    'FECHA DE RESOLUCIÓN','CODIGO SNIES','5. NO. RESOLUCIÓN, FECHA Y CÓDIGO SNIES',
+    'ACTA COMITÉ PRIMARIO CENTRO DE FORMACION','6. JUSTIFICACIÓN DE LA OFERTA EDUCATIVA','7. GRUPOS',
+    '8. CUPOS','DURACIÓN DEL PROGRAMA HORAS','DURACIÓN EN CATALOGO  22/04/2024',
+    'VALIDACIÓN COMPARACIÓN CON CATALOGO  22/04/2024','9. DURACIÓN DEL PROGRAMA (MESES)','10. MUNICIPIO',
+    '11. SEDE','CÓDIGO INDICATIVA','HORARIO FORMACIÓN','Jornada','Apuesta prioritaria','ESTRATEGIA',
+    'FECHA INICIO','FECHA FINALIZACIÓN','ESTADO EN ACTA','ESTADO EN SOFIA PLUS','CONCEPTO GRUPO',
+    'COORDINACIÓN DE FPI (REGIONAL)','INSCRITOS PRIMERA OPCIÓN','INSCRITOS SEGUNDA OPCIÓN','RED DE CONOCIMIENTO',
+    'CERTIFICADOS','PORCENTAJE_CERTIFICADOS',
+]
+
+
+# Expresión SQL de cada columna del reporte en `SQL_REPORTE_FINAL` (las que no
+# aparecen aquí salen vacías). Alias: p = programa, r = último registro calificado,
+# g = agregados de grupos, h = agregados de histórico, c = centro principal.
+_EXPRESIONES_REPORTE = {
+    'OFERTA': "COALESCE(p.tipo_formacion, '')",
+    'CÓDIGO CENTRO': "COALESCE(g.cod_centro, '')",
+    'CENTRO DE FORMACIÓN': "COALESCE(c.nombre_centro, '')",
+    'DENOMINACIÓN': "COALESCE(p.nombre_programa, '')",
+    'TIPO OFERTA': "COALESCE(p.tipo_formacion, '')",
+    'NIVEL': "COALESCE(p.nivel_formacion, '')",
+    '1. DENOMINACIÓN DE LA FORMACIÓN': "COALESCE(p.nombre_programa, '')",
+    '2. MODALIDAD': "COALESCE(p.modalidad, '')",
+    '3. CÓDIGO PROGRAMA': "COALESCE(p.cod_programa, '')",
+    '4. VERSIÓN DEL PROGRAMA': "COALESCE(NULLIF(p.cod_version, ''), p.PRF_version, '')",
+    'CÓDIGO-VERSIÓN': "CONCAT(COALESCE(p.cod_programa, ''), '-', COALESCE(p.cod_version, ''))",
+    'NOMBRE DENOMINACIÓN DEL PROGRAMA EN EL CATALOGO': "COALESCE(p.nombre_programa, '')",
+    'VALIDACIÓN': "COALESCE(r.tipo_tramite, '')",
+    'RESOLUCIÓN': "COALESCE(NULLIF(p.resolucion, ''), r.numero_resolucion, '')",
+    'FECHA DE RESOLUCIÓN': "COALESCE(p.fecha_resolucion, r.fecha_resolucion)",
+    '7. GRUPOS': "COALESCE(g.grupos_count, 0)",
+    '8. CUPOS': "COALESCE(g.cupos_sum, 0)",
+    'DURACIÓN DEL PROGRAMA HORAS': "p.duracion_maxima",
+    'DURACIÓN EN CATALOGO  22/04/2024': "p.duracion_maxima",
+    '10. MUNICIPIO': "g.municipios",
+    '11. SEDE': "COALESCE(c.nombre_centro, '')",
+    'HORARIO FORMACIÓN': "g.jornadas",
+    'Jornada': "g.jornadas",
+    'Apuesta prioritaria': "COALESCE(p.apuestas_prioritarias, '')",
+    'FECHA INICIO': "g.primera_fecha_inicio",
+    'FECHA FINALIZACIÓN': "g.ultima_fecha_fin",
+    'COORDINACIÓN DE FPI (REGIONAL)': "COALESCE(c.nombre_regional, '')",
+    'INSCRITOS PRIMERA OPCIÓN': "COALESCE(h.inscritos_sum, 0)",
+    'INSCRITOS SEGUNDA OPCIÓN': "COALESCE(h.inscritos_segunda, 0)",
+    'RED DE CONOCIMIENTO': "COALESCE(p.red_conocimiento, '')",
+    'CERTIFICADOS': "COALESCE(h.certificados_sum, 0)",
+    'PORCENTAJE_CERTIFICADOS': (
+        "CASE WHEN h.inscritos_sum > 0 THEN h.certificados_sum * 100.0 / h.inscritos_sum ELSE 0 END"
+    ),
+}
 
-    programas = db.execute(sql_programas)
-    programas_rows = _rows_to_dicts(programas)
+# Todo el reporte en una sola consulta (ver `_sql_reporte_final`). Cada tabla
+# secundaria entra como tabla derivada ya agregada por cod_programa, así que sale
+# exactamente una fila por programa: registro_calificado aporta solo su resolución más reciente y
+# estado_de_normas no se une (ninguna columna del reporte sale de ahí y su join
+# multiplicaba los programas por cada norma).
+_SELECCION_REPORTE = ",\n        ".join(
+    "{} AS `{}`".format(_EXPRESIONES_REPORTE.get(columna, "''"), columna) for columna in COLUMNAS_REPORTE_FINAL
+)
 
-    # Agregaciones por programa desde grupos
-    sql_grupos = text("""
+_PLANTILLA_REPORTE = """
+    SELECT {seleccion}
+    FROM programas_formacion p
+    LEFT JOIN (
+        SELECT cod_programa, tipo_tramite, numero_resolucion, fecha_resolucion,
+            ROW_NUMBER() OVER (PARTITION BY cod_programa ORDER BY fecha_resolucion DESC) AS orden
+        FROM registro_calificado
+    ) r ON r.cod_programa = p.cod_programa AND r.orden = 1
+    LEFT JOIN (
         SELECT cod_programa,
             COUNT(*) AS grupos_count,
             SUM(COALESCE(cupo_asignado,0)) AS cupos_sum,
@@ -43,155 +97,220 @@ def get_unified_rows(db) -> pd.DataFrame:
             MAX(fecha_fin) AS ultima_fecha_fin,
             GROUP_CONCAT(DISTINCT jornada) AS jornadas,
             GROUP_CONCAT(DISTINCT cod_municipio) AS municipios,
-            GROUP_CONCAT(DISTINCT cod_centro) AS cod_centros
+            MIN(cod_centro) AS cod_centro
         FROM grupos
+        {donde_grupos}
         GROUP BY cod_programa
-    """)
-    grupos = db.execute(sql_grupos)
-    grupos_map = {r['cod_programa']: r for r in _rows_to_dicts(grupos)}
-
-    # Agregación historico por programa (uniendo por grupo -> programa)
-    sql_historico = text("""
-        SELECT g.cod_programa,
+    ) g ON g.cod_programa = p.cod_programa
+    LEFT JOIN (
+        SELECT gr.cod_programa,
             SUM(COALESCE(h.num_aprendices_inscritos,0)) AS inscritos_sum,
             SUM(COALESCE(h.num_aprendices_en_transito,0)) AS inscritos_segunda,
             SUM(COALESCE(h.num_aprendices_certificados,0)) AS certificados_sum
         FROM historico h
-        JOIN grupos g ON g.ficha = h.id_grupo
-        GROUP BY g.cod_programa
+        JOIN grupos gr ON gr.ficha = h.id_grupo
+        {donde_historico}
+        GROUP BY gr.cod_programa
+    ) h ON h.cod_programa = p.cod_programa
+    LEFT JOIN centros_formacion c ON c.cod_centro = g.cod_centro
+    {donde}
+"""
+
+# Filtros del reporte (todos aceptan varios valores). Los de grupos restringen
+# los grupos que se agregan, así que los totales son solo los de esos centros,
+# y dejan fuera los programas sin grupos en ellos. `{g}` es el alias de grupos.
+_FILTROS_GRUPOS = {
+    "cod_centro": "{g}cod_centro IN :cod_centro",
+    "cod_regional": "{g}cod_centro IN (SELECT cod_centro FROM centros_formacion WHERE cod_regional IN :cod_regional)",
+}
+_FILTROS_PROGRAMA = {
+    "red_conocimiento": "p.red_conocimiento IN :red_conocimiento",
+    "nivel": "p.nivel_formacion IN :nivel",
+    "modalidad": "p.modalidad IN :modalidad",
+}
+FILTROS_REPORTE = (*_FILTROS_GRUPOS, *_FILTROS_PROGRAMA)
+
+
+def _donde(condiciones: List[str]) -> str:
+    return f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+
+def _condiciones_filtros(filtros: Sequence[str], alias_grupos: str) -> List[str]:
+    return (
+        [_FILTROS_GRUPOS[f].format(g=alias_grupos) for f in filtros if f in _FILTROS_GRUPOS]
+        + [_FILTROS_PROGRAMA[f] for f in filtros if f in _FILTROS_PROGRAMA]
+    )
+
+
+@lru_cache(maxsize=None)
+def _sql_reporte_final(filtros: tuple):
+    """Consulta del reporte con los `filtros` indicados (se compila una vez por combinación)."""
+    por_grupos = [f for f in filtros if f in _FILTROS_GRUPOS]
+    exterior = [_FILTROS_PROGRAMA[f] for f in filtros if f in _FILTROS_PROGRAMA]
+    if por_grupos:
+        exterior.append("g.cod_programa IS NOT NULL")
+    return text(_PLANTILLA_REPORTE.format(
+        seleccion=_SELECCION_REPORTE,
+        donde_grupos=_donde([_FILTROS_GRUPOS[f].format(g="") for f in por_grupos]),
+        donde_historico=_donde([_FILTROS_GRUPOS[f].format(g="gr.") for f in por_grupos]),
+        donde=_donde(exterior),
+    ))
+
+
+SQL_REPORTE_FINAL = _sql_reporte_final(())
+
+
+def _parametros_filtros(filtros: Optional[Dict[str, Any]]) -> Tuple[tuple, Dict[str, tuple]]:
+    """Nombres de los filtros con valor (en orden estable) y sus parámetros para `IN`.
+
+    Raises:
+        FiltroInvalidoError: Si algún filtro no está en FILTROS_REPORTE.
+    """
+    filtros = {k: v for k, v in (filtros or {}).items() if v}
+    invalidos = [f for f in filtros if f not in FILTROS_REPORTE]
+    if invalidos:
+        raise FiltroInvalidoError(
+            f"Filtros no permitidos: {', '.join(invalidos)}. Permitidos: {', '.join(FILTROS_REPORTE)}"
+        )
+    nombres = tuple(f for f in FILTROS_REPORTE if f in filtros)
+    return nombres, {f: tuple(filtros[f]) for f in nombres}
+
+_INDICE_PORCENTAJE = COLUMNAS_REPORTE_FINAL.index('PORCENTAJE_CERTIFICADOS')
+
+
+def _fila_alerta(fila: Dict[str, Any]) -> Dict[str, Any]:
+    """Fila adicional cuando los certificados superan el 30% de los inscritos."""
+    return {
+        'OFERTA': 'ALERTA: CERTIFICADOS > 30%',
+        '3. CÓDIGO PROGRAMA': fila.get('3. CÓDIGO PROGRAMA'),
+        'DENOMINACIÓN': fila.get('DENOMINACIÓN'),
+        'INSCRITOS PRIMERA OPCIÓN': fila.get('INSCRITOS PRIMERA OPCIÓN'),
+        'CERTIFICADOS': fila.get('CERTIFICADOS'),
+        'PORCENTAJE_CERTIFICADOS': fila.get('PORCENTAJE_CERTIFICADOS'),
+        'CONCEPTO GRUPO': 'Alerta generada automáticamente: más del 30% certificados'
+    }
+
+
+def _con_alertas(filas: Iterable[Sequence[Any]]) -> Iterator[Sequence[Any]]:
+    """Emite `filas` y al final una fila de alerta por cada programa con certificados > 30%."""
+    alertas = []
+    for fila in filas:
+        yield fila
+        if float(fila[_INDICE_PORCENTAJE] or 0) > 30:
+            alertas.append(fila)
+
+    for fila in alertas:
+        alerta = _fila_alerta(dict(zip(COLUMNAS_REPORTE_FINAL, fila)))
+        yield [alerta.get(c) for c in COLUMNAS_REPORTE_FINAL]
+
+
+def iter_reporte_final(db, filtros: Optional[Dict[str, Any]] = None) -> Iterator[Sequence[Any]]:
+    """Genera las filas del reporte final como secuencias en el orden de COLUMNAS_REPORTE_FINAL.
+
+    Una sola consulta (`_sql_reporte_final`) recorrida con cursor del lado del
+    servidor; en Python solo se detectan las alertas (certificados > 30%), que
+    se emiten al final.
+
+    Args:
+        filtros: {nombre: lista de valores} con nombres de FILTROS_REPORTE; se
+            aplican en la consulta.
+
+    Raises:
+        FiltroInvalidoError: Si algún filtro no está en FILTROS_REPORTE.
+    """
+    nombres, parametros = _parametros_filtros(filtros)
+    sql = _sql_reporte_final(nombres).execution_options(stream_results=True)
+    return _con_alertas(db.execute(sql, parametros))
+
+
+def fila_sin_datos() -> Dict[str, Any]:
+    """Fila informativa para que el Excel se genere aunque no haya programas."""
+    info_row = {c: '' for c in COLUMNAS_REPORTE_FINAL}
+    info_row['DENOMINACIÓN'] = 'No hay registros en programas_formacion'
+    return info_row
+
+
+
+def _filas_o_aviso(filas: Iterator[Sequence[Any]]) -> Iterable[Sequence[Any]]:
+    """`filas`, o la fila informativa si no hay ninguna (lee la primera de inmediato)."""
+    primera = next(filas, None)
+    if primera is None:
+        return [[fila_sin_datos()[columna] for columna in COLUMNAS_REPORTE_FINAL]]
+    return chain([primera], filas)
+
+
+def xlsx_reporte_final(db, filtros: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """Reporte final como XLSX por bloques de bytes (para StreamingResponse o para un snapshot).
+
+    La primera fila se lee al llamar: los errores de la consulta se lanzan aquí
+    y no a mitad de la respuesta.
+    """
+    filas = _filas_o_aviso(iter_reporte_final(db, filtros))
+    return xlsx_en_streaming([("Reporte_Final", COLUMNAS_REPORTE_FINAL, filas)])
+
+
+def centros_reporte(db, filtros: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Centros con grupos de programas que cumplen `filtros` (las particiones del reporte)."""
+    nombres, parametros = _parametros_filtros(filtros)
+    sql = text(f"""
+        SELECT DISTINCT g.cod_centro, c.nombre_centro
+        FROM grupos g
+        JOIN programas_formacion p ON p.cod_programa = g.cod_programa
+        LEFT JOIN centros_formacion c ON c.cod_centro = g.cod_centro
+        {_donde(["g.cod_centro IS NOT NULL", *_condiciones_filtros(nombres, "g.")])}
+        ORDER BY g.cod_centro
     """)
-    historico = db.execute(sql_historico)
-    historico_map = {r['cod_programa']: r for r in _rows_to_dicts(historico)}
-
-    # Mapa rápido de centros_formacion por codigo (para nombre y regional)
-    sql_centros = text("SELECT cod_centro, nombre_centro, nombre_regional FROM centros_formacion")
-    centros = db.execute(sql_centros)
-    centros_map = {str(r['cod_centro']): r for r in _rows_to_dicts(centros)}
-
-    rows = []
-    for p in programas_rows:
-        cod = p.get('cod_programa')
-        g = grupos_map.get(cod, {})
-        h = historico_map.get(cod, {})
-
-        # Tomar primer centro si existe (lista en cod_centros separada por commas)
-        centro_codigo = None
-        if g and g.get('cod_centros'):
-            centro_codigo = str(g['cod_centros']).split(',')[0]
-
-        centro_info = centros_map.get(centro_codigo) if centro_codigo else None
-
-        fila = {
-            'OFERTA': p.get('tipo_formacion') or '',
-            'CÓDIGO CENTRO': centro_codigo or '',
-            'CENTRO DE FORMACIÓN': centro_info.get('nombre_centro') if centro_info else '',
-            'DENOMINACIÓN': p.get('nombre_programa') or '',
-            'TIPO OFERTA': p.get('tipo_formacion') or '',
-            'NIVEL': p.get('nivel_formacion') or '',
-            '1. DENOMINACIÓN DE LA FORMACIÓN': p.get('nombre_programa') or '',
-            '2. MODALIDAD': p.get('modalidad') or '',
-            '3. CÓDIGO PROGRAMA': p.get('cod_programa') or '',
-            '4. VERSIÓN DEL PROGRAMA': p.get('cod_version') or p.get('PRF_version') or '',
-            'CÓDIGO-VERSIÓN': f"{p.get('cod_programa','')}-{p.get('cod_version','')}",
-            'NOMBRE DENOMINACIÓN DEL PROGRAMA EN EL CATALOGO': p.get('nombre_programa') or '',
-            'VALIDACIÓN': p.get('registro_tipo_tramite') or '',
-            'RESOLUCIÓN': p.get('resolucion') or p.get('registro_num_resolucion') or '',
-            'FECHA DE RESOLUCIÓN': p.get('prf_fecha_resolucion') or p.get('registro_fecha_resolucion') or None,
-            'CODIGO SNIES': '',
-            '5. NO. RESOLUCIÓN, FECHA Y CÓDIGO SNIES': '',
-            'ACTA COMITÉ PRIMARIO CENTRO DE FORMACION': '',
-            '6. JUSTIFICACIÓN DE LA OFERTA EDUCATIVA': '',
-            '7. GRUPOS': int(g.get('grupos_count') or 0),
-            '8. CUPOS': int(g.get('cupos_sum') or 0),
-            'DURACIÓN DEL PROGRAMA HORAS': p.get('duracion_maxima') or '',
-            'DURACIÓN EN CATALOGO  22/04/2024': p.get('duracion_maxima') or '',
-            'VALIDACIÓN COMPARACIÓN CON CATALOGO  22/04/2024': '',
-            '9. DURACIÓN DEL PROGRAMA (MESES)': '',
-            '10. MUNICIPIO': g.get('municipios') if g else '',
-            '11. SEDE': centro_info.get('nombre_centro') if centro_info else '',
-            'CÓDIGO INDICATIVA': '',
-            'HORARIO FORMACIÓN': g.get('jornadas') if g else '',
-            'Jornada': g.get('jornadas') if g else '',
-            'Apuesta prioritaria': p.get('apuestas_prioritarias') or '',
-            'ESTRATEGIA': '',
-            'FECHA INICIO': g.get('primera_fecha_inicio') if g else None,
-            'FECHA FINALIZACIÓN': g.get('ultima_fecha_fin') if g else None,
-            'ESTADO EN ACTA': '',
-            'ESTADO EN SOFIA PLUS': '',
-            'CONCEPTO GRUPO': '',
-            'COORDINACIÓN DE FPI (REGIONAL)': centro_info.get('nombre_regional') if centro_info else '',
-            'INSCRITOS PRIMERA OPCIÓN': int(h.get('inscritos_sum') or 0),
-            'INSCRITOS SEGUNDA OPCIÓN': int(h.get('inscritos_segunda') or 0),
-            'CERTIFICADOS': int(h.get('certificados_sum') or 0),
-            # porcentaje como float 0-100 (más útil para cálculos), se puede formatear luego
-            'PORCENTAJE_CERTIFICADOS': (
-                (int(h.get('certificados_sum') or 0) / int(h.get('inscritos_sum') or 1)) * 100
-                if (int(h.get('inscritos_sum') or 0) > 0) else 0
-            ),
-            'RED DE CONOCIMIENTO': p.get('red_conocimiento') or ''
-        }
-
-        rows.append(fila)
-
-    # Crear filas adicionales de alerta cuando certificados > 30% de inscritos
-    alert_rows = []
-    for r in rows:
-        try:
-            pct = float(r.get('PORCENTAJE_CERTIFICADOS') or 0)
-        except Exception:
-            pct = 0
-        if pct > 30:
-            alert = {
-                'OFERTA': 'ALERTA: CERTIFICADOS > 30%',
-                '3. CÓDIGO PROGRAMA': r.get('3. CÓDIGO PROGRAMA'),
-                'DENOMINACIÓN': r.get('DENOMINACIÓN'),
-                'INSCRITOS PRIMERA OPCIÓN': r.get('INSCRITOS PRIMERA OPCIÓN'),
-                'CERTIFICADOS': r.get('CERTIFICADOS'),
-                'PORCENTAJE_CERTIFICADOS': r.get('PORCENTAJE_CERTIFICADOS'),
-                'CONCEPTO GRUPO': 'Alerta generada automáticamente: más del 30% certificados'
-            }
-            alert_rows.append(alert)
-
-    # Añadir alertas al final
-    rows.extend(alert_rows)
-
-    df = pd.DataFrame(rows)
-
-    desired_order = [
-        'OFERTA','CÓDIGO CENTRO','CENTRO DE FORMACIÓN','DENOMINACIÓN','TIPO OFERTA','NIVEL',
-        '1. DENOMINACIÓN DE LA FORMACIÓN','2. MODALIDAD','3. CÓDIGO PROGRAMA','4. VERSIÓN DEL PROGRAMA',
-        'CÓDIGO-VERSIÓN','NOMBRE DENOMINACIÓN DEL PROGRAMA EN EL CATALOGO','VALIDACIÓN','RESOLUCIÓN',
-        'FECHA DE RESOLUCIÓN','CODIGO SNIES','5. NO. RESOLUCIÓN, FECHA Y CÓDIGO SNIES',
-        'ACTA COMITÉ PRIMARIO CENTRO DE FORMACION','6. JUSTIFICACIÓN DE LA OFERTA EDUCATIVA','7. GRUPOS',
-        '8. CUPOS','DURACIÓN DEL PROGRAMA HORAS','DURACIÓN EN CATALOGO  22/04/2024',
-        'VALIDACIÓN COMPARACIÓN CON CATALOGO  22/04/2024','9. DURACIÓN DEL PROGRAMA (MESES)','10. MUNICIPIO',
-        '11. SEDE','CÓDIGO INDICATIVA','HORARIO FORMACIÓN','Jornada','Apuesta prioritaria','ESTRATEGIA',
-        'FECHA INICIO','FECHA FINALIZACIÓN','ESTADO EN ACTA','ESTADO EN SOFIA PLUS','CONCEPTO GRUPO',
-        'COORDINACIÓN DE FPI (REGIONAL)','INSCRITOS PRIMERA OPCIÓN','INSCRITOS SEGUNDA OPCIÓN','RED DE CONOCIMIENTO'
-    ]
-
-    # Añadimos las nuevas columnas a desired_order si no existen
-    if 'CERTIFICADOS' not in desired_order:
-        desired_order.append('CERTIFICADOS')
-    if 'PORCENTAJE_CERTIFICADOS' not in desired_order:
-        desired_order.append('PORCENTAJE_CERTIFICADOS')
-
-    existing_cols = [c for c in desired_order if c in df.columns]
-    # Si no hay columnas existentes (p. ej. tablas vacías), crear un DataFrame
-    # con las columnas esperadas y una fila informativa para que el Excel todavía
-    # se genere y pueda descargarse desde la API.
-    if not existing_cols:
-        # Crear DataFrame con las columnas deseadas y una fila explicativa
-        df = pd.DataFrame(columns=desired_order)
-        info_row = {c: '' for c in desired_order}
-        # Mensaje claro en una columna relevante
-        if 'DENOMINACIÓN' in desired_order:
-            info_row['DENOMINACIÓN'] = 'No hay registros en programas_formacion'
-        else:
-            # si por alguna razón no existe esa columna, usar la primera
-            info_row[desired_order[0]] = 'No hay registros en programas_formacion'
-        df = pd.DataFrame([info_row])
-    else:
-        df = df[existing_cols]
-
-    return df
+    return [dict(r) for r in db.execute(sql, parametros).mappings().all()]
+
+
+def _iter_particiones_centro(db, filtros: Optional[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], List[Sequence[Any]]]]:
+    """
+    (centro, filas) del reporte filtrado a cada centro. Las consultas de cada
+    lote de centros corren en paralelo (`ejecutar_consultas`); en memoria solo
+    quedan las filas del lote en curso.
+    """
+    centros = centros_reporte(db, filtros)
+    base = {k: v for k, v in (filtros or {}).items() if v and k not in _FILTROS_GRUPOS}
+    # Los filtros de grupos ya se usaron para elegir los centros; cada partición filtra por el suyo
+    for lote in dividir_en_lotes(centros, settings.CONSULTAS_PARALELAS_WORKERS):
+        consultas = {}
+        for centro in lote:
+            nombres, parametros = _parametros_filtros({**base, "cod_centro": [centro["cod_centro"]]})
+            consultas[str(centro["cod_centro"])] = (_sql_reporte_final(nombres), parametros)
+        resultados = ejecutar_consultas(db.get_bind(), consultas)
+        for centro in lote:
+            filas = resultados[str(centro["cod_centro"])]
+            yield centro, list(_con_alertas([list(fila.values()) for fila in filas]))
+
+
+def _titulo_centro(centro: Dict[str, Any]) -> str:
+    return f"{centro['cod_centro']} {centro.get('nombre_centro') or ''}".strip()
+
+
+def xlsx_reporte_por_centro(db, filtros: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """Reporte final en un XLSX con una hoja por centro de formación."""
+    particiones = _iter_particiones_centro(db, filtros)
+    primera = next(particiones, None)
+    if primera is None:
+        return xlsx_reporte_final(db, filtros)
+    hojas = (
+        (_titulo_centro(centro), COLUMNAS_REPORTE_FINAL, filas)
+        for centro, filas in chain([primera], particiones)
+    )
+    return xlsx_en_streaming(hojas)
+
+
+def zip_reporte_por_centro(db, filtros: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """ZIP con un XLSX del reporte final por centro de formación."""
+    particiones = _iter_particiones_centro(db, filtros)
+    primera = next(particiones, None)
+    if primera is None:
+        return zip_en_streaming([("reporte_final.xlsx", xlsx_reporte_final(db, filtros))])
+    archivos = (
+        (
+            f"reporte_final_{centro['cod_centro']}.xlsx",
+            xlsx_en_streaming([(_titulo_centro(centro), COLUMNAS_REPORTE_FINAL, filas)]),
+        )
+        for centro, filas in chain([primera], particiones)
+    )
+    return zip_en_streaming(archivos)
@@ -0,0 +1,133 @@
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from app.utils.bd import dividir_en_lotes
+from app.utils.consultas import FiltroInvalidoError, seleccionar_columnas
+from core.cache import marcar_modificadas
+
+logger = logging.getLogger(__name__)
+
+# Tablas resumen del histórico: nombre -> (tabla, columna clave, expresión SQL de la clave)
+RESUMENES_HISTORICO = {
+    "programa": ("resumen_historico_programa", "cod_programa", "grupos.cod_programa"),
+    "centro": ("resumen_historico_centro", "cod_centro", "grupos.cod_centro"),
+    "municipio": ("resumen_historico_municipio", "cod_municipio", "grupos.cod_municipio"),
+    "mes": ("resumen_historico_mes", "periodo", "DATE_FORMAT(grupos.fecha_inicio, '%Y-%m')"),
+}
+
+# Medidas guardadas en cada tabla resumen: columna -> expresión de agregación
+MEDIDAS_RESUMEN = {
+    "num_fichas": "COUNT(DISTINCT grupos.ficha)",
+    "num_registros": "COUNT(*)",
+    "cupo_asignado": "COALESCE(SUM(grupos.cupo_asignado), 0)",
+    "num_aprendices_matriculados": "COALESCE(SUM(grupos.num_aprendices_matriculados), 0)",
+    **{
+        columna: f"COALESCE(SUM(historico.{columna}), 0)"
+        for columna in (
+            "num_aprendices_inscritos", "num_aprendices_en_transito", "num_aprendices_formacion",
+            "num_aprendices_induccion", "num_aprendices_condicionados", "num_aprendices_aplazados",
+            "num_aprendices_retirado_voluntario", "num_aprendices_cancelados", "num_aprendices_reprobados",
+            "num_aprendices_no_aptos", "num_aprendices_reingresados", "num_aprendices_por_certificar",
+            "num_aprendices_certificados", "num_aprendices_trasladados",
+        )
+    },
+}
+
+_FROM_RESUMEN = """
+    FROM historico
+    INNER JOIN grupos ON historico.id_grupo = grupos.ficha
+"""
+
+
+def claves_afectadas(db: Session, fichas: Iterable[int]) -> Dict[str, set]:
+    """
+    Devuelve, para cada tabla resumen, las claves (programa, centro, municipio,
+    mes) a las que pertenecen actualmente las `fichas`.
+    """
+    fichas = list(dict.fromkeys(int(f) for f in fichas))
+    claves = {nombre: set() for nombre in RESUMENES_HISTORICO}
+    if not fichas:
+        return claves
+
+    expresiones = ", ".join(f"{expr} AS {nombre}" for nombre, (_, _, expr) in RESUMENES_HISTORICO.items())
+    sql = text(f"SELECT DISTINCT {expresiones} FROM grupos WHERE grupos.ficha IN :fichas")
+    for lote in dividir_en_lotes(fichas):
+        for fila in db.execute(sql, {"fichas": tuple(lote)}).mappings():
+            for nombre in RESUMENES_HISTORICO:
+                if fila[nombre] is not None:
+                    claves[nombre].add(fila[nombre])
+    return claves
+
+
+def _recalcular(db: Session, nombre: str, claves: Optional[List] = None) -> int:
+    """Recalcula las filas de la tabla resumen `nombre` (todas si `claves` es None)."""
+    tabla, columna, expr = RESUMENES_HISTORICO[nombre]
+    marcar_modificadas(db, tabla)
+    columnas = [columna, *MEDIDAS_RESUMEN]
+    select = (
+        f"SELECT {expr}, {', '.join(MEDIDAS_RESUMEN.values())} {_FROM_RESUMEN} "
+        f"WHERE {expr} IS NOT NULL"
+    )
+    insert = f"INSERT INTO {tabla} ({', '.join(columnas)}) "
+
+    if claves is None:
+        db.execute(text(f"DELETE FROM {tabla}"))
+        return db.execute(text(f"{insert}{select} GROUP BY {expr}")).rowcount or 0
+
+    recalculadas = 0
+    for lote in dividir_en_lotes(list(claves)):
+        parametros = {"claves": tuple(lote)}
+        db.execute(text(f"DELETE FROM {tabla} WHERE {columna} IN :claves"), parametros)
+        resultado = db.execute(text(f"{insert}{select} AND {expr} IN :claves GROUP BY {expr}"), parametros)
+        recalculadas += resultado.rowcount or 0
+    return recalculadas
+
+
+def refrescar_resumenes(db: Session, claves: Dict[str, set]) -> int:
+    """
+    Recalcula solo las filas resumen de `claves` ({nombre: claves}, ver
+    `claves_afectadas`) y hace commit. Devuelve el número de filas recalculadas.
+    """
+    recalculadas = 0
+    for nombre, valores in claves.items():
+        if valores:
+            recalculadas += _recalcular(db, nombre, valores)
+    db.commit()
+    return recalculadas
+
+
+def reconstruir_resumenes(db: Session) -> Dict[str, int]:
+    """Reconstruye por completo todas las tablas resumen del histórico."""
+    try:
+        filas = {nombre: _recalcular(db, nombre) for nombre in RESUMENES_HISTORICO}
+        db.commit()
+        return filas
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error al reconstruir los resúmenes del histórico: {e}")
+        raise
+
+
+def obtener_resumen(db: Session, nombre: str, columnas: Optional[List[str]] = None) -> List[dict]:
+    """
+    Lee la tabla resumen `nombre` completa (o solo `columnas` de MEDIDAS_RESUMEN).
+
+    Raises:
+        FiltroInvalidoError: Si el resumen o alguna columna no existen.
+    """
+    if nombre not in RESUMENES_HISTORICO:
+        raise FiltroInvalidoError(
+            f"Resumen no disponible: '{nombre}'. Disponibles: {', '.join(RESUMENES_HISTORICO)}"
+        )
+    tabla, columna, _ = RESUMENES_HISTORICO[nombre]
+    disponibles = {columna: columna, **{medida: medida for medida in MEDIDAS_RESUMEN}}
+    seleccion = seleccionar_columnas(columnas, disponibles, obligatorias=(columna,))
+    try:
+        query = text(f"SELECT {seleccion} FROM {tabla} ORDER BY {columna}")
+        return [dict(fila) for fila in db.execute(query).mappings().all()]
+    except SQLAlchemyError as e:
+        logger.error(f"Error al leer el resumen {nombre}: {e}")
+        raise
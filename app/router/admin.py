@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.cache import incrementar_generacion, limpiar_cache, metricas_cache
+from core.database import get_db
+from core.esquema import esquema_registrado, refrescar_esquema
+from core.snapshots import almacen_snapshots
+from app.crud.resumenes import reconstruir_resumenes
+from app.router.dependencies import get_current_admin
+from app.router.reporte_final import SNAPSHOT_REPORTE_FINAL
+from app.schemas.usuarios import RetornoUsuario
+
+router = APIRouter()
+
+
+@router.post("/summaries/rebuild", status_code=status.HTTP_200_OK)
+def rebuild_summaries(
+    db: Session = Depends(get_db),
+    user_token: RetornoUsuario = Depends(get_current_admin)
+):
+    """
+    Reconstruye desde cero las tablas resumen del histórico (programa, centro,
+    municipio y mes). Las cargas solo recalculan las claves que tocan; esto sirve
+    tras cambios manuales en la base de datos o si un refresco falló.
+    """
+    try:
+        filas = reconstruir_resumenes(db)
+        return {"exitoso": True, "filas": filas}
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/metrics", status_code=status.HTTP_200_OK)
+def cache_metrics(user_token: RetornoUsuario = Depends(get_current_admin)):
+    """Aciertos/fallos de la caché de consultas, entradas y generación de cada tabla."""
+    return metricas_cache()
+
+
+@router.post("/cache/clear", status_code=status.HTTP_200_OK)
+def cache_clear(user_token: RetornoUsuario = Depends(get_current_admin)):
+    """Vacía la caché local de este proceso."""
+    limpiar_cache()
+    return {"exitoso": True}
+
+
+@router.post("/cache/invalidate", status_code=status.HTTP_200_OK)
+def cache_invalidate(
+    tabla: List[str] = Query(..., description="Tablas modificadas fuera de la API (p. ej. `historico`)"),
+    user_token: RetornoUsuario = Depends(get_current_admin)
+):
+    """Nueva generación para `tabla`: invalida su caché y los ETags que dependen de ella."""
+    incrementar_generacion(*tabla)
+    return {"exitoso": True, "tablas": tabla}
+
+
+@router.get("/schema", status_code=status.HTTP_200_OK)
+def schema(user_token: RetornoUsuario = Depends(get_current_admin)):
+    """Columnas registradas por tabla (ver core/esquema.py)."""
+    return esquema_registrado()
+
+
+@router.post("/schema/refresh", status_code=status.HTTP_200_OK)
+def schema_refresh(user_token: RetornoUsuario = Depends(get_current_admin)):
+    """Vuelve a leer el esquema de las tablas en su próximo uso (tras un ALTER TABLE)."""
+    return {"exitoso": True, "tablas": refrescar_esquema()}
+
+
+@router.get("/reports/snapshots", status_code=status.HTTP_200_OK)
+def report_snapshots(user_token: RetornoUsuario = Depends(get_current_admin)):
+    """Versión actual de los datos del reporte final y snapshots guardados en disco."""
+    return {
+        "version_actual": almacen_snapshots.version(SNAPSHOT_REPORTE_FINAL),
+        "snapshots": almacen_snapshots.listar(SNAPSHOT_REPORTE_FINAL),
+    }
+
+
+@router.post("/reports/snapshots/regenerate", status_code=status.HTTP_202_ACCEPTED)
+def regenerate_report_snapshot(user_token: RetornoUsuario = Depends(get_current_admin)):
+    """Encola la generación del snapshot del reporte final para la versión actual."""
+    version = almacen_snapshots.version(SNAPSHOT_REPORTE_FINAL)
+    almacen_snapshots.programar(SNAPSHOT_REPORTE_FINAL, version)
+    return {"exitoso": True, "version": version}
@@ -1,91 +1,196 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, status
 import pandas as pd
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from io import BytesIO
+from typing import Dict, Optional
+from zipfile import BadZipFile
+from openpyxl.utils.exceptions import InvalidFileException
 import logging
-from app.crud.cargar_archivos_historico import insertar_historico_completo_en_bd
+from app.crud.cargar_archivos_historico import (
+    guardar_huellas_historico,
+    insertar_historico_completo_en_bd,
+    obtener_huellas_historico,
+    refrescar_resumenes_historico,
+)
+from app.crud.registro_cargas import cargar_con_registro
 from core.database import get_db
 from app.router.dependencies import get_current_user
+from app.router.trabajos import encolar_carga
 from app.schemas.usuarios import RetornoUsuario
+from app.utils.excel import TAMANO_BLOQUE_DEFECTO
+from app.utils.ingesta import ArchivoInvalidoError, procesar_excel_por_bloques
+from app.utils.normalizacion import normalizar_enteros, normalizar_fechas
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Mapeo exacto de las 36 columnas del Excel según el orden mostrado
+COLUMNAS_MAPEO_HISTORICO = {
+    # Columnas 1-5: Regional y Centro
+    "CODIGO_REGIONAL": "cod_regional",
+    "NOMBRE_REGIONAL": "nombre_regional",
+    "CODIGO_CENTRO": "cod_centro",
+    "NOMBRE_CENTRO": "nombre_centro",
+    "DATOS": "datos_centro",
+    "DATOS_CENTRO": "datos_centro",
+    
+    # Columnas 6-9: Programa de formación
+    "CODIGO_PROGRAMA_FORMACION": "cod_programa",
+    "VERSION": "version",
+    "VERSION_PROGRAMA": "version",
+    "TIPO_PROGRAMA": "tipo_programa",
+    "NIVEL": "nivel",
+    "NIVEL_FORMACION": "nivel",
+    
+    # Columnas 10-14: Configuración del grupo
+    "JORNADA": "jornada",
+    "ID_MUNICIPIO": "cod_municipio",
+    "MUNICIPIO": "nombre_municipio",
+    "FIC_MC": "cod_estrategia",
+    "FIC_MOD_FORMACION": "cod_estrategia",
+    "MODALIDAD": "modalidad",
+    "MODALIDAD_FORMACION": "modalidad",
+    
+    # Columnas 15-21: Información de la ficha
+    "FICHA": "ficha",
+    "FECHA_INICIO": "fecha_inicio",
+    "FECHA_FIN": "fecha_fin",
+    "MESES_DURACION": "duracion_meses",
+    "DRURACION_PROGRAMA": "duracion_meses",
+    "ESTADO": "estado_curso",
+    "ESTADO_FICHA": "estado_curso",
+    "CODIGO_ESTADO": "codigo_estado",
+    "NOMBRE_ESTADO": "nombre_estado",
+    
+    # Columnas 22-36: Datos históricos de aprendices
+    "INSCRITOS": "num_aprendices_inscritos",
+    "MATRICULADOS": "num_aprendices_matriculados",
+    "EN_TRAINING": "num_aprendices_en_transito",
+    "EN_TRANSITO": "num_aprendices_en_transito",
+    "FORMACION": "num_aprendices_formacion",
+    "INDUCCION": "num_aprendices_induccion",
+    "CONDICIONADOS": "num_aprendices_condicionados",
+    "APLAZADOS": "num_aprendices_aplazados",
+    "RETIRO": "num_aprendices_retirado_voluntario",
+    "RETIROS_VOLUNTARIOS": "num_aprendices_retirado_voluntario",
+    "CANCELADOS": "num_aprendices_cancelados",
+    "REPROBADOS": "num_aprendices_reprobados",
+    "NO_APROBADOS": "num_aprendices_no_aptos",
+    "NO_APTOS": "num_aprendices_no_aptos",
+    "REINGRESO": "num_aprendices_reingresados",
+    "REINGRESADO": "num_aprendices_reingresados",
+    "POR_CERTIFICAR": "num_aprendices_por_certificar",
+    "CERTIFICADOS": "num_aprendices_certificados",
+    "TRASLADOS": "num_aprendices_trasladados",
+    "TRASLADADOS": "num_aprendices_trasladados",
+    
+    # Variantes adicionales para compatibilidad
+    "IDENTIFICADOR_FICHA": "ficha",
+    "CODIGO_PROGRAMA": "cod_programa",
+    "COD_PROGRAMA": "cod_programa",
+    "CODIGO_CENTRO": "cod_centro",
+    "COD_REGIONAL": "cod_regional",
+    "COD_MUNICIPIO": "cod_municipio",
+    "CODIGO_MUNICIPIO": "cod_municipio",
+    "FECHA_INI": "fecha_inicio",
+    "ESTADO_CURSO": "estado_curso",
+    "EN_TRANSITO": "num_aprendices_en_transito",
+    "RETIRADO_VOLUNTARIO": "num_aprendices_retirado_voluntario",
+    "NO_APTOS": "num_aprendices_no_aptos",
+    "REINGRESADOS": "num_aprendices_reingresados",
+    "PROGRAMA_FORMACION": "nombre_programa",
+}
+
 
-def _eliminar_duplicados_historico(df: pd.DataFrame):
+# Columnas que identifican un registro de grupo/histórico (las 36 columnas mapeadas del Excel)
+COLUMNAS_COMPARACION_HISTORICO = [
+    "cod_regional",           # 1. CODIGO_REGIONAL
+    "nombre_regional",        # 2. NOMBRE_REGIONAL
+    "cod_centro",             # 3. CODIGO_CENTRO
+    "nombre_centro",          # 4. NOMBRE_CENTRO
+    "datos_centro",          # 5. DATOS
+    "cod_programa",          # 6. CODIGO_PROGRAMA_FORMACION
+    "version",                # 7. VERSION
+    "tipo_programa",          # 8. TIPO_PROGRAMA
+    "nivel",                  # 9. NIVEL
+    "jornada",                # 10. JORNADA
+    "cod_municipio",          # 11. ID_MUNICIPIO
+    "nombre_municipio",       # 12. MUNICIPIO
+    "cod_estrategia",         # 13. FIC_MC
+    "modalidad",              # 14. MODALIDAD
+    "ficha",                  # 15. FICHA
+    "fecha_inicio",           # 16. FECHA_INICIO
+    "fecha_fin",              # 17. FECHA_FIN
+    "duracion_meses",         # 18. MESES_DURACION
+    "estado_curso",           # 19. ESTADO
+    "codigo_estado",          # 20. CODIGO_ESTADO
+    "nombre_estado",          # 21. NOMBRE_ESTADO
+    "num_aprendices_inscritos",      # 22. INSCRITOS
+    "num_aprendices_matriculados",   # 23. MATRICULADOS
+    "num_aprendices_en_transito",    # 24. EN_TRAINING
+    "num_aprendices_formacion",      # 25. FORMACION
+    "num_aprendices_induccion",      # 26. INDUCCION
+    "num_aprendices_condicionados",  # 27. CONDICIONADOS
+    "num_aprendices_aplazados",      # 28. APLAZADOS
+    "num_aprendices_retirado_voluntario",  # 29. RETIRO
+    "num_aprendices_cancelados",     # 30. CANCELADOS
+    "num_aprendices_reprobados",     # 31. REPROBADOS
+    "num_aprendices_no_aptos",       # 32. NO_APROBADOS
+    "num_aprendices_reingresados",   # 33. REINGRESO
+    "num_aprendices_por_certificar", # 34. POR_CERTIFICAR
+    "num_aprendices_certificados",  # 35. CERTIFICADOS
+    "num_aprendices_trasladados"     # 36. TRASLADOS
+    # "id_grupo",
+    # "ficha",
+    # "cod_programa",
+    # "cod_centro",
+    # "modalidad",
+    # "jornada",
+    # "etapa_ficha",
+    # "estado_curso",
+    # "cod_municipio",
+    # "cod_estrategia",
+    # "num_aprendices_inscritos",
+    # "num_aprendices_matriculados",
+    # "num_aprendices_en_transito",
+    # "num_aprendices_formacion",
+    # "num_aprendices_induccion",
+    # "num_aprendices_condicionados",
+    # "num_aprendices_aplazados",
+    # "num_aprendices_retirado_voluntario",
+    # "num_aprendices_cancelados",
+    # "num_aprendices_reprobados",
+    # "num_aprendices_no_aptos",
+    # "num_aprendices_reingresados",
+    # "num_aprendices_por_certificar",
+    # "num_aprendices_certificados",
+    # "num_aprendices_trasladados",
+]
+
+
+# Las huellas por ficha se suman módulo 2**64 (como la suma de uint64 de pandas)
+_MASCARA_HUELLA = (1 << 64) - 1
+
+
+def _eliminar_duplicados_historico(df: pd.DataFrame, vistos: Optional[set] = None):
     """
     Elimina registros duplicados comparando la información completa del grupo/histórico.
     Conserva la primera aparición del registro y descarta el resto.
+    Si se pasa `vistos` (huellas de bloques anteriores) también descarta los
+    registros repetidos entre bloques y agrega las nuevas huellas al conjunto.
     """
-    columnas_comparacion = [
-        "cod_regional",           # 1. CODIGO_REGIONAL
-        "nombre_regional",        # 2. NOMBRE_REGIONAL
-        "cod_centro",             # 3. CODIGO_CENTRO
-        "nombre_centro",          # 4. NOMBRE_CENTRO
-        "datos_centro",          # 5. DATOS
-        "cod_programa",          # 6. CODIGO_PROGRAMA_FORMACION
-        "version",                # 7. VERSION
-        "tipo_programa",          # 8. TIPO_PROGRAMA
-        "nivel",                  # 9. NIVEL
-        "jornada",                # 10. JORNADA
-        "cod_municipio",          # 11. ID_MUNICIPIO
-        "nombre_municipio",       # 12. MUNICIPIO
-        "cod_estrategia",         # 13. FIC_MC
-        "modalidad",              # 14. MODALIDAD
-        "ficha",                  # 15. FICHA
-        "fecha_inicio",           # 16. FECHA_INICIO
-        "fecha_fin",              # 17. FECHA_FIN
-        "duracion_meses",         # 18. MESES_DURACION
-        "estado_curso",           # 19. ESTADO
-        "codigo_estado",          # 20. CODIGO_ESTADO
-        "nombre_estado",          # 21. NOMBRE_ESTADO
-        "num_aprendices_inscritos",      # 22. INSCRITOS
-        "num_aprendices_matriculados",   # 23. MATRICULADOS
-        "num_aprendices_en_transito",    # 24. EN_TRAINING
-        "num_aprendices_formacion",      # 25. FORMACION
-        "num_aprendices_induccion",      # 26. INDUCCION
-        "num_aprendices_condicionados",  # 27. CONDICIONADOS
-        "num_aprendices_aplazados",      # 28. APLAZADOS
-        "num_aprendices_retirado_voluntario",  # 29. RETIRO
-        "num_aprendices_cancelados",     # 30. CANCELADOS
-        "num_aprendices_reprobados",     # 31. REPROBADOS
-        "num_aprendices_no_aptos",       # 32. NO_APROBADOS
-        "num_aprendices_reingresados",   # 33. REINGRESO
-        "num_aprendices_por_certificar", # 34. POR_CERTIFICAR
-        "num_aprendices_certificados",  # 35. CERTIFICADOS
-        "num_aprendices_trasladados"     # 36. TRASLADOS
-        # "id_grupo",
-        # "ficha",
-        # "cod_programa",
-        # "cod_centro",
-        # "modalidad",
-        # "jornada",
-        # "etapa_ficha",
-        # "estado_curso",
-        # "cod_municipio",
-        # "cod_estrategia",
-        # "num_aprendices_inscritos",
-        # "num_aprendices_matriculados",
-        # "num_aprendices_en_transito",
-        # "num_aprendices_formacion",
-        # "num_aprendices_induccion",
-        # "num_aprendices_condicionados",
-        # "num_aprendices_aplazados",
-        # "num_aprendices_retirado_voluntario",
-        # "num_aprendices_cancelados",
-        # "num_aprendices_reprobados",
-        # "num_aprendices_no_aptos",
-        # "num_aprendices_reingresados",
-        # "num_aprendices_por_certificar",
-        # "num_aprendices_certificados",
-        # "num_aprendices_trasladados",
-    ]
 
-    columnas_presentes = [col for col in columnas_comparacion if col in df.columns]
+    columnas_presentes = [col for col in COLUMNAS_COMPARACION_HISTORICO if col in df.columns]
     if not columnas_presentes:
         return df, 0
 
     df_sin_duplicados = df.drop_duplicates(subset=columnas_presentes, keep="first")
+    if vistos is not None:
+        # Descartar también los registros ya vistos en bloques anteriores
+        huellas = pd.util.hash_pandas_object(df_sin_duplicados[columnas_presentes], index=False)
+        repetidos = huellas.isin(vistos)
+        vistos.update(huellas[~repetidos].tolist())
+        df_sin_duplicados = df_sin_duplicados[~repetidos.to_numpy()]
     eliminados = len(df) - len(df_sin_duplicados)
     if eliminados > 0:
         logger.info(
@@ -95,154 +200,53 @@ def _eliminar_duplicados_historico(df: pd.DataFrame):
         )
     return df_sin_duplicados, eliminados
 
-@router.post("/upload-excel-historico/")
-async def upload_excel_historico(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    user_token: RetornoUsuario = Depends(get_current_user)
-):
+
+def _acumular_huellas_historico(huellas: Dict[int, int], df: pd.DataFrame) -> None:
     """
-    Endpoint para cargar datos históricos de aprendices por grupo desde un archivo Excel.
-    Lee todas las columnas del archivo (grupos + histórico) y:
-    - Si el grupo existe: solo actualiza el histórico
-    - Si el grupo NO existe: crea el grupo completo y luego el histórico
+    Suma en `huellas` ({ficha: entero de 64 bits}) el hash de cada fila del
+    bloque sobre las columnas de COLUMNAS_COMPARACION_HISTORICO. La suma no
+    depende del orden, así que una ficha repartida en varios bloques termina
+    con la misma huella que si estuviera en uno solo.
     """
-    
-    contents = await file.read()
-    
-    df = None
-    skip_rows_options = [0, 1, 2, 3, 4, 5]
-    
-    for skip_rows in skip_rows_options:
-        try:
-            df_test = pd.read_excel(
-                BytesIO(contents),
-                engine="openpyxl",
-                skiprows=skip_rows,
-                nrows=0
-            )
-            if len(df_test.columns) > 0:
-                df = pd.read_excel(
-                    BytesIO(contents),
-                    engine="openpyxl",
-                    skiprows=skip_rows,
-                    dtype=str
-                )
-                print(f"Archivo leído correctamente con skiprows={skip_rows}")
-                break
-        except Exception as e:
-            print(f"Error al leer con skiprows={skip_rows}: {str(e)}")
-            continue
-    
-    if df is None:
-        try:
-            df = pd.read_excel(
-                BytesIO(contents),
-                engine="openpyxl",
-                dtype=str
-            )
-            print("Archivo leído sin skiprows")
-        except Exception as e:
-            return {
-                "registros_insertados": 0,
-                "registros_actualizados": 0,
-                "grupos_creados": 0,
-                "total_errores": 1,
-                "errores": [f"Error al leer el archivo Excel: {str(e)}"],
-                "exitoso": False,
-                "mensaje": f"No se pudo leer el archivo Excel. Error: {str(e)}"
-            }
-    
-    if df is None or len(df) == 0:
-        return {
-            "registros_insertados": 0,
-            "registros_actualizados": 0,
-            "grupos_creados": 0,
-            "total_errores": 1,
-            "errores": ["El archivo Excel está vacío o no se pudo leer correctamente"],
-            "exitoso": False,
-            "mensaje": "El archivo Excel está vacío o no tiene datos válidos"
-        }
-    
-    logger.debug("Excel leído y columnas iniciales normalizadas")
-    
-    # Mapeo exacto de las 36 columnas del Excel según el orden mostrado
-    columnas_mapeo = {
-        # Columnas 1-5: Regional y Centro
-        "CODIGO_REGIONAL": "cod_regional",
-        "NOMBRE_REGIONAL": "nombre_regional",
-        "CODIGO_CENTRO": "cod_centro",
-        "NOMBRE_CENTRO": "nombre_centro",
-        "DATOS": "datos_centro",
-        "DATOS_CENTRO": "datos_centro",
-        
-        # Columnas 6-9: Programa de formación
-        "CODIGO_PROGRAMA_FORMACION": "cod_programa",
-        "VERSION": "version",
-        "VERSION_PROGRAMA": "version",
-        "TIPO_PROGRAMA": "tipo_programa",
-        "NIVEL": "nivel",
-        "NIVEL_FORMACION": "nivel",
-        
-        # Columnas 10-14: Configuración del grupo
-        "JORNADA": "jornada",
-        "ID_MUNICIPIO": "cod_municipio",
-        "MUNICIPIO": "nombre_municipio",
-        "FIC_MC": "cod_estrategia",
-        "FIC_MOD_FORMACION": "cod_estrategia",
-        "MODALIDAD": "modalidad",
-        "MODALIDAD_FORMACION": "modalidad",
-        
-        # Columnas 15-21: Información de la ficha
-        "FICHA": "ficha",
-        "FECHA_INICIO": "fecha_inicio",
-        "FECHA_FIN": "fecha_fin",
-        "MESES_DURACION": "duracion_meses",
-        "DRURACION_PROGRAMA": "duracion_meses",
-        "ESTADO": "estado_curso",
-        "ESTADO_FICHA": "estado_curso",
-        "CODIGO_ESTADO": "codigo_estado",
-        "NOMBRE_ESTADO": "nombre_estado",
-        
-        # Columnas 22-36: Datos históricos de aprendices
-        "INSCRITOS": "num_aprendices_inscritos",
-        "MATRICULADOS": "num_aprendices_matriculados",
-        "EN_TRAINING": "num_aprendices_en_transito",
-        "EN_TRANSITO": "num_aprendices_en_transito",
-        "FORMACION": "num_aprendices_formacion",
-        "INDUCCION": "num_aprendices_induccion",
-        "CONDICIONADOS": "num_aprendices_condicionados",
-        "APLAZADOS": "num_aprendices_aplazados",
-        "RETIRO": "num_aprendices_retirado_voluntario",
-        "RETIROS_VOLUNTARIOS": "num_aprendices_retirado_voluntario",
-        "CANCELADOS": "num_aprendices_cancelados",
-        "REPROBADOS": "num_aprendices_reprobados",
-        "NO_APROBADOS": "num_aprendices_no_aptos",
-        "NO_APTOS": "num_aprendices_no_aptos",
-        "REINGRESO": "num_aprendices_reingresados",
-        "REINGRESADO": "num_aprendices_reingresados",
-        "POR_CERTIFICAR": "num_aprendices_por_certificar",
-        "CERTIFICADOS": "num_aprendices_certificados",
-        "TRASLADOS": "num_aprendices_trasladados",
-        "TRASLADADOS": "num_aprendices_trasladados",
-        
-        # Variantes adicionales para compatibilidad
-        "IDENTIFICADOR_FICHA": "ficha",
-        "CODIGO_PROGRAMA": "cod_programa",
-        "COD_PROGRAMA": "cod_programa",
-        "CODIGO_CENTRO": "cod_centro",
-        "COD_REGIONAL": "cod_regional",
-        "COD_MUNICIPIO": "cod_municipio",
-        "CODIGO_MUNICIPIO": "cod_municipio",
-        "FECHA_INI": "fecha_inicio",
-        "ESTADO_CURSO": "estado_curso",
-        "EN_TRANSITO": "num_aprendices_en_transito",
-        "RETIRADO_VOLUNTARIO": "num_aprendices_retirado_voluntario",
-        "NO_APTOS": "num_aprendices_no_aptos",
-        "REINGRESADOS": "num_aprendices_reingresados",
-        "PROGRAMA_FORMACION": "nombre_programa",
-    }
-    
+    if len(df) == 0:
+        return
+    columnas_presentes = [col for col in COLUMNAS_COMPARACION_HISTORICO if col in df.columns]
+    hashes = pd.util.hash_pandas_object(df[columnas_presentes].astype(str), index=False)
+    por_ficha = hashes.groupby(df["ficha"].astype("int64").to_numpy()).sum()
+    for ficha, valor in por_ficha.items():
+        huellas[int(ficha)] = (huellas.get(int(ficha), 0) + int(valor)) & _MASCARA_HUELLA
+
+
+def _formatear_huellas(huellas: Dict[int, int]) -> Dict[int, str]:
+    """Huellas como los 16 caracteres hexadecimales que se guardan en `historico_huellas`."""
+    return {ficha: format(valor, "016x") for ficha, valor in huellas.items()}
+
+
+def _clasificar_fichas_delta(huellas: Dict[int, str], anteriores: dict):
+    """
+    Compara las huellas del archivo con las de la última carga.
+
+    Returns:
+        tuple: (fichas nuevas, fichas modificadas, fichas sin cambios), como conjuntos.
+    """
+    nuevas = {ficha for ficha in huellas if ficha not in anteriores}
+    sin_cambios = {ficha for ficha, huella in huellas.items() if anteriores.get(ficha) == huella}
+    modificadas = set(huellas) - nuevas - sin_cambios
+    return nuevas, modificadas, sin_cambios
+
+
+def _huellas_anteriores(db: Session, fichas) -> dict:
+    """Huellas guardadas de `fichas`; si no se pueden consultar se toman todas como nuevas."""
+    try:
+        return obtener_huellas_historico(db, fichas)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.warning(f"No se pudieron consultar las huellas del histórico, se toman todas las fichas como nuevas: {e}")
+        return {}
+
+
+def _renombrar_columnas_historico(df: pd.DataFrame) -> pd.DataFrame:
+    """Renombra las columnas del Excel a los nombres de la BD usando COLUMNAS_MAPEO_HISTORICO."""
     df.columns = df.columns.astype(str).str.strip()
     
     # Normalizar espacios y caracteres especiales en nombres de columnas
@@ -272,7 +276,7 @@ async def upload_excel_historico(
         columnas_disponibles_upper[col_upper.replace(" ", "_")] = col
     
     # Mapeo prioritario: primero buscar coincidencias exactas, luego parciales
-    for col_excel, col_bd in columnas_mapeo.items():
+    for col_excel, col_bd in COLUMNAS_MAPEO_HISTORICO.items():
         col_excel_upper = col_excel.upper().strip()
         col_excel_sin_espacios = col_excel_upper.replace(" ", "")
         col_excel_con_guion = col_excel_upper.replace(" ", "_")
@@ -381,69 +385,53 @@ async def upload_excel_historico(
             print(f"Columna FICHA encontrada y renombrada desde: {ficha_col}")
 
     logger.debug("Columnas mapeadas y renombradas")
+    return df
 
-    if "ficha" not in df.columns:
-        return {
-            "registros_insertados": 0,
-            "registros_actualizados": 0,
-            "grupos_creados": 0,
-            "total_errores": 1,
-            "errores": ["No se encontró la columna FICHA o IDENTIFICADOR_FICHA en el archivo"],
-            "exitoso": False,
-            "mensaje": "El archivo debe contener una columna FICHA o IDENTIFICADOR_FICHA"
-        }
 
+def _a_texto(serie: pd.Series) -> pd.Series:
+    """Texto sin espacios en los extremos; las celdas vacías quedan en None (no "None" ni "nan")."""
+    return serie.map(lambda v: (str(v).strip() or None) if pd.notna(v) else None)
+
+
+def _normalizar_tipos_historico(df: pd.DataFrame) -> pd.DataFrame:
+    """Convierte las columnas de grupos e histórico a los tipos esperados por la BD."""
+    df["ficha"] = normalizar_enteros(df["ficha"])
     df = df.dropna(subset=["ficha"])
-    
-    if len(df) == 0:
-        return {
-            "registros_insertados": 0,
-            "registros_actualizados": 0,
-            "grupos_creados": 0,
-            "total_errores": 1,
-            "errores": ["No se encontraron registros con ficha válida"],
-            "exitoso": False,
-            "mensaje": "No se encontraron registros válidos para procesar"
-        }
-
-    df["ficha"] = pd.to_numeric(df["ficha"], errors="coerce")
-    df = df.dropna(subset=["ficha"])
-    df["ficha"] = df["ficha"].astype("Int64")
     df["id_grupo"] = df["ficha"]
 
     # Convertir columnas numéricas de grupos
     columnas_grupos_numericas = ["cod_centro", "cod_regional", "cod_municipio"]
     for col in columnas_grupos_numericas:
         if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
+            df[col] = normalizar_enteros(df[col])
     
     # cod_programa puede ser numérico o string, mantenerlo como string
     if "cod_programa" in df.columns:
-        df["cod_programa"] = df["cod_programa"].astype(str).replace("nan", None)
+        df["cod_programa"] = _a_texto(df["cod_programa"])
 
     # Procesar fechas
     if "fecha_inicio" in df.columns:
-        df["fecha_inicio"] = pd.to_datetime(df["fecha_inicio"], errors="coerce").dt.date
+        df["fecha_inicio"] = normalizar_fechas(df["fecha_inicio"])
     if "fecha_fin" in df.columns:
-        df["fecha_fin"] = pd.to_datetime(df["fecha_fin"], errors="coerce").dt.date
+        df["fecha_fin"] = normalizar_fechas(df["fecha_fin"])
     
     # Procesar duracion_meses
     if "duracion_meses" in df.columns:
-        df["duracion_meses"] = pd.to_numeric(df["duracion_meses"], errors="coerce")
+        df["duracion_meses"] = normalizar_enteros(df["duracion_meses"])
     
     # Procesar campos de estado (si existen)
     if "codigo_estado" in df.columns:
-        df["codigo_estado"] = pd.to_numeric(df["codigo_estado"], errors="coerce")
+        df["codigo_estado"] = normalizar_enteros(df["codigo_estado"])
     if "nombre_estado" in df.columns:
-        df["nombre_estado"] = df["nombre_estado"].astype(str)
+        df["nombre_estado"] = _a_texto(df["nombre_estado"])
     
     # Procesar tipo_programa
     if "tipo_programa" in df.columns:
-        df["tipo_programa"] = df["tipo_programa"].astype(str)
+        df["tipo_programa"] = _a_texto(df["tipo_programa"])
     
     # Procesar datos_centro (campo DATOS del Excel)
     if "datos_centro" in df.columns:
-        df["datos_centro"] = df["datos_centro"].astype(str)
+        df["datos_centro"] = _a_texto(df["datos_centro"])
 
     columnas_historico_numericas = [
         "num_aprendices_inscritos",
@@ -466,63 +454,251 @@ async def upload_excel_historico(
     # Convertir columnas numéricas preservando los valores exactos del Excel
     for col in columnas_historico_numericas:
         if col in df.columns:
-            # Primero convertir a numérico, preservando NaN para valores no numéricos
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-            # Solo reemplazar NaN por 0 si es necesario (valores vacíos), pero preservar 0 explícitos
-            # Usar Int64 nullable para preservar valores exactos y permitir NaN
-            df[col] = df[col].fillna(0).astype("Int64")
+            # Convertir a Int64 nullable (acepta separadores de miles) y reemplazar vacíos por 0
+            df[col] = normalizar_enteros(df[col]).fillna(0)
 
     logger.debug("DataFrame procesado para inserción")
+    return df
 
-    # Eliminar registros duplicados para evitar reprocesar la misma información
-    df, registros_duplicados = _eliminar_duplicados_historico(df)
-    if registros_duplicados:
-        logger.info("Total de registros duplicados descartados: %s", registros_duplicados)
 
-    # Validación de regional: cod_regional = 66 y nombre_regional contiene "RISARALDA"
+def _filtrar_regional_historico(df: pd.DataFrame):
+    """
+    Conserva solo los registros con cod_regional = 66 y nombre_regional que contiene "RISARALDA".
+
+    Returns:
+        tuple: (DataFrame filtrado, número de registros omitidos)
+    """
     registros_originales = len(df)
     
     # Convertir cod_regional a numérico para comparación
     if "cod_regional" in df.columns:
-        df["cod_regional"] = pd.to_numeric(df["cod_regional"], errors="coerce")
+        df["cod_regional"] = normalizar_enteros(df["cod_regional"])
     
-    # Aplicar filtro de regional
-    if "cod_regional" in df.columns and "nombre_regional" in df.columns:
-        # Filtrar por cod_regional = 66 y nombre_regional contiene "RISARALDA"
-        df["nombre_regional_str"] = df["nombre_regional"].apply(
-            lambda x: str(x).upper() if pd.notna(x) else ""
-        )
-        df_filtrado = df[
-            (df["cod_regional"] == 66) & 
-            (df["nombre_regional_str"].str.contains("RISARALDA", na=False))
-        ]
-        df_filtrado = df_filtrado.drop(columns=["nombre_regional_str"])
-        
-        registros_filtrados = len(df_filtrado)
-        registros_omitidos = registros_originales - registros_filtrados
-        
-        logger.info(
-            f"Filtro de regional aplicado: {registros_originales} registros originales, "
-            f"{registros_filtrados} con cod_regional=66 y nombre_regional contiene 'RISARALDA', "
-            f"{registros_omitidos} omitidos"
-        )
-        
-        if len(df_filtrado) == 0:
-            return {
-                "registros_insertados": 0,
-                "registros_actualizados": 0,
-                "grupos_creados": 0,
-                "total_errores": 1,
-                "errores": [f"No se encontraron registros con cod_regional=66 y nombre_regional que contenga 'RISARALDA'. Se omitieron {registros_omitidos} registros."],
-                "exitoso": False,
-                "mensaje": f"No hay registros válidos para procesar. Se omitieron {registros_omitidos} registros que no cumplen el criterio de regional."
-            }
-        
-        df = df_filtrado
-        logger.info(f"Filtro de regional aplicado: omitidos={registros_omitidos}, válidos={registros_filtrados}")
-    else:
+    if "cod_regional" not in df.columns or "nombre_regional" not in df.columns:
         logger.warning("No se encontraron las columnas cod_regional o nombre_regional en el DataFrame. No se aplicó filtro de regional.")
+        return df, 0
 
-    resultados = insertar_historico_completo_en_bd(db, df)
+    nombre_regional_str = df["nombre_regional"].apply(
+        lambda x: str(x).upper() if pd.notna(x) else ""
+    )
+    df_filtrado = df[
+        (df["cod_regional"] == 66) & 
+        (nombre_regional_str.str.contains("RISARALDA", na=False))
+    ]
+    registros_omitidos = registros_originales - len(df_filtrado)
     
+    logger.info(
+        f"Filtro de regional aplicado: {registros_originales} registros originales, "
+        f"{len(df_filtrado)} con cod_regional=66 y nombre_regional contiene 'RISARALDA', "
+        f"{registros_omitidos} omitidos"
+    )
+    return df_filtrado, registros_omitidos
+
+
+def _resumen_error_historico(error: str, mensaje: str) -> dict:
+    return {
+        "registros_insertados": 0,
+        "registros_actualizados": 0,
+        "grupos_creados": 0,
+        "total_errores": 1,
+        "errores": [error],
+        "exitoso": False,
+        "mensaje": mensaje
+    }
+
+
+def _preparar_bloque_historico(df: pd.DataFrame, vistos: set, contadores: dict) -> pd.DataFrame:
+    """
+    Renombra, normaliza, quita duplicados (también entre bloques, con `vistos`)
+    y filtra por regional un bloque del Excel. Suma en `contadores` los
+    registros válidos y los omitidos por regional.
+    """
+    df = _renombrar_columnas_historico(df)
+
+    if "ficha" not in df.columns:
+        raise ArchivoInvalidoError(_resumen_error_historico(
+            "No se encontró la columna FICHA o IDENTIFICADOR_FICHA en el archivo",
+            "El archivo debe contener una columna FICHA o IDENTIFICADOR_FICHA",
+        ))
+
+    df = df.dropna(subset=["ficha"])
+    if len(df) == 0:
+        return df
+
+    df = _normalizar_tipos_historico(df)
+
+    # Eliminar registros duplicados para evitar reprocesar la misma información
+    df, registros_duplicados = _eliminar_duplicados_historico(df, vistos)
+    if registros_duplicados:
+        logger.info("Total de registros duplicados descartados: %s", registros_duplicados)
+
+    # Validación de regional: cod_regional = 66 y nombre_regional contiene "RISARALDA"
+    df, registros_omitidos = _filtrar_regional_historico(df)
+    contadores["registros_omitidos"] += registros_omitidos
+    contadores["registros_validos"] += len(df)
+    return df
+
+
+def procesar_excel_historico(
+    db: Session,
+    fuente,
+    tamano_bloque: int = TAMANO_BLOQUE_DEFECTO,
+    progreso=None,
+    modo_delta: bool = False,
+) -> dict:
+    """
+    Carga un Excel de histórico por bloques: cada bloque se normaliza, se filtra
+    por regional y se inserta en la BD antes de leer el siguiente.
+
+    Al terminar se recalculan, una sola vez, los resúmenes de las fichas
+    cargadas, y cada ficha guarda su huella en `historico_huellas`.
+    Con `modo_delta` el archivo se lee dos veces: la primera solo calcula las
+    huellas y la segunda omite las fichas cuya huella no cambió desde la última
+    carga. El resumen incluye fichas_nuevas, fichas_modificadas y fichas_sin_cambios.
+
+    Args:
+        db: Sesión de SQLAlchemy
+        fuente: Ruta u objeto tipo archivo del Excel
+        tamano_bloque: Filas leídas y cargadas por bloque
+        progreso: Callback opcional de avance (ver `procesar_excel_por_bloques`)
+        modo_delta: Cargar solo las fichas nuevas o modificadas
+
+    Returns:
+        dict: Resumen acumulado de `insertar_historico_completo_en_bd`
+    """
+    vistos = set()
+    contadores = {"registros_validos": 0, "registros_omitidos": 0}
+    # {ficha: huella} de todo el archivo; se guardan una sola vez al final
+    huellas: Dict[int, int] = {}
+    fichas_con_error = set()
+    sin_cambios = set()
+    # Fichas cuyo histórico ya se reemplazó en esta carga (una ficha puede abarcar varios bloques)
+    fichas_reemplazadas = set()
+    # Claves de resumen anteriores de las fichas cargadas; los resúmenes se recalculan una vez al final
+    claves_resumenes = {}
+
+    if modo_delta:
+        # Primera lectura solo para las huellas: una ficha puede estar repartida
+        # en varios bloques y hay que conocer su huella completa antes de omitirla
+        vistos_huellas = set()
+        contadores_huellas = {"registros_validos": 0, "registros_omitidos": 0}
+
+        def acumular_bloque(df: pd.DataFrame) -> dict:
+            _acumular_huellas_historico(huellas, _preparar_bloque_historico(df, vistos_huellas, contadores_huellas))
+            return {}
+
+        previo = procesar_excel_por_bloques(fuente, acumular_bloque, COLUMNAS_MAPEO_HISTORICO.keys(), tamano_bloque)
+        if "filas_leidas" not in previo:
+            return previo
+        formateadas = _formatear_huellas(huellas)
+        nuevas, modificadas, sin_cambios = _clasificar_fichas_delta(
+            formateadas, _huellas_anteriores(db, formateadas.keys())
+        )
+        if sin_cambios:
+            logger.info(f"Modo delta: se omiten {len(sin_cambios)} fichas sin cambios")
+
+    def procesar_bloque(df: pd.DataFrame) -> dict:
+        df = _preparar_bloque_historico(df, vistos, contadores)
+        if len(df) == 0:
+            return {}
+
+        if not modo_delta:
+            _acumular_huellas_historico(huellas, df)
+        elif sin_cambios:
+            df = df[~df["ficha"].isin(sin_cambios)]
+            if len(df) == 0:
+                return {}
+
+        resumen = insertar_historico_completo_en_bd(db, df, fichas_reemplazadas, claves_resumenes)
+        if resumen.get("errores"):
+            # La huella de estas fichas no se guarda: se vuelven a cargar la próxima vez
+            fichas_con_error.update(int(ficha) for ficha in df["ficha"])
+        return resumen
+
+    resultados = procesar_excel_por_bloques(
+        fuente, procesar_bloque, COLUMNAS_MAPEO_HISTORICO.keys(), tamano_bloque, progreso
+    )
+    if "filas_leidas" not in resultados:
+        # El archivo fue rechazado (ArchivoInvalidoError)
+        return resultados
+
+    if resultados["filas_leidas"] == 0:
+        return _resumen_error_historico(
+            "El archivo Excel está vacío o no se pudo leer correctamente",
+            "El archivo Excel está vacío o no tiene datos válidos",
+        )
+    if contadores["registros_validos"] == 0:
+        if contadores["registros_omitidos"]:
+            omitidos = contadores["registros_omitidos"]
+            return _resumen_error_historico(
+                f"No se encontraron registros con cod_regional=66 y nombre_regional que contenga 'RISARALDA'. Se omitieron {omitidos} registros.",
+                f"No hay registros válidos para procesar. Se omitieron {omitidos} registros que no cumplen el criterio de regional.",
+            )
+        return _resumen_error_historico(
+            "No se encontraron registros con ficha válida",
+            "No se encontraron registros válidos para procesar",
+        )
+
+    formateadas = _formatear_huellas(huellas)
+    if not modo_delta:
+        nuevas, modificadas, sin_cambios = _clasificar_fichas_delta(
+            formateadas, _huellas_anteriores(db, formateadas.keys())
+        )
+    resultados["fichas_nuevas"] = len(nuevas)
+    resultados["fichas_modificadas"] = len(modificadas)
+    resultados["fichas_sin_cambios"] = len(sin_cambios)
+
+    por_guardar = {
+        ficha: huella for ficha, huella in formateadas.items()
+        if ficha not in fichas_con_error and ficha not in sin_cambios
+    }
+    try:
+        guardar_huellas_historico(db, por_guardar)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.warning(f"No se pudieron guardar las huellas del histórico: {e}")
+
+    if fichas_reemplazadas:
+        resultados["resumenes_recalculados"] = refrescar_resumenes_historico(db, fichas_reemplazadas, claves_resumenes)
+
+    resultados["registros_omitidos_regional"] = contadores["registros_omitidos"]
+    resultados["modo_delta"] = modo_delta
+    resultados["exitoso"] = resultados.get("total_errores", 0) == 0
+    resultados["mensaje"] = "Carga completa con errores" if resultados.get("errores") else "Carga completa exitosa"
     return resultados
+
+
+@router.post("/upload-excel-historico/")
+def upload_excel_historico(
+    file: UploadFile = File(...),
+    asincrono: bool = Query(False, description="Procesar en segundo plano y devolver el id del trabajo"),
+    force: bool = Query(False, description="Recargar aunque el mismo archivo ya se haya cargado"),
+    delta: bool = Query(False, description="Cargar solo las fichas nuevas o modificadas desde la última carga"),
+    db: Session = Depends(get_db),
+    user_token: RetornoUsuario = Depends(get_current_user)
+):
+    """
+    Endpoint para cargar datos históricos de aprendices por grupo desde un archivo Excel.
+    Lee todas las columnas del archivo (grupos + histórico) y:
+    - Si el grupo existe: solo actualiza el histórico
+    - Si el grupo NO existe: crea el grupo completo y luego el histórico
+
+    El archivo se procesa por bloques de filas, por lo que la memoria usada no
+    depende del tamaño del Excel. Con `asincrono=true` responde 202 con el id
+    del trabajo, cuyo avance se consulta en `/jobs/{id}`. Si el mismo archivo ya
+    se cargó se devuelve el resumen guardado, salvo que se indique `force=true`.
+    Con `delta=true` solo se procesan las fichas cuya información cambió
+    respecto a la última carga (comparando huellas por ficha).
+    """
+    if asincrono:
+        return encolar_carga("historico", file, procesar_excel_historico, db, force, modo_delta=delta)
+
+    try:
+        return cargar_con_registro(
+            db, "historico", file.file, file.filename, procesar_excel_historico, force, modo_delta=delta
+        )
+    except (BadZipFile, InvalidFileException) as e:
+        return _resumen_error_historico(
+            f"Error al leer el archivo Excel: {str(e)}",
+            f"No se pudo leer el archivo Excel. Error: {str(e)}",
+        )
@@ -1,100 +1,90 @@
-from fastapi import APIRouter, UploadFile, File, Depends
+from fastapi import APIRouter, UploadFile, File, Depends, Query
 import pandas as pd
 import unicodedata
 import re
 from sqlalchemy.orm import Session
-from io import BytesIO
+from zipfile import BadZipFile
+from openpyxl.utils.exceptions import InvalidFileException
 from app.crud.cargar_archivos_registro_calificado import insertar_registro_calificado_en_bd
+from app.crud.registro_cargas import cargar_con_registro
 from core.database import get_db
 from app.router.dependencies import get_current_user
+from app.router.trabajos import encolar_carga
 from app.schemas.usuarios import RetornoUsuario
+from app.utils.excel import TAMANO_BLOQUE_DEFECTO
+from app.utils.ingesta import ArchivoInvalidoError, procesar_excel_por_bloques
+from app.utils.normalizacion import normalizar_enteros, normalizar_fechas
 
 router = APIRouter()
 
-@router.post("/upload-excel-registro-calificado/")
-async def upload_excel_registro_calificado(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    user_token: RetornoUsuario = Depends(get_current_user),
-):
-    contents = await file.read()
-
-    # -----------------------------------------------------
-    # 0️⃣ LEER EL EXCEL — SIN SKIPROWS (ESTO ERA EL ERROR)
-    # -----------------------------------------------------
-    try:
-        df = pd.read_excel(BytesIO(contents), engine="openpyxl", dtype=str)
-    except Exception as e:
-        return {"exitoso": False, "mensaje": f"No se pudo leer el archivo Excel: {str(e)}"}
-
-    if df is None or df.empty:
-        return {"exitoso": False, "mensaje": "Archivo vacío o sin datos"}
-
+# -----------------------------------------------------
+# 1️⃣ NORMALIZADOR
+# -----------------------------------------------------
+def normalize_colname(s: str) -> str:
+    if s is None:
+        return ""
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+    s = s.lower()
+    s = s.replace("\xa0", " ")  # espacios raros
+    s = re.sub(r"[_\.\-]+", " ", s)
+    s = re.sub(r"[^a-z0-9\s]", "", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+
+# -----------------------------------------------------
+# 2️⃣ MAPEO FLEXIBLE
+# -----------------------------------------------------
+MAPEO_FLEXIBLE_REGISTRO_CALIFICADO = {
+    # cod_programa
+    "codigo del programa": "cod_programa",
+    "codigo programa": "cod_programa",
+    "cod del programa": "cod_programa",
+    "cod programa": "cod_programa",
+    "codigo": "cod_programa",
+    "cod": "cod_programa",
+
+    # tipo_tramite
+    "tipo de tramite": "tipo_tramite",
+    "tramite": "tipo_tramite",
+
+    # fecha_radicado
+    "fecha radicado": "fecha_radicado",
+    "fecha rad": "fecha_radicado",
+
+    # numero_resolucion
+    "numero de resolucion": "numero_resolucion",
+    "num resolucion": "numero_resolucion",
+    "resolucion": "numero_resolucion",
+
+    # fecha_resolucion
+    "fecha de resolucion": "fecha_resolucion",
+
+    # fecha_vencimiento
+    "fecha de vencimiento": "fecha_vencimiento",
+
+    # vigencia
+    "vigencia rc": "vigencia",
+    "vigencia": "vigencia",
+
+    # modalidad
+    "modalidad": "modalidad",
+
+    # clasificacion
+    "clasificacion para tramite": "clasificacion",
+    "clasificacion": "clasificacion",
+
+    # estados
+    "estado catalogo": "estado_catalogo",
+    "estado": "estado_catalogo",
+}
+
+
+def _renombrar_columnas_registro_calificado(df: pd.DataFrame) -> pd.DataFrame:
     # Limpiar encabezados
     df.columns = df.columns.astype(str).str.strip()
 
-    # -----------------------------------------------------
-    # 1️⃣ NORMALIZADOR
-    # -----------------------------------------------------
-    def normalize_colname(s: str) -> str:
-        if s is None:
-            return ""
-        s = unicodedata.normalize("NFD", s)
-        s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
-        s = s.lower()
-        s = s.replace("\xa0", " ")  # espacios raros
-        s = re.sub(r"[_\.\-]+", " ", s)
-        s = re.sub(r"[^a-z0-9\s]", "", s)
-        s = re.sub(r"\s+", " ", s).strip()
-        return s
-
-    # -----------------------------------------------------
-    # 2️⃣ MAPEO FLEXIBLE
-    # -----------------------------------------------------
-    mapeo_flexible = {
-        # cod_programa
-        "codigo del programa": "cod_programa",
-        "codigo programa": "cod_programa",
-        "cod del programa": "cod_programa",
-        "cod programa": "cod_programa",
-        "codigo": "cod_programa",
-        "cod": "cod_programa",
-
-        # tipo_tramite
-        "tipo de tramite": "tipo_tramite",
-        "tramite": "tipo_tramite",
-
-        # fecha_radicado
-        "fecha radicado": "fecha_radicado",
-        "fecha rad": "fecha_radicado",
-
-        # numero_resolucion
-        "numero de resolucion": "numero_resolucion",
-        "num resolucion": "numero_resolucion",
-        "resolucion": "numero_resolucion",
-
-        # fecha_resolucion
-        "fecha de resolucion": "fecha_resolucion",
-
-        # fecha_vencimiento
-        "fecha de vencimiento": "fecha_vencimiento",
-
-        # vigencia
-        "vigencia rc": "vigencia",
-        "vigencia": "vigencia",
-
-        # modalidad
-        "modalidad": "modalidad",
-
-        # clasificacion
-        "clasificacion para tramite": "clasificacion",
-        "clasificacion": "clasificacion",
-
-        # estados
-        "estado catalogo": "estado_catalogo",
-        "estado": "estado_catalogo",
-    }
-
     # Normalizar columnas del archivo
     columnas_norm = {normalize_colname(c): c for c in df.columns}
 
@@ -104,7 +94,7 @@ async def upload_excel_registro_calificado(
     # -----------------------------------------------------
     # 3️⃣ MAPEO AUTOMÁTICO
     # -----------------------------------------------------
-    for alias, target in mapeo_flexible.items():
+    for alias, target in MAPEO_FLEXIBLE_REGISTRO_CALIFICADO.items():
         norm_alias = normalize_colname(alias)
 
         # coincidencia exacta
@@ -133,30 +123,77 @@ async def upload_excel_registro_calificado(
                 df = df.rename(columns={col: "cod_programa"})
                 break
 
-    if "cod_programa" not in df.columns:
-        return {
-            "exitoso": False,
-            "mensaje": "No se pudo encontrar la columna 'cod_programa'.",
-            "columnas_detectadas": list(df.columns),
-        }
+    return df
 
-    # -----------------------------------------------------
-    # 5️⃣ LIMPIEZA DE DATOS
-    # -----------------------------------------------------
-    df = df.dropna(subset=["cod_programa"])
-    df["cod_programa"] = df["cod_programa"].astype(str).str.strip()
 
-    # numeros
-    if "numero_resolucion" in df.columns:
-        df["numero_resolucion"] = pd.to_numeric(df["numero_resolucion"], errors="coerce").astype("Int64")
+def procesar_excel_registro_calificado(db: Session, fuente, tamano_bloque: int = TAMANO_BLOQUE_DEFECTO, progreso=None) -> dict:
+    """Carga un Excel de registro calificado por bloques de filas."""
+
+    def procesar_bloque(df: pd.DataFrame) -> dict:
+        df = _renombrar_columnas_registro_calificado(df)
+
+        if "cod_programa" not in df.columns:
+            raise ArchivoInvalidoError({
+                "exitoso": False,
+                "mensaje": "No se pudo encontrar la columna 'cod_programa'.",
+                "columnas_detectadas": list(df.columns),
+            })
+
+        # -----------------------------------------------------
+        # 5️⃣ LIMPIEZA DE DATOS
+        # -----------------------------------------------------
+        df = df.dropna(subset=["cod_programa"])
+        df["cod_programa"] = df["cod_programa"].astype(str).str.strip()
+
+        # numeros
+        if "numero_resolucion" in df.columns:
+            df["numero_resolucion"] = normalizar_enteros(df["numero_resolucion"])
+
+        # fechas
+        for date_col in ["fecha_radicado", "fecha_resolucion", "fecha_vencimiento"]:
+            if date_col in df.columns:
+                df[date_col] = normalizar_fechas(df[date_col])
 
-    # fechas
-    for date_col in ["fecha_radicado", "fecha_resolucion", "fecha_vencimiento"]:
-        if date_col in df.columns:
-            df[date_col] = pd.to_datetime(df[date_col], errors="coerce").dt.date
+        if df.empty:
+            return {}
+
+        # -----------------------------------------------------
+        # 6️⃣ GUARDAR EN BD
+        # -----------------------------------------------------
+        return insertar_registro_calificado_en_bd(db, df)
+
+    resultados = procesar_excel_por_bloques(fuente, procesar_bloque, tamano_bloque=tamano_bloque, progreso=progreso)
+    if "filas_leidas" not in resultados:
+        return resultados
+    if resultados["filas_leidas"] == 0:
+        return {"exitoso": False, "mensaje": "Archivo vacío o sin datos"}
+
+    resultados.setdefault("insertados", 0)
+    resultados.setdefault("actualizados", 0)
+    resultados.setdefault("errores", [])
+    resultados["total_errores"] = len(resultados["errores"])
+    resultados["exitoso"] = resultados["total_errores"] == 0
+    resultados["mensaje"] = "Carga completada con errores" if resultados["errores"] else "Carga completada exitosamente"
+    return resultados
+
+
+@router.post("/upload-excel-registro-calificado/")
+def upload_excel_registro_calificado(
+    file: UploadFile = File(...),
+    asincrono: bool = Query(False, description="Procesar en segundo plano y devolver el id del trabajo"),
+    force: bool = Query(False, description="Recargar aunque el mismo archivo ya se haya cargado"),
+    db: Session = Depends(get_db),
+    user_token: RetornoUsuario = Depends(get_current_user),
+):
+    if asincrono:
+        return encolar_carga("registro_calificado", file, procesar_excel_registro_calificado, db, force)
 
     # -----------------------------------------------------
-    # 6️⃣ GUARDAR EN BD
+    # 0️⃣ LEER EL EXCEL — SIN SKIPROWS, POR BLOQUES DE FILAS
     # -----------------------------------------------------
-    resultados = insertar_registro_calificado_en_bd(db, df)
-    return resultados
+    try:
+        return cargar_con_registro(
+            db, "registro_calificado", file.file, file.filename, procesar_excel_registro_calificado, force
+        )
+    except (BadZipFile, InvalidFileException) as e:
+        return {"exitoso": False, "mensaje": f"No se pudo leer el archivo Excel: {str(e)}"}
@@ -1,28 +1,43 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
 import pandas as pd
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from io import BytesIO
+from zipfile import BadZipFile
+from openpyxl.utils.exceptions import InvalidFileException
 from app.crud.cargar_archivos_catalogo import insertar_datos_en_bd, insertar_municipios, insertar_catalogo_programas
+from app.crud.registro_cargas import cargar_con_registro
+from app.router.trabajos import encolar_carga
+from app.utils.excel import TAMANO_BLOQUE_DEFECTO
+from app.utils.ingesta import ArchivoInvalidoError, procesar_excel_por_bloques
+from app.utils.normalizacion import normalizar_enteros, normalizar_fechas
 from core.database import get_db
 
 router = APIRouter()
 
-@router.post("/upload-excel-catalogo-programas/")
-async def upload_excel(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
-):
-    contents = await file.read()
-    usecols = [
-        "PRF_CODIGO", "PRF_VERSION", "COD_VER", "TIPO_FORMACION", "PRF_DENOMINACION", 
-        "NIVEL_FORMACION", "PRF_DURACION_MAXIMA", "PRF_DUR_ETAPA_LECTIVA", "PRF_DUR_ETAPA_PROD",
-        "PRF_FCH_REGISTRO", "FECHA_ACTIVO", "PRF_EDAD_MIN_REQUERIDA", "PRF_GRADO_MIN_REQUERIDO", 
-        "PRF_DESCRIPCION_REQUISITO", "PRF_RESOLUCION", "PRF_FECHA_RESOLUCION", "PRF_APOYO_FIC",
-        "PRF_CREDITOS", "PRF_ALAMEDIDA", "LINEA_TECNOLOGICA", "RED_TECNOLOGICA", "RED_CONOCIMIENTO",
-        "MODALIDAD", "APUESTAS_PRIORITARIAS", "FIC", "TIPO_PERMISO", "MULTIPLE_INSCRIPCION", "INDICE", "OCUPACION"
-    ]
-    df = pd.read_excel(BytesIO(contents), engine="openpyxl", usecols=usecols, dtype=str)
+COLUMNAS_CATALOGO_PROGRAMAS = [
+    "PRF_CODIGO", "PRF_VERSION", "COD_VER", "TIPO_FORMACION", "PRF_DENOMINACION", 
+    "NIVEL_FORMACION", "PRF_DURACION_MAXIMA", "PRF_DUR_ETAPA_LECTIVA", "PRF_DUR_ETAPA_PROD",
+    "PRF_FCH_REGISTRO", "FECHA_ACTIVO", "PRF_EDAD_MIN_REQUERIDA", "PRF_GRADO_MIN_REQUERIDO", 
+    "PRF_DESCRIPCION_REQUISITO", "PRF_RESOLUCION", "PRF_FECHA_RESOLUCION", "PRF_APOYO_FIC",
+    "PRF_CREDITOS", "PRF_ALAMEDIDA", "LINEA_TECNOLOGICA", "RED_TECNOLOGICA", "RED_CONOCIMIENTO",
+    "MODALIDAD", "APUESTAS_PRIORITARIAS", "FIC", "TIPO_PERMISO", "MULTIPLE_INSCRIPCION", "INDICE", "OCUPACION"
+]
+
+
+COLUMNAS_ENTERAS_CATALOGO = ["PRF_version", "duracion_maxima", "dur_etapa_lectiva", "dur_etapa_productiva", "creditos"]
+
+
+def _preparar_catalogo_programas(df: pd.DataFrame) -> pd.DataFrame:
+    """Selecciona, renombra y convierte las columnas del catálogo de programas."""
+    faltantes = [col for col in COLUMNAS_CATALOGO_PROGRAMAS if col not in df.columns]
+    if faltantes:
+        raise ArchivoInvalidoError({
+            "programas_insertados": 0,
+            "programas_actualizados": 0,
+            "errores": [f"Columnas faltantes: {', '.join(faltantes)}"],
+            "mensaje": "No se puede procesar el archivo"
+        })
+    df = df[COLUMNAS_CATALOGO_PROGRAMAS].copy()
 
     df = df.rename(columns={
         "PRF_CODIGO": "cod_programa",
@@ -61,14 +76,14 @@ async def upload_excel(
     df = df.dropna(subset=required_fields)
 
     # Conversión de tipos numéricos
-    for col in ["PRF_version", "duracion_maxima", "dur_etapa_lectiva", "dur_etapa_productiva", "creditos"]:
+    for col in COLUMNAS_ENTERAS_CATALOGO:
         if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+            df[col] = normalizar_enteros(df[col])
 
     # Convertir fechas a tipo date
     for col in ["fecha_registro", "fecha_activo", "fecha_resolucion"]:
         if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors="coerce").dt.date
+            df[col] = normalizar_fechas(df[col])
 
     # Elimina '' y NaN/NaT, solo permite objetos date o None en columnas de fecha
     for col in ["fecha_registro", "fecha_activo", "fecha_resolucion"]:
@@ -94,110 +109,171 @@ async def upload_excel(
     df_programas = df[final_fields].drop_duplicates()
 
     # Para los campos STRING (excepto fechas), puedes usar .fillna("") (opcional)
+    # Los enteros (Int64) no admiten "": sus vacíos se envían como NULL
     for col in df_programas.columns:
-        if col not in ["fecha_registro", "fecha_activo", "fecha_resolucion"]:
+        if col in COLUMNAS_ENTERAS_CATALOGO:
+            df_programas[col] = df_programas[col].astype(object).where(df_programas[col].notna(), None)
+        elif col not in ["fecha_registro", "fecha_activo", "fecha_resolucion"]:
             df_programas[col] = df_programas[col].fillna("")
 
-    resultados = insertar_catalogo_programas(db, df_programas)
+    return df_programas
+
+
+def procesar_excel_catalogo_programas(db: Session, fuente, tamano_bloque: int = TAMANO_BLOQUE_DEFECTO, progreso=None) -> dict:
+    """Carga el catálogo de programas por bloques de filas."""
+
+    def procesar_bloque(df: pd.DataFrame) -> dict:
+        df_programas = _preparar_catalogo_programas(df)
+        if df_programas.empty:
+            return {}
+        return insertar_catalogo_programas(db, df_programas)
+
+    resultados = procesar_excel_por_bloques(fuente, procesar_bloque, tamano_bloque=tamano_bloque, progreso=progreso)
+    resultados.setdefault("programas_insertados", 0)
+    resultados.setdefault("programas_actualizados", 0)
+    resultados.setdefault("errores", [])
+    resultados["mensaje"] = "Carga completada con errores" if resultados["errores"] else "Carga completada exitosamente"
     return resultados
 
 
-@router.post("/upload-excel-catalogo/")
-async def upload_excel_catalogo(
+@router.post("/upload-excel-catalogo-programas/")
+def upload_excel(
     file: UploadFile = File(...),
+    asincrono: bool = Query(False, description="Procesar en segundo plano y devolver el id del trabajo"),
+    force: bool = Query(False, description="Recargar aunque el mismo archivo ya se haya cargado"),
     db: Session = Depends(get_db)
 ):
-    contents = await file.read()
+    if asincrono:
+        return encolar_carga("catalogo_programas", file, procesar_excel_catalogo_programas, db, force)
+
     try:
-        df = pd.read_excel(BytesIO(contents), engine="openpyxl", dtype=str)
-    except Exception as exc:
+        return cargar_con_registro(
+            db, "catalogo_programas", file.file, file.filename, procesar_excel_catalogo_programas, force
+        )
+    except (BadZipFile, InvalidFileException) as exc:
         raise HTTPException(status_code=400, detail=f"No se pudo leer el archivo Excel: {exc}") from exc
 
-    if df is None or df.empty:
-        raise HTTPException(status_code=400, detail="El archivo no contiene datos válidos")
 
+ALIAS_COLUMNAS_CATALOGO = {
+    "COD_CATALOGO": "cod_catalogo",
+    "CODIGO_CATALOGO": "cod_catalogo",
+    "CODIGO": "cod_catalogo",
+    "CODCATALOGO": "cod_catalogo",
+    "NOMBRE_CATALOGO": "nombre_catalogo",
+    "NOMBRE": "nombre_catalogo",
+    "DESCRIPCION": "descripcion",
+    "DESCRIPCIÓN": "descripcion",
+    "ESTADO": "estado",
+    "COD_MUNICIPIO": "cod_municipio",
+    "CODIGO_MUNICIPIO": "cod_municipio",
+    "ID_MUNICIPIO": "cod_municipio",
+    "MUNICIPIO": "nombre_municipio",
+    "NOMBRE_MUNICIPIO": "nombre_municipio"
+}
+
+
+def _normalizar_estado(valor):
+    if pd.isna(valor):
+        return True
+    val = str(valor).strip().lower()
+    if val in ("1", "true", "si", "sí", "activo"):
+        return True
+    if val in ("0", "false", "no", "inactivo"):
+        return False
+    return True
+
+
+def _renombrar_columnas_catalogo(df: pd.DataFrame) -> pd.DataFrame:
     # Normalizar nombres de columnas para facilitar el mapeo
     df.columns = df.columns.astype(str).str.strip()
     columnas_disponibles = {col.upper(): col for col in df.columns}
 
-    alias_columnas = {
-        "COD_CATALOGO": "cod_catalogo",
-        "CODIGO_CATALOGO": "cod_catalogo",
-        "CODIGO": "cod_catalogo",
-        "CODCATALOGO": "cod_catalogo",
-        "NOMBRE_CATALOGO": "nombre_catalogo",
-        "NOMBRE": "nombre_catalogo",
-        "DESCRIPCION": "descripcion",
-        "DESCRIPCIÓN": "descripcion",
-        "ESTADO": "estado",
-        "COD_MUNICIPIO": "cod_municipio",
-        "CODIGO_MUNICIPIO": "cod_municipio",
-        "ID_MUNICIPIO": "cod_municipio",
-        "MUNICIPIO": "nombre_municipio",
-        "NOMBRE_MUNICIPIO": "nombre_municipio"
-    }
-
     renombres = {}
     usados = set()
-    for alias, destino in alias_columnas.items():
+    for alias, destino in ALIAS_COLUMNAS_CATALOGO.items():
         alias_upper = alias.upper()
         if alias_upper in columnas_disponibles and destino not in usados:
             renombres[columnas_disponibles[alias_upper]] = destino
             usados.add(destino)
 
-    df = df.rename(columns=renombres)
+    return df.rename(columns=renombres)
 
-    def normalizar_estado(valor):
-        if pd.isna(valor):
-            return True
-        val = str(valor).strip().lower()
-        if val in ("1", "true", "si", "sí", "activo"):
-            return True
-        if val in ("0", "false", "no", "inactivo"):
-            return False
-        return True
 
-    if "estado" in df.columns:
-        df["estado"] = df["estado"].apply(normalizar_estado)
+def procesar_excel_catalogo(db: Session, fuente, tamano_bloque: int = TAMANO_BLOQUE_DEFECTO, progreso=None) -> dict:
+    """Carga catálogos y municipios por bloques de filas."""
+    # Los municipios ya registrados se consultan una sola vez para todos los bloques
+    municipios_existentes = None
+
+    def procesar_bloque(df: pd.DataFrame) -> dict:
+        nonlocal municipios_existentes
+        df = _renombrar_columnas_catalogo(df)
 
-    resultados = {}
+        if "estado" in df.columns:
+            df["estado"] = df["estado"].apply(_normalizar_estado)
 
-    columnas_catalogo = [col for col in ["cod_catalogo", "nombre_catalogo", "descripcion", "estado"] if col in df.columns]
-    if {"cod_catalogo", "nombre_catalogo"}.issubset(set(columnas_catalogo)):
-        df_catalogos = df[columnas_catalogo].copy()
-        df_catalogos = df_catalogos.dropna(subset=["cod_catalogo", "nombre_catalogo"])
-        df_catalogos["cod_catalogo"] = df_catalogos["cod_catalogo"].astype(str).str.strip()
-        df_catalogos["nombre_catalogo"] = df_catalogos["nombre_catalogo"].astype(str).str.strip()
-        df_catalogos = df_catalogos[df_catalogos["cod_catalogo"] != ""]
-        df_catalogos = df_catalogos.drop_duplicates(subset=["cod_catalogo"])
+        resultados = {}
 
-        if not df_catalogos.empty:
-            resultados["catalogo"] = insertar_datos_en_bd(db, df_catalogos)
+        columnas_catalogo = [col for col in ["cod_catalogo", "nombre_catalogo", "descripcion", "estado"] if col in df.columns]
+        if {"cod_catalogo", "nombre_catalogo"}.issubset(set(columnas_catalogo)):
+            df_catalogos = df[columnas_catalogo].copy()
+            df_catalogos = df_catalogos.dropna(subset=["cod_catalogo", "nombre_catalogo"])
+            df_catalogos["cod_catalogo"] = df_catalogos["cod_catalogo"].astype(str).str.strip()
+            df_catalogos["nombre_catalogo"] = df_catalogos["nombre_catalogo"].astype(str).str.strip()
+            df_catalogos = df_catalogos[df_catalogos["cod_catalogo"] != ""]
+            df_catalogos = df_catalogos.drop_duplicates(subset=["cod_catalogo"])
+
+            if not df_catalogos.empty:
+                resultados["catalogo"] = insertar_datos_en_bd(db, df_catalogos)
+            else:
+                resultados["catalogo"] = {"mensaje": "Sin registros de catálogo válidos"}
         else:
-            resultados["catalogo"] = {"mensaje": "Sin registros de catálogo válidos"}
-    else:
-        resultados["catalogo"] = {"mensaje": "No se encontraron columnas de catálogo requeridas"}
-
-    if {"cod_municipio", "nombre_municipio"}.issubset(df.columns):
-        df_municipios = df[["cod_municipio", "nombre_municipio"]].copy()
-        df_municipios = df_municipios.dropna(subset=["cod_municipio"])
-        df_municipios["cod_municipio"] = df_municipios["cod_municipio"].astype(str).str.strip()
-        df_municipios["nombre_municipio"] = df_municipios["nombre_municipio"].astype(str).str.strip()
-        df_municipios = df_municipios[df_municipios["cod_municipio"] != ""]
-        df_municipios = df_municipios.drop_duplicates(subset=["cod_municipio"])
-
-        if not df_municipios.empty:
-            existentes = db.execute(text("SELECT cod_municipio FROM municipios")).scalars().all()
-            existentes = set(str(cod).strip() for cod in existentes if cod is not None)
-            df_municipios = df_municipios[~df_municipios["cod_municipio"].isin(existentes)]
+            resultados["catalogo"] = {"mensaje": "No se encontraron columnas de catálogo requeridas"}
+
+        if {"cod_municipio", "nombre_municipio"}.issubset(df.columns):
+            df_municipios = df[["cod_municipio", "nombre_municipio"]].copy()
+            df_municipios = df_municipios.dropna(subset=["cod_municipio"])
+            df_municipios["cod_municipio"] = df_municipios["cod_municipio"].astype(str).str.strip()
+            df_municipios["nombre_municipio"] = df_municipios["nombre_municipio"].astype(str).str.strip()
+            df_municipios = df_municipios[df_municipios["cod_municipio"] != ""]
+            df_municipios = df_municipios.drop_duplicates(subset=["cod_municipio"])
 
             if not df_municipios.empty:
-                resultados["municipios"] = insertar_municipios(db, df_municipios)
+                if municipios_existentes is None:
+                    existentes = db.execute(text("SELECT cod_municipio FROM municipios")).scalars().all()
+                    municipios_existentes = set(str(cod).strip() for cod in existentes if cod is not None)
+                df_municipios = df_municipios[~df_municipios["cod_municipio"].isin(municipios_existentes)]
+
+                if not df_municipios.empty:
+                    resultados["municipios"] = insertar_municipios(db, df_municipios)
+                    municipios_existentes.update(df_municipios["cod_municipio"])
+                else:
+                    resultados["municipios"] = {"mensaje": "Todos los municipios ya estaban registrados"}
             else:
-                resultados["municipios"] = {"mensaje": "Todos los municipios ya estaban registrados"}
+                resultados["municipios"] = {"mensaje": "Sin registros de municipios válidos"}
         else:
-            resultados["municipios"] = {"mensaje": "Sin registros de municipios válidos"}
-    else:
-        resultados["municipios"] = {"mensaje": "No se encontraron columnas de municipios"}
+            resultados["municipios"] = {"mensaje": "No se encontraron columnas de municipios"}
+
+        return resultados
 
+    resultados = procesar_excel_por_bloques(fuente, procesar_bloque, tamano_bloque=tamano_bloque, progreso=progreso)
+    if not resultados.get("filas_leidas"):
+        raise ArchivoInvalidoError({"mensaje": "El archivo no contiene datos válidos"})
     return resultados
+
+
+@router.post("/upload-excel-catalogo/")
+def upload_excel_catalogo(
+    file: UploadFile = File(...),
+    asincrono: bool = Query(False, description="Procesar en segundo plano y devolver el id del trabajo"),
+    force: bool = Query(False, description="Recargar aunque el mismo archivo ya se haya cargado"),
+    db: Session = Depends(get_db)
+):
+    if asincrono:
+        return encolar_carga("catalogo", file, procesar_excel_catalogo, db, force)
+
+    try:
+        return cargar_con_registro(db, "catalogo", file.file, file.filename, procesar_excel_catalogo, force)
+    except (BadZipFile, InvalidFileException) as exc:
+        raise HTTPException(status_code=400, detail=f"No se pudo leer el archivo Excel: {exc}") from exc
+    except ArchivoInvalidoError as exc:
+        raise HTTPException(status_code=400, detail=exc.resumen["mensaje"]) from exc
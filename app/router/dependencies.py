@@ -1,9 +1,12 @@
-from fastapi import Depends, HTTPException
+from typing import List, Optional
+from fastapi import Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from app.crud.usuarios import get_user_by_email_security, get_user_by_id
 from core.security import verify_password, verify_token
 from core.database import get_db
 from fastapi.security import OAuth2PasswordBearer
+from app.utils.consultas import parsear_campos
+from core.cache import etag_coincide, etag_generaciones
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/access/token")
@@ -23,10 +26,52 @@ def get_current_user(
     return user_db
 
 
+def get_current_admin(user_db=Depends(get_current_user)):
+    """Como `get_current_user`, pero solo deja pasar a administradores (id_rol 1)."""
+    if user_db.id_rol != 1:
+        raise HTTPException(status_code=403, detail="No tienes permisos de administrador")
+    return user_db
+
+
 def authenticate_user(username: str, password: str, db: Session):
     user = get_user_by_email_security(db, username)
     if not user:
         return False
     if not verify_password(password, user.contra_encript):
         return False
-    return user
\ No newline at end of file
+    return user
+
+
+def campos_solicitados(
+        fields: Optional[str] = Query(None, description="Columnas a devolver separadas por coma (p. ej. `cod_programa,nombre`)")
+) -> Optional[List[str]]:
+    """Lee el parámetro `fields` de los endpoints de listado con proyección de columnas."""
+    return parsear_campos(fields)
+
+
+def condicional_por_tablas(*tablas: str, autenticado: bool = False):
+    """
+    Dependencia de router para GET condicionales. Calcula el ETag de la URL a
+    partir de la generación de `tablas` (ver core/cache.py) y, si coincide con
+    `If-None-Match`, responde 304 sin consultar la base de datos. El ETag queda
+    en `request.state.etag` y el middleware de main.py lo agrega a la respuesta.
+
+    Con `autenticado` el ETag solo se evalúa después de `get_current_user`: sin
+    un token válido la respuesta es 401 y no un 304 que confirmaría que los
+    datos no cambiaron.
+    """
+    def evaluar(request: Request):
+        if request.method not in ("GET", "HEAD"):
+            return
+        etag = etag_generaciones(f"{request.url.path}?{request.url.query}", tablas)
+        request.state.etag = etag
+        if etag_coincide(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+
+    if not autenticado:
+        return evaluar
+
+    def verificar_autenticado(request: Request, user_db=Depends(get_current_user)):
+        evaluar(request)
+
+    return verificar_autenticado
@@ -1,17 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from core.cache import cache_consulta
 from core.database import get_db
+from app.crud.facetas import valores_faceta
+from app.router.dependencies import campos_solicitados, condicional_por_tablas
+from app.utils.consultas import FiltroInvalidoError
 from app.schemas.estado_normas import RetornoEstadoNorma
 from app.crud import estado_normas as crud_estado
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(condicional_por_tablas("estado_de_normas"))])
 
 
 # Listar todos
 @router.get("/listar", response_model=List[RetornoEstadoNorma])
-def listar(db: Session = Depends(get_db)):
-    return crud_estado.listar_estado_normas(db)
+def listar(campos: Optional[List[str]] = Depends(campos_solicitados), db: Session = Depends(get_db)):
+    """Lista los estados de normas. Con `fields` solo se consultan y devuelven esas columnas."""
+    try:
+        normas = cache_consulta(
+            "estado_normas.listar", ("estado_de_normas",), {"campos": campos}, lambda: crud_estado.listar_estado_normas(db, campos=campos)
+        )
+    except FiltroInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not campos:
+        return normas
+    return JSONResponse(content=jsonable_encoder(normas))
 
 
 # Obtener por ID
@@ -34,7 +49,7 @@ def obtener_por_cod_programa(cod_programa: int, db: Session = Depends(get_db)):
 
 @router.get("/valores-anio", response_model=List[int])
 def valores_anio(db: Session = Depends(get_db)):
-    return crud_estado.get_distinct_anios(db)
+    return valores_faceta(db, "estado_normas", "anio")
 
 
 @router.get("/obtener-por-anio/{anio}", response_model=List[RetornoEstadoNorma])
@@ -47,7 +62,7 @@ def obtener_por_anio(anio: int, db: Session = Depends(get_db)):
 
 @router.get("/valores-vigencia", response_model=List[str])
 def valores_vigencia(db: Session = Depends(get_db)):
-    return crud_estado.get_distinct_vigencias(db)
+    return valores_faceta(db, "estado_normas", "vigencia")
 
 
 @router.get("/obtener-por-vigencia/{vigencia}", response_model=List[RetornoEstadoNorma])
@@ -60,7 +75,7 @@ def obtener_por_vigencia(vigencia: str, db: Session = Depends(get_db)):
 
 @router.get("/valores-tipo_norma", response_model=List[str])
 def valores_tipo_norma(db: Session = Depends(get_db)):
-    return crud_estado.get_distinct_tipo_norma(db)
+    return valores_faceta(db, "estado_normas", "tipo_norma")
 
 
 @router.get("/obtener-por-tipo_norma/{tipo_norma}", response_model=List[RetornoEstadoNorma])
@@ -73,7 +88,7 @@ def obtener_por_tipo_norma(tipo_norma: str, db: Session = Depends(get_db)):
 
 @router.get("/valores-mesa_sectorial", response_model=List[str])
 def valores_mesa_sectorial(db: Session = Depends(get_db)):
-    return crud_estado.get_distinct_mesa_sectorial(db)
+    return valores_faceta(db, "estado_normas", "mesa_sectorial")
 
 
 @router.get("/obtener-por-mesa_sectorial/{mesa}", response_model=List[RetornoEstadoNorma])
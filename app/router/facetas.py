@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.database import get_db
+from app.crud import facetas as crud_facetas
+from app.utils.consultas import FiltroInvalidoError
+
+router = APIRouter()
+
+
+@router.get("/{table}", status_code=status.HTTP_200_OK)
+def facets(table: str, db: Session = Depends(get_db)):
+    """
+    Todos los valores distintos (con su número de registros) de las columnas de
+    filtro de `table`: programas_formacion, registro_calificado o estado_normas.
+    Una sola llamada reemplaza a los `/valores-*` de la tabla.
+    """
+    try:
+        return crud_facetas.obtener_facetas(db, table)
+    except FiltroInvalidoError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=str(e))
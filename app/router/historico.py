@@ -1,29 +1,212 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from typing import List
+from typing import List, Optional
 
-from app.schemas.historico import RetornoHistorico
+from app.schemas.historico import ConsultaFichas, RetornoHistorico
+from core.cache import cache_consulta
 from core.database import get_db
 from app.crud import historico as crud_historico
-from app.router.dependencies import get_current_user
+from app.crud import resumenes
+from app.router.dependencies import campos_solicitados, condicional_por_tablas, get_current_user
 from app.schemas.usuarios import RetornoUsuario
+from app.utils.consultas import FiltroInvalidoError, parsear_rangos
+from app.utils.paginacion import CursorInvalidoError, codificar_cursor, decodificar_cursor
 
-router = APIRouter()
+# GET condicionales: el ETag cambia con cada carga del histórico o de sus resúmenes.
+# Todas las rutas piden JWT, así que el ETag se evalúa después de autenticar
+router = APIRouter(dependencies=[Depends(condicional_por_tablas(
+    *crud_historico.TABLAS_HISTORICO, *(tabla for tabla, _, _ in resumenes.RESUMENES_HISTORICO.values()),
+    autenticado=True,
+))])
 
 @router.get("/obtener-todos", status_code=status.HTTP_200_OK)
 def get_all(
-    skip: int = 0, 
-    limit: int = 5000, 
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Valor de la cabecera `X-Next-Cursor` de la página anterior"),
+    limit: int = Query(5000, ge=1, le=5000),
+    skip: int = Query(0, ge=0, deprecated=True, description="Paginación por OFFSET (lenta en páginas profundas); usar `cursor`"),
+    campos: Optional[List[str]] = Depends(campos_solicitados),
     db: Session = Depends(get_db),
     user_token: RetornoUsuario = Depends(get_current_user)
 ):
+    """
+    Lista los históricos ordenados por `id_historico`, por páginas de `limit` filas.
+    Si hay más páginas, la cabecera `X-Next-Cursor` trae el valor que se envía
+    como `cursor` para pedir la siguiente. Con `fields` solo se consultan y
+    devuelven esas columnas.
+    """
     try:
-        historicos = crud_historico.get_all_historicos(db, skip=skip, limit=limit)
+        try:
+            if skip and not cursor:
+                return crud_historico.get_all_historicos(db, skip=skip, limit=limit, campos=campos)
+
+            posicion = decodificar_cursor(cursor, claves=("id_historico",))
+            despues_de = posicion["id_historico"] if posicion else None
+            historicos, ultimo = cache_consulta(
+                "historico.obtener_todos",
+                crud_historico.TABLAS_HISTORICO,
+                {"despues_de": despues_de, "limit": limit, "campos": campos},
+                lambda: crud_historico.get_historicos_pagina(db, despues_de=despues_de, limit=limit, campos=campos),
+            )
+        except (CursorInvalidoError, FiltroInvalidoError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if ultimo is not None:
+            response.headers["X-Next-Cursor"] = codificar_cursor({"id_historico": ultimo})
         return historicos
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def filtros_historico(
+    cod_regional: Optional[List[int]] = Query(None),
+    cod_centro: Optional[List[int]] = Query(None),
+    cod_programa: Optional[List[str]] = Query(None),
+    ficha: Optional[List[int]] = Query(None),
+    modalidad: Optional[List[str]] = Query(None),
+    jornada: Optional[List[str]] = Query(None),
+    etapa_ficha: Optional[List[str]] = Query(None),
+    estado_curso: Optional[List[str]] = Query(None),
+    cod_municipio: Optional[List[str]] = Query(None),
+    cod_estrategia: Optional[List[str]] = Query(None),
+    fecha_inicio_desde: Optional[date] = None,
+    fecha_inicio_hasta: Optional[date] = None,
+    fecha_fin_desde: Optional[date] = None,
+    fecha_fin_hasta: Optional[date] = None,
+    rango: Optional[List[str]] = Query(
+        None, description="Rango sobre num_aprendices_* o cupo_asignado: `columna:minimo:maximo` (extremos opcionales)"
+    ),
+) -> dict:
+    """
+    Filtros comunes de `/consultar` y `/agregados`. Los de igualdad aceptan varios
+    valores (`?jornada=DIURNA&jornada=NOCTURNA`), las fechas se filtran con
+    `_desde`/`_hasta` y los contadores con `rango`.
+    """
+    filtros = {
+        "cod_regional": cod_regional, "cod_centro": cod_centro, "cod_programa": cod_programa,
+        "ficha": ficha, "modalidad": modalidad, "jornada": jornada, "etapa_ficha": etapa_ficha,
+        "estado_curso": estado_curso, "cod_municipio": cod_municipio, "cod_estrategia": cod_estrategia,
+    }
+    fechas = {
+        "fecha_inicio": (fecha_inicio_desde, fecha_inicio_hasta),
+        "fecha_fin": (fecha_fin_desde, fecha_fin_hasta),
+    }
+    try:
+        rangos = parsear_rangos(rango)
+    except FiltroInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "filtros": {k: v for k, v in filtros.items() if v},
+        "fechas": {k: v for k, v in fechas.items() if v != (None, None)},
+        "rangos": rangos,
+    }
+
+
+@router.get("/consultar", status_code=status.HTTP_200_OK)
+def consultar(
+    filtros: dict = Depends(filtros_historico),
+    campos: Optional[List[str]] = Depends(campos_solicitados),
+    orden: str = Query("id_historico", description="Columna de ordenamiento"),
+    desc: bool = False,
+    cursor: Optional[str] = Query(None, description="Valor de `next_cursor` de la página anterior"),
+    limit: int = Query(1000, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    user_token: RetornoUsuario = Depends(get_current_user)
+):
+    """
+    Consulta el histórico combinando filtros en una sola sentencia SQL.
+    Reemplaza a los endpoints `/obtener-por-<columna>`. Pagina con `next_cursor`.
+    """
+    try:
+        posicion = decodificar_cursor(cursor, claves=("orden", "desc", "valor", "id_historico"))
+        if posicion and (posicion["orden"] != orden or posicion["desc"] != desc):
+            raise CursorInvalidoError("El cursor corresponde a otro ordenamiento")
+
+        historicos, siguiente = cache_consulta(
+            "historico.consultar",
+            crud_historico.TABLAS_HISTORICO,
+            {**filtros, "campos": campos, "orden": orden, "desc": desc, "limit": limit, "cursor": posicion},
+            lambda: crud_historico.consultar_historicos(
+                db,
+                **filtros,
+                campos=campos,
+                orden=orden,
+                descendente=desc,
+                limit=limit,
+                cursor=posicion,
+            ),
+        )
+    except (CursorInvalidoError, FiltroInvalidoError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    next_cursor = codificar_cursor({"orden": orden, "desc": desc, **siguiente}) if siguiente else None
+    return {"items": historicos, "next_cursor": next_cursor}
+
+
+@router.get("/agregados", status_code=status.HTTP_200_OK)
+def agregados(
+    agrupar: Optional[List[str]] = Query(
+        None, description="Dimensiones: regional, nombre_regional, centro, programa, municipio, jornada, modalidad, estado_curso, anio_inicio"
+    ),
+    medida: List[str] = Query(
+        ..., description="`funcion:columna` (sum, avg, count, min, max sobre num_aprendices_* o cupo_asignado) o `count`"
+    ),
+    filtros: dict = Depends(filtros_historico),
+    limit: int = Query(10000, ge=1, le=50000, description="Máximo de grupos; si la agrupación tiene más se responde 400"),
+    db: Session = Depends(get_db),
+    user_token: RetornoUsuario = Depends(get_current_user)
+):
+    """
+    Totales del histórico calculados en la base de datos con un solo `GROUP BY`.
+
+    Ejemplo: `?agrupar=centro&agrupar=anio_inicio&medida=sum:num_aprendices_certificados&medida=count`
+    devuelve una fila por centro y año con `sum_num_aprendices_certificados` y `total_registros`.
+    Acepta los mismos filtros que `/consultar`. Si la agrupación tiene más de
+    `limit` grupos responde 400 en lugar de devolver totales incompletos.
+    """
+    try:
+        return cache_consulta(
+            "historico.agregados",
+            crud_historico.TABLAS_HISTORICO,
+            {**filtros, "agrupar": agrupar, "medida": medida, "limit": limit},
+            lambda: crud_historico.agregar_historicos(db, agrupar or [], medida, **filtros, limit=limit),
+        )
+    except FiltroInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/resumenes/{dimension}", status_code=status.HTTP_200_OK)
+def resumen(
+    dimension: str,
+    campos: Optional[List[str]] = Depends(campos_solicitados),
+    db: Session = Depends(get_db),
+    user_token: RetornoUsuario = Depends(get_current_user)
+):
+    """
+    Totales precalculados del histórico por `programa`, `centro`, `municipio` o `mes`.
+
+    Se leen de las tablas resumen que se actualizan al final de cada carga del
+    histórico, sin recorrer el histórico completo. Para filtros arbitrarios use `/agregados`.
+    """
+    try:
+        tabla = resumenes.RESUMENES_HISTORICO[dimension][0] if dimension in resumenes.RESUMENES_HISTORICO else dimension
+        return cache_consulta(
+            "historico.resumenes",
+            (tabla,),
+            {"dimension": dimension, "campos": campos},
+            lambda: resumenes.obtener_resumen(db, dimension, campos),
+        )
+    except FiltroInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/obtener-por-id/{id_historico}", status_code=status.HTTP_200_OK)
 def get_by_id(
     id_historico: int, 
@@ -75,7 +258,27 @@ def get_by_ficha(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-cod_programa/{cod_programa}", status_code=status.HTTP_200_OK)
+@router.post("/obtener-por-fichas", status_code=status.HTTP_200_OK)
+def get_by_fichas(
+    consulta: ConsultaFichas,
+    campos: Optional[List[str]] = Depends(campos_solicitados),
+    db: Session = Depends(get_db),
+    user_token: RetornoUsuario = Depends(get_current_user)
+):
+    """
+    Histórico de muchas fichas en una sola petición (hasta 5000).
+    Devuelve `encontrados` ({ficha: histórico}) y `faltantes` (fichas sin histórico).
+    """
+    try:
+        encontrados, faltantes = crud_historico.get_historicos_by_fichas(db, consulta.fichas, campos=campos)
+    except FiltroInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"encontrados": encontrados, "faltantes": faltantes}
+
+
+@router.get("/obtener-por-cod_programa/{cod_programa}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_cod_programa(
     cod_programa: str,
     db: Session = Depends(get_db),
@@ -93,7 +296,7 @@ def get_by_cod_programa(
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/obtener-por-cod_centro/{cod_centro}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-cod_centro/{cod_centro}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_cod_centro(
     cod_centro: str,
     db: Session = Depends(get_db),
@@ -111,7 +314,7 @@ def get_by_cod_centro(
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/obtener-por-jornada/{jornada}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-jornada/{jornada}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_jornada(
     jornada: str,
     db: Session = Depends(get_db),
@@ -130,7 +333,7 @@ def get_by_jornada(
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/obtener-por-estado-curso/{estado_curso}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-estado-curso/{estado_curso}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_estado_curso(
     estado_curso: str,
     db: Session = Depends(get_db),
@@ -149,7 +352,7 @@ def get_by_estado_curso(
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/obtener-por-fecha_inicio/{fecha_inicio}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-fecha_inicio/{fecha_inicio}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_fecha_inicio(
     fecha_inicio: str,
     db: Session = Depends(get_db),
@@ -170,7 +373,7 @@ def get_by_fecha_inicio(
 
 # ==================== ENDPOINTS ====================
 
-@router.get("/obtener-por-fecha_inicio/{fecha_inicio}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-fecha_inicio/{fecha_inicio}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_fecha_inicio(
     fecha_inicio: str,
     db: Session = Depends(get_db),
@@ -190,7 +393,7 @@ def get_by_fecha_inicio(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-fecha_fin/{fecha_fin}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-fecha_fin/{fecha_fin}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_fecha_fin(
     fecha_fin: str,
     db: Session = Depends(get_db),
@@ -210,7 +413,7 @@ def get_by_fecha_fin(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-cod_municipio/{cod_municipio}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-cod_municipio/{cod_municipio}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_cod_municipio(
     cod_municipio: str,
     db: Session = Depends(get_db),
@@ -229,7 +432,7 @@ def get_by_cod_municipio(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_inscritos/{num_aprendices_inscritos}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_inscritos/{num_aprendices_inscritos}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_inscritos(
     num_aprendices_inscritos: int,
     db: Session = Depends(get_db),
@@ -248,7 +451,7 @@ def get_by_num_aprendices_inscritos(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_en_transito/{num_aprendices_en_transito}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_en_transito/{num_aprendices_en_transito}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_en_transito(
     num_aprendices_en_transito: int,
     db: Session = Depends(get_db),
@@ -267,7 +470,7 @@ def get_by_num_aprendices_en_transito(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_formacion/{num_aprendices_formacion}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_formacion/{num_aprendices_formacion}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_formacion(
     num_aprendices_formacion: int,
     db: Session = Depends(get_db),
@@ -286,7 +489,7 @@ def get_by_num_aprendices_formacion(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_induccion/{num_aprendices_induccion}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_induccion/{num_aprendices_induccion}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_induccion(
     num_aprendices_induccion: int,
     db: Session = Depends(get_db),
@@ -305,7 +508,7 @@ def get_by_num_aprendices_induccion(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_condicionados/{num_aprendices_condicionados}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_condicionados/{num_aprendices_condicionados}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_condicionados(
     num_aprendices_condicionados: int,
     db: Session = Depends(get_db),
@@ -324,7 +527,7 @@ def get_by_num_aprendices_condicionados(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_aplazados/{num_aprendices_aplazados}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_aplazados/{num_aprendices_aplazados}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_aplazados(
     num_aprendices_aplazados: int,
     db: Session = Depends(get_db),
@@ -343,7 +546,7 @@ def get_by_num_aprendices_aplazados(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_retirado_voluntario/{num_aprendices_retirado_voluntario}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_retirado_voluntario/{num_aprendices_retirado_voluntario}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_retirado_voluntario(
     num_aprendices_retirado_voluntario: int,
     db: Session = Depends(get_db),
@@ -362,7 +565,7 @@ def get_by_num_aprendices_retirado_voluntario(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_cancelados/{num_aprendices_cancelados}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_cancelados/{num_aprendices_cancelados}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_cancelados(
     num_aprendices_cancelados: int,
     db: Session = Depends(get_db),
@@ -381,7 +584,7 @@ def get_by_num_aprendices_cancelados(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_reprobados/{num_aprendices_reprobados}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_reprobados/{num_aprendices_reprobados}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_reprobados(
     num_aprendices_reprobados: int,
     db: Session = Depends(get_db),
@@ -400,7 +603,7 @@ def get_by_num_aprendices_reprobados(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_no_aptos/{num_aprendices_no_aptos}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_no_aptos/{num_aprendices_no_aptos}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_no_aptos(
     num_aprendices_no_aptos: int,
     db: Session = Depends(get_db),
@@ -419,7 +622,7 @@ def get_by_num_aprendices_no_aptos(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_reingresados/{num_aprendices_reingresados}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_reingresados/{num_aprendices_reingresados}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_reingresados(
     num_aprendices_reingresados: int,
     db: Session = Depends(get_db),
@@ -438,7 +641,7 @@ def get_by_num_aprendices_reingresados(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_por_certificar/{num_aprendices_por_certificar}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_por_certificar/{num_aprendices_por_certificar}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_por_certificar(
     num_aprendices_por_certificar: int,
     db: Session = Depends(get_db),
@@ -457,7 +660,7 @@ def get_by_num_aprendices_por_certificar(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/obtener-por-num_aprendices_certificados/{num_aprendices_certificados}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_certificados/{num_aprendices_certificados}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_certificados(
     num_aprendices_certificados: int,
     db: Session = Depends(get_db),
@@ -475,7 +678,7 @@ def get_by_num_aprendices_certificados(
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/obtener-por-num_aprendices_trasladados/{num_aprendices_trasladados}", status_code=status.HTTP_200_OK)
+@router.get("/obtener-por-num_aprendices_trasladados/{num_aprendices_trasladados}", status_code=status.HTTP_200_OK, deprecated=True)
 def get_by_num_aprendices_trasladados(
     num_aprendices_trasladados: int,
     db: Session = Depends(get_db),
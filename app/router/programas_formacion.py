@@ -1,17 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from app.schemas.programas_formacion import RetornoPrograma
+from app.schemas.programas_formacion import ConsultaProgramas, RetornoPrograma
 from app.crud import programas_formacion as crud_programas
+from core.cache import cache_consulta
 from core.database import get_db
+from app.crud.facetas import valores_faceta
+from app.router.dependencies import campos_solicitados, condicional_por_tablas
+from app.utils.consultas import FiltroInvalidoError
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(condicional_por_tablas("programas_formacion"))])
 
 
 @router.get("/listar", response_model=List[RetornoPrograma])
-def listar(db: Session = Depends(get_db)):
-    return crud_programas.listar_programas(db)
+def listar(campos: Optional[List[str]] = Depends(campos_solicitados), db: Session = Depends(get_db)):
+    """
+    Lista los programas de formación. Con `fields` solo se consultan y devuelven
+    esas columnas (p. ej. `?fields=cod_programa,nombre,nivel`).
+    """
+    try:
+        programas = cache_consulta(
+            "programas_formacion.listar", ("programas_formacion",), {"campos": campos}, lambda: crud_programas.listar_programas(db, campos=campos)
+        )
+    except FiltroInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not campos:
+        return programas
+    return JSONResponse(content=jsonable_encoder(programas))
 
 
 # Obtener por código de programa (endpoint explícito para evitar rutas dinámicas)
@@ -23,6 +41,16 @@ def obtener_por_cod_programa(cod_programa: str, db: Session = Depends(get_db)):
     return r
 
 
+@router.post("/obtener-por-codigos")
+def obtener_por_codigos(consulta: ConsultaProgramas, db: Session = Depends(get_db)):
+    """
+    Programas de muchos códigos en una sola petición (hasta 5000).
+    Devuelve `encontrados` ({cod_programa: programa}) y `faltantes`.
+    """
+    encontrados, faltantes = crud_programas.obtener_programas_por_codigos(db, consulta.cod_programas)
+    return {"encontrados": encontrados, "faltantes": faltantes}
+
+
 # Endpoints de consulta por campos y valores únicos
 @router.get("/obtener-por-nivel/{nivel}", response_model=List[RetornoPrograma])
 def obtener_por_nivel(nivel: str, db: Session = Depends(get_db)):
@@ -34,7 +62,7 @@ def obtener_por_nivel(nivel: str, db: Session = Depends(get_db)):
 
 @router.get("/valores-nivel", response_model=List[str])
 def valores_nivel(db: Session = Depends(get_db)):
-    return crud_programas.get_distinct_niveles(db)
+    return valores_faceta(db, "programas_formacion", "nivel")
 
 
 @router.get("/obtener-por-tipo_programa/{tipo_programa}", response_model=List[RetornoPrograma])
@@ -47,7 +75,7 @@ def obtener_por_tipo_programa(tipo_programa: str, db: Session = Depends(get_db))
 
 @router.get("/valores-tipo_programa", response_model=List[str])
 def valores_tipo_programa(db: Session = Depends(get_db)):
-    return crud_programas.get_distinct_tipo_programa(db)
+    return valores_faceta(db, "programas_formacion", "tipo_programa")
 
 
 @router.get("/obtener-por-red_conocimiento/{red}", response_model=List[RetornoPrograma])
@@ -60,7 +88,7 @@ def obtener_por_red_conocimiento(red: str, db: Session = Depends(get_db)):
 
 @router.get("/valores-red_conocimiento", response_model=List[str])
 def valores_red_conocimiento(db: Session = Depends(get_db)):
-    return crud_programas.get_distinct_red_conocimiento(db)
+    return valores_faceta(db, "programas_formacion", "red_conocimiento")
 
 
 @router.get("/obtener-por-estado/{estado}", response_model=List[RetornoPrograma])
@@ -71,6 +99,6 @@ def obtener_por_estado(estado: bool, db: Session = Depends(get_db)):
     return r
 
 
-@router.get("/valores-estado", response_model=List[bool])
+@router.get("/valores-estado", response_model=List[Optional[bool]])
 def valores_estado(db: Session = Depends(get_db)):
-    return crud_programas.get_distinct_estados(db)
+    return valores_faceta(db, "programas_formacion", "estado")
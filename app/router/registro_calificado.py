@@ -1,17 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.schemas.registro_calificado import RetornoRegistroCalificado
 from app.crud import registro_calificado as crud_registro
+from core.cache import cache_consulta
 from core.database import get_db
+from app.crud.facetas import valores_faceta
+from app.router.dependencies import campos_solicitados, condicional_por_tablas
+from app.utils.consultas import FiltroInvalidoError
 
-router = APIRouter(prefix="/registro_calificado", tags=["Registro Calificado"])
+router = APIRouter(
+    prefix="/registro_calificado",
+    tags=["Registro Calificado"],
+    dependencies=[Depends(condicional_por_tablas("registro_calificado"))],
+)
 
 
 @router.get("/listar", response_model=List[RetornoRegistroCalificado])
-def listar(db: Session = Depends(get_db)):
-    return crud_registro.listar_registros(db)
+def listar(campos: Optional[List[str]] = Depends(campos_solicitados), db: Session = Depends(get_db)):
+    """Lista los registros calificados. Con `fields` solo se consultan y devuelven esas columnas."""
+    try:
+        registros = cache_consulta(
+            "registro_calificado.listar", ("registro_calificado",), {"campos": campos}, lambda: crud_registro.listar_registros(db, campos=campos)
+        )
+    except FiltroInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not campos:
+        return registros
+    return JSONResponse(content=jsonable_encoder(registros))
 
 
 # Nota: se usa un endpoint explícito `/obtener-por-cod_programa/{cod_programa}`
@@ -40,7 +59,7 @@ def obtener_por_modalidad(modalidad: str, db: Session = Depends(get_db)):
 
 @router.get("/valores-modalidad", response_model=List[str])
 def valores_modalidad(db: Session = Depends(get_db)):
-    return crud_registro.get_distinct_modalidades(db)
+    return valores_faceta(db, "registro_calificado", "modalidad")
 
 
 @router.get("/obtener-por-clasificacion/{clasificacion}", response_model=List[RetornoRegistroCalificado])
@@ -53,7 +72,7 @@ def obtener_por_clasificacion(clasificacion: str, db: Session = Depends(get_db))
 
 @router.get("/valores-clasificacion", response_model=List[str])
 def valores_clasificacion(db: Session = Depends(get_db)):
-    return crud_registro.get_distinct_clasificaciones(db)
+    return valores_faceta(db, "registro_calificado", "clasificacion")
 
 
 @router.get("/obtener-por-vigencia/{vigencia}", response_model=List[RetornoRegistroCalificado])
@@ -66,7 +85,7 @@ def obtener_por_vigencia(vigencia: str, db: Session = Depends(get_db)):
 
 @router.get("/valores-vigencia", response_model=List[str])
 def valores_vigencia(db: Session = Depends(get_db)):
-    return crud_registro.get_distinct_vigencias(db)
+    return valores_faceta(db, "registro_calificado", "vigencia")
 
 
 @router.get("/obtener-por-estado_catalogo/{estado_catalogo}", response_model=List[RetornoRegistroCalificado])
@@ -79,7 +98,7 @@ def obtener_por_estado_catalogo(estado_catalogo: str, db: Session = Depends(get_
 
 @router.get("/valores-estado_catalogo", response_model=List[str])
 def valores_estado_catalogo(db: Session = Depends(get_db)):
-    return crud_registro.get_distinct_estado_catalogo(db)
+    return valores_faceta(db, "registro_calificado", "estado_catalogo")
 
 
 @router.get("/obtener-por-tipo_tramite/{tipo_tramite}", response_model=List[RetornoRegistroCalificado])
@@ -92,4 +111,4 @@ def obtener_por_tipo_tramite(tipo_tramite: str, db: Session = Depends(get_db)):
 
 @router.get("/valores-tipo_tramite", response_model=List[str])
 def valores_tipo_tramite(db: Session = Depends(get_db)):
-    return crud_registro.get_distinct_tipo_tramite(db)
+    return valores_faceta(db, "registro_calificado", "tipo_tramite")
@@ -1,33 +1,88 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
-from io import BytesIO
-import pandas as pd
+from typing import List, Optional
 
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
+
+from core.config import settings
 from core.database import get_db
-from app.crud.reporte_final import get_unified_rows
+from core.snapshots import almacen_snapshots
+from app.crud.reporte_final import (
+    TABLAS_REPORTE_FINAL,
+    xlsx_reporte_final,
+    xlsx_reporte_por_centro,
+    zip_reporte_por_centro,
+)
+from app.router.dependencies import condicional_por_tablas
+from app.utils.consultas import FiltroInvalidoError
+from app.utils.xlsx_stream import MEDIA_TYPE_XLSX, MEDIA_TYPE_ZIP
+
+router = APIRouter(dependencies=[Depends(condicional_por_tablas(*TABLAS_REPORTE_FINAL))])
+
+SNAPSHOT_REPORTE_FINAL = "reporte_final"
+almacen_snapshots.registrar(SNAPSHOT_REPORTE_FINAL, TABLAS_REPORTE_FINAL, xlsx_reporte_final)
+
 
-router = APIRouter()
+def filtros_reporte(
+    cod_centro: Optional[List[int]] = Query(None),
+    cod_regional: Optional[List[int]] = Query(None),
+    red_conocimiento: Optional[List[str]] = Query(None),
+    nivel: Optional[List[str]] = Query(None, description="Nivel de formación del programa"),
+    modalidad: Optional[List[str]] = Query(None),
+) -> dict:
+    """
+    Filtros del reporte final; todos aceptan varios valores (`?cod_centro=9121&cod_centro=9122`).
+    `cod_centro` y `cod_regional` limitan los grupos que se suman a los de esos centros.
+    """
+    filtros = {
+        "cod_centro": cod_centro, "cod_regional": cod_regional, "red_conocimiento": red_conocimiento,
+        "nivel": nivel, "modalidad": modalidad,
+    }
+    return {k: v for k, v in filtros.items() if v}
 
 
 @router.get('/reporte/final', tags=["Reporte Final"], summary="Exportar reporte final a Excel")
-def reporte_final(db=Depends(get_db)):
+def reporte_final(
+    request: Request,
+    filtros: dict = Depends(filtros_reporte),
+    particion: Optional[str] = Query(
+        None, pattern="^(hojas|zip)$",
+        description="`hojas`: una hoja por centro de formación; `zip`: un ZIP con un Excel por centro",
+    ),
+    db=Depends(get_db),
+):
     """Genera un Excel con la unión de estado de normas, histórico, programas y registro calificado.
 
-    Retorna un `StreamingResponse` con el archivo Excel en memoria.
+    Sin filtros ni partición se sirve el snapshot guardado para la versión actual
+    de los datos; el primer pedido después de una carga espera a que se genere
+    (una sola vez para todos). Si no está listo a tiempo, o si hay filtros, el
+    reporte se escribe en streaming desde la base de datos con los filtros
+    aplicados en la consulta. La cabecera `X-Data-Version` indica la versión de
+    los datos.
     """
+    if filtros or particion:
+        ruta, version = None, almacen_snapshots.version(SNAPSHOT_REPORTE_FINAL)
+    else:
+        ruta, version = almacen_snapshots.obtener(SNAPSHOT_REPORTE_FINAL, settings.REPORTES_ESPERA_SEGUNDOS)
+    nombre_archivo = "reporte_final.zip" if particion == "zip" else "reporte_final.xlsx"
+    headers = {
+        'Content-Disposition': f'attachment; filename="{nombre_archivo}"',
+        'X-Data-Version': version,
+    }
+    etag = getattr(request.state, "etag", None)
+    if etag:
+        # FileResponse pone su propio ETag (fecha y tamaño); se usa el de las generaciones
+        headers['ETag'] = etag
+
+    if ruta is not None:
+        return FileResponse(ruta, media_type=MEDIA_TYPE_XLSX, headers=headers)
+
+    generar = {None: xlsx_reporte_final, "hojas": xlsx_reporte_por_centro, "zip": zip_reporte_por_centro}[particion]
     try:
-        df = get_unified_rows(db)
+        contenido = generar(db, filtros)
+    except FiltroInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando reporte: {str(e)}")
 
-    output = BytesIO()
-    # Escribir Excel en memoria
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Reporte_Final')
-    output.seek(0)
-
-    headers = {
-        'Content-Disposition': 'attachment; filename="reporte_final.xlsx"'
-    }
-
-    return StreamingResponse(output, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', headers=headers)
+    media_type = MEDIA_TYPE_ZIP if particion == "zip" else MEDIA_TYPE_XLSX
+    return StreamingResponse(contenido, media_type=media_type, headers=headers)
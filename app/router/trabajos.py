@@ -0,0 +1,64 @@
+from typing import Callable, Dict, List
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from app.crud.registro_cargas import (
+    calcular_sha256,
+    cargar_con_registro,
+    obtener_carga_registrada,
+    resumen_carga_repetida,
+)
+from app.router.dependencies import get_current_user
+from app.schemas.trabajos import RetornoTrabajo, TrabajoEncolado
+from app.schemas.usuarios import RetornoUsuario
+from core.trabajos import gestor_trabajos
+
+router = APIRouter()
+
+
+def encolar_carga(
+    tipo: str,
+    file: UploadFile,
+    cargador: Callable[..., Dict],
+    db: Session,
+    force: bool = False,
+    **opciones,
+) -> JSONResponse:
+    """
+    Guarda el archivo subido, encola `cargador` y responde 202 con el id del trabajo.
+    `cargador` recibe (db, ruta_del_archivo, progreso=callback, **opciones).
+
+    Si el mismo archivo ya se cargó con este cargador (y no se pide `force`),
+    responde 200 con el resumen guardado sin encolar nada.
+    """
+    sha256 = calcular_sha256(file.file)
+    if not force:
+        registro = obtener_carga_registrada(db, tipo, sha256)
+        if registro is not None:
+            return JSONResponse(content=jsonable_encoder(resumen_carga_repetida(registro, sha256)))
+
+    def cargar(db_trabajo: Session, ruta: str, progreso=None) -> Dict:
+        return cargar_con_registro(
+            db_trabajo, tipo, ruta, file.filename, cargador, force=True, sha256=sha256, progreso=progreso,
+            **opciones,
+        )
+
+    trabajo = gestor_trabajos.encolar(tipo, file.file, file.filename, cargar)
+    contenido = TrabajoEncolado(job_id=trabajo.id, fase=trabajo.fase, url=f"/jobs/{trabajo.id}")
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=contenido.model_dump())
+
+
+@router.get("/", response_model=List[RetornoTrabajo])
+def listar_trabajos(user_token: RetornoUsuario = Depends(get_current_user)):
+    """Lista los trabajos de carga más recientes (el más nuevo primero)."""
+    return [trabajo.a_dict() for trabajo in gestor_trabajos.listar()]
+
+
+@router.get("/{trabajo_id}", response_model=RetornoTrabajo)
+def obtener_trabajo(trabajo_id: str, user_token: RetornoUsuario = Depends(get_current_user)):
+    """Fase, filas procesadas, velocidad, errores y resumen final de un trabajo de carga."""
+    trabajo = gestor_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo.a_dict()
@@ -1,6 +1,14 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
+# Máximo de claves por consulta por lotes (una petición en lugar de miles)
+MAX_CLAVES_LOTE = 5000
+
+
+class ConsultaFichas(BaseModel):
+    fichas: List[int] = Field(min_length=1, max_length=MAX_CLAVES_LOTE, description="Fichas a consultar")
+
+
 class HistoricoBase(BaseModel):
     id_grupo: int = Field(gt=0, description="ID del grupo asociado")
     num_aprendices_inscritos: Optional[int] = Field(default=None, ge=0)
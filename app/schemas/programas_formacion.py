@@ -1,6 +1,13 @@
 # app/schemas/programas_formacion.py
 from pydantic import BaseModel, Field, AnyUrl
-from typing import Optional
+from typing import List, Optional
+
+# Máximo de códigos por consulta por lotes
+MAX_CLAVES_LOTE = 5000
+
+
+class ConsultaProgramas(BaseModel):
+    cod_programas: List[str] = Field(min_length=1, max_length=MAX_CLAVES_LOTE, description="Códigos de programa a consultar")
 
 class CrearPrograma(BaseModel):
     version: Optional[str] = None
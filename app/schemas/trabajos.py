@@ -0,0 +1,22 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+
+class TrabajoEncolado(BaseModel):
+    job_id: str
+    fase: str
+    url: str
+
+
+class RetornoTrabajo(BaseModel):
+    id: str
+    tipo: str
+    nombre_archivo: Optional[str] = None
+    fase: str
+    filas_procesadas: int
+    bloques_procesados: int
+    filas_por_segundo: float
+    duracion_segundos: float
+    total_errores: int
+    errores: List[Any] = []
+    resumen: Optional[Dict[str, Any]] = None
@@ -0,0 +1,382 @@
+import logging
+import numbers
+import os
+import tempfile
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Filas por sentencia INSERT multi-fila (mantiene el paquete muy por debajo de max_allowed_packet)
+TAMANO_LOTE_DEFECTO = 1000
+
+
+def dividir_en_lotes(elementos: Sequence[Any], tamano: int = TAMANO_LOTE_DEFECTO) -> Iterator[Sequence[Any]]:
+    """Divide una secuencia en porciones de a lo sumo `tamano` elementos."""
+    for inicio in range(0, len(elementos), tamano):
+        yield elementos[inicio:inicio + tamano]
+
+
+def construir_insert_multifila(
+    tabla: str,
+    columnas: Sequence[str],
+    filas: Sequence[Dict[str, Any]],
+    prefijo: str = "INSERT INTO",
+    sufijo: str = "",
+):
+    """
+    Construye un `INSERT ... VALUES (...), (...)` con parámetros nombrados únicos por fila.
+
+    Args:
+        tabla: Nombre de la tabla destino.
+        columnas: Columnas a insertar, en orden.
+        filas: Diccionarios con los valores de cada fila.
+        prefijo: Inicio de la sentencia (p. ej. "INSERT IGNORE INTO").
+        sufijo: Cláusula final opcional (p. ej. "ON DUPLICATE KEY UPDATE ...").
+
+    Returns:
+        tuple: (sentencia `text`, diccionario de parámetros).
+    """
+    grupos = []
+    parametros: Dict[str, Any] = {}
+    for i, fila in enumerate(filas):
+        nombres = []
+        for col in columnas:
+            nombre = f"{col}_{i}"
+            parametros[nombre] = fila.get(col)
+            nombres.append(f":{nombre}")
+        grupos.append(f"({', '.join(nombres)})")
+
+    sql = f"{prefijo} {tabla} ({', '.join(columnas)}) VALUES {', '.join(grupos)}"
+    if sufijo:
+        sql = f"{sql} {sufijo}"
+    return text(sql), parametros
+
+
+def consultar_claves_existentes(
+    db: Session,
+    tabla: str,
+    columna: str,
+    claves: Iterable[Any],
+    tamano_lote: int = TAMANO_LOTE_DEFECTO,
+) -> set:
+    """
+    Devuelve el subconjunto de `claves` que ya existe en `tabla.columna`.
+
+    Se ejecuta un `SELECT ... WHERE columna IN :claves` por cada `tamano_lote` claves.
+    """
+    claves = list(dict.fromkeys(c for c in claves if c is not None))
+    existentes = set()
+    sql = text(f"SELECT {columna} FROM {tabla} WHERE {columna} IN :claves")
+    for lote in dividir_en_lotes(claves, tamano_lote):
+        existentes.update(fila[0] for fila in db.execute(sql, {"claves": tuple(lote)}))
+    return existentes
+
+
+def registros_a_parametros(df, columnas_texto: Iterable[str] = ()) -> List[Dict[str, Any]]:
+    """
+    Convierte un DataFrame en una lista de diccionarios de parámetros para SQL.
+
+    Los nulos de pandas (NaN, NaT, NA) pasan a None, los enteros nullable a `int`
+    y las columnas de `columnas_texto` se convierten a `str`.
+    """
+    datos = df.astype(object)
+    for col in columnas_texto:
+        if col in datos.columns:
+            datos[col] = datos[col].map(lambda v: str(v) if pd.notna(v) else None)
+    return datos.where(datos.notna(), None).to_dict("records")
+
+
+def insertar_multifila(
+    db: Session,
+    tabla: str,
+    columnas: Sequence[str],
+    filas: Iterable[Dict[str, Any]],
+    prefijo: str = "INSERT INTO",
+    sufijo: str = "",
+    tamano_lote: int = TAMANO_LOTE_DEFECTO,
+) -> int:
+    """
+    Inserta `filas` con sentencias multi-fila de `tamano_lote` filas, sin hacer commit.
+
+    Returns:
+        int: Suma de `rowcount` de las sentencias ejecutadas.
+    """
+    filas = list(filas)
+    afectadas = 0
+    for lote in dividir_en_lotes(filas, tamano_lote):
+        sql, parametros = construir_insert_multifila(tabla, columnas, lote, prefijo, sufijo)
+        resultado = db.execute(sql, parametros)
+        afectadas += max(resultado.rowcount or 0, 0)
+    return afectadas
+
+
+def _ejecutar_lotes_con_respaldo(
+    db: Session,
+    tabla: str,
+    filas: Sequence[Dict[str, Any]],
+    construir: Callable[[Sequence[Dict[str, Any]]], Any],
+    etiquetas: Optional[Sequence[Any]],
+    tamano_lote: int,
+) -> Dict[str, Any]:
+    """
+    Ejecuta la sentencia que `construir(lote)` devuelve como `(sql, parametros)`
+    por lotes, cada uno en un SAVEPOINT, con reintento fila por fila si el lote falla.
+    """
+    if etiquetas is None:
+        etiquetas = list(range(len(filas)))
+
+    procesadas = 0
+    errores: List[Dict[str, Any]] = []
+
+    for inicio in range(0, len(filas), tamano_lote):
+        lote = filas[inicio:inicio + tamano_lote]
+        try:
+            with db.begin_nested():
+                sql, parametros = construir(lote)
+                db.execute(sql, parametros)
+            procesadas += len(lote)
+            continue
+        except Exception as e:
+            logger.warning(f"Lote de {len(lote)} filas en {tabla} falló, reintentando fila por fila: {e}")
+
+        for desplazamiento, fila in enumerate(lote):
+            etiqueta = etiquetas[inicio + desplazamiento]
+            try:
+                with db.begin_nested():
+                    sql, parametros = construir([fila])
+                    db.execute(sql, parametros)
+                procesadas += 1
+            except Exception as e:
+                errstr = str(getattr(e, "orig", None) or e)
+                errores.append({"fila": etiqueta, "error": errstr})
+                logger.error(f"Error escribiendo fila {etiqueta} en {tabla}: {errstr}")
+
+    return {"procesadas": procesadas, "errores": errores}
+
+
+def insertar_lotes_con_respaldo(
+    db: Session,
+    tabla: str,
+    columnas: Sequence[str],
+    filas: Sequence[Dict[str, Any]],
+    etiquetas: Optional[Sequence[Any]] = None,
+    prefijo: str = "INSERT INTO",
+    sufijo: str = "",
+    tamano_lote: int = TAMANO_LOTE_DEFECTO,
+) -> Dict[str, Any]:
+    """
+    Inserta `filas` por lotes multi-fila dentro de la transacción actual.
+
+    Cada lote se ejecuta en un SAVEPOINT. Si un lote falla se revierte sólo ese
+    lote y sus filas se reintentan de una en una, también con SAVEPOINT, para
+    poder informar exactamente qué filas fallaron sin perder las demás.
+
+    Args:
+        etiquetas: Identificador de cada fila para el reporte de errores
+            (p. ej. el número de fila del Excel). Por defecto, su posición.
+
+    Returns:
+        dict: {"insertados": int, "errores": [{"fila": etiqueta, "error": str}]}
+    """
+    resultado = _ejecutar_lotes_con_respaldo(
+        db, tabla, filas,
+        lambda lote: construir_insert_multifila(tabla, columnas, lote, prefijo, sufijo),
+        etiquetas, tamano_lote,
+    )
+    return {"insertados": resultado["procesadas"], "errores": resultado["errores"]}
+
+
+def construir_update_multifila(
+    tabla: str,
+    clave: str,
+    columnas: Sequence[str],
+    filas: Sequence[Dict[str, Any]],
+):
+    """
+    Construye un único `UPDATE` para varias filas, uniendo `tabla` con una tabla
+    derivada (`SELECT ... UNION ALL SELECT ...`) que trae los valores nuevos.
+
+    Returns:
+        tuple: (sentencia `text`, diccionario de parámetros).
+    """
+    selects = []
+    parametros: Dict[str, Any] = {}
+    for i, fila in enumerate(filas):
+        campos = []
+        for col in [clave, *columnas]:
+            nombre = f"{col}_{i}"
+            parametros[nombre] = fila.get(col)
+            campos.append(f":{nombre} AS {col}" if i == 0 else f":{nombre}")
+        selects.append(f"SELECT {', '.join(campos)}")
+
+    asignaciones = ", ".join(f"t.{col} = v.{col}" for col in columnas)
+    sql = (
+        f"UPDATE {tabla} AS t JOIN ({' UNION ALL '.join(selects)}) AS v "
+        f"ON t.{clave} = v.{clave} SET {asignaciones}"
+    )
+    return text(sql), parametros
+
+
+def upsert_por_prefetch(
+    db: Session,
+    tabla: str,
+    clave: str,
+    columnas: Sequence[str],
+    filas: Sequence[Dict[str, Any]],
+    columnas_actualizables: Optional[Sequence[str]] = None,
+    etiquetas: Optional[Sequence[Any]] = None,
+    tamano_lote: int = TAMANO_LOTE_DEFECTO,
+) -> Dict[str, Any]:
+    """
+    Inserta o actualiza `filas` en `tabla` usando `clave` como identificador, sin consultar fila por fila.
+
+    1. Se consultan de una vez las claves que ya existen (`consultar_claves_existentes`).
+    2. Las filas se separan en memoria en inserciones y actualizaciones.
+    3. Las inserciones van en INSERT multi-fila y las actualizaciones en
+       UPDATE ... JOIN multi-fila, ambos con reintento fila por fila si un lote falla.
+
+    Si la misma clave aparece varias veces se conserva la última fila. No hace
+    commit. No requiere índice único sobre `clave`.
+
+    Args:
+        columnas: Columnas a insertar (incluida `clave`).
+        columnas_actualizables: Columnas que se actualizan si la fila ya existe
+            (por defecto, todas menos `clave`).
+        etiquetas: Identificador de cada fila para el reporte de errores.
+
+    Returns:
+        dict: {"insertados": int, "actualizados": int, "errores": [{"fila": etiqueta, "error": str}]}
+    """
+    if etiquetas is None:
+        etiquetas = list(range(len(filas)))
+    if columnas_actualizables is None:
+        columnas_actualizables = [col for col in columnas if col != clave]
+
+    # Última aparición de cada clave
+    ultimas: Dict[Any, int] = {}
+    for posicion, fila in enumerate(filas):
+        if fila.get(clave) is not None:
+            ultimas[fila[clave]] = posicion
+
+    existentes = consultar_claves_existentes(db, tabla, clave, ultimas.keys(), tamano_lote)
+    if all(isinstance(k, str) for k in ultimas):
+        existentes = {str(k).strip() for k in existentes}
+
+    inserciones, etiquetas_insercion = [], []
+    actualizaciones, etiquetas_actualizacion = [], []
+    for valor, posicion in ultimas.items():
+        if valor in existentes:
+            actualizaciones.append(filas[posicion])
+            etiquetas_actualizacion.append(etiquetas[posicion])
+        else:
+            inserciones.append(filas[posicion])
+            etiquetas_insercion.append(etiquetas[posicion])
+
+    insertadas = _ejecutar_lotes_con_respaldo(
+        db, tabla, inserciones,
+        lambda lote: construir_insert_multifila(tabla, columnas, lote),
+        etiquetas_insercion, tamano_lote,
+    )
+    actualizadas = {"procesadas": 0, "errores": []}
+    if columnas_actualizables:
+        actualizadas = _ejecutar_lotes_con_respaldo(
+            db, tabla, actualizaciones,
+            lambda lote: construir_update_multifila(tabla, clave, columnas_actualizables, lote),
+            etiquetas_actualizacion, tamano_lote,
+        )
+
+    return {
+        "insertados": insertadas["procesadas"],
+        "actualizados": actualizadas["procesadas"],
+        "errores": insertadas["errores"] + actualizadas["errores"],
+    }
+
+
+def _campo_load_data(valor: Any) -> str:
+    """Formatea un valor para un archivo de `LOAD DATA` (escape por defecto '\\', NULL como \\N)."""
+    if valor is None:
+        return "\\N"
+    try:
+        if valor != valor:  # NaN / NaT / NA
+            return "\\N"
+    except (TypeError, ValueError):
+        return "\\N"
+    if isinstance(valor, bool):
+        return "1" if valor else "0"
+    if isinstance(valor, numbers.Number):
+        return str(valor)
+    if hasattr(valor, "isoformat"):
+        return valor.isoformat()
+    texto = str(valor)
+    texto = (
+        texto.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+        .replace("\t", "\\t")
+    )
+    return f'"{texto}"'
+
+
+def escribir_archivo_load_data(archivo, filas: Iterable[Sequence[Any]]) -> int:
+    """Escribe `filas` en `archivo` (modo texto) con el formato que espera `cargar_con_load_data`."""
+    total = 0
+    for fila in filas:
+        archivo.write("\t".join(_campo_load_data(v) for v in fila))
+        archivo.write("\n")
+        total += 1
+    return total
+
+
+def local_infile_habilitado(db: Session) -> bool:
+    """Indica si el servidor MySQL acepta `LOAD DATA LOCAL INFILE`."""
+    try:
+        valor = db.execute(text("SELECT @@GLOBAL.local_infile")).scalar()
+        return str(valor) in ("1", "ON")
+    except Exception as e:
+        logger.warning(f"No se pudo consultar local_infile: {e}")
+        return False
+
+
+def cargar_con_load_data(
+    db: Session,
+    tabla: str,
+    columnas: Sequence[str],
+    filas: Iterable[Sequence[Any]],
+) -> int:
+    """
+    Carga `filas` en `tabla` escribiéndolas en un archivo temporal y usando `LOAD DATA LOCAL INFILE`.
+
+    Requiere `local_infile` activo en el servidor y en la conexión
+    (`connect_args={"local_infile": True}`); si no lo está, MySQL lanza un
+    error que el llamador debe tratar como señal para usar la ruta normal.
+
+    Returns:
+        int: Número de filas cargadas según el servidor.
+    """
+    fd, ruta = tempfile.mkstemp(prefix=f"{tabla}_", suffix=".tsv")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as archivo:
+            escritas = escribir_archivo_load_data(archivo, filas)
+        if escritas == 0:
+            return 0
+
+        sql = text(
+            f"LOAD DATA LOCAL INFILE :ruta INTO TABLE {tabla} "
+            "CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY '\\t' OPTIONALLY ENCLOSED BY '\"' "
+            "LINES TERMINATED BY '\\n' "
+            f"({', '.join(columnas)})"
+        )
+        resultado = db.execute(sql, {"ruta": ruta})
+        logger.info(f"LOAD DATA en {tabla}: {escritas} filas escritas, {resultado.rowcount} cargadas")
+        return resultado.rowcount or 0
+    finally:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
@@ -0,0 +1,70 @@
+from typing import Dict, Iterable, List, Optional
+
+
+class FiltroInvalidoError(ValueError):
+    """Un filtro, campo u orden pedido por el cliente no está en la lista permitida."""
+
+
+def seleccionar_columnas(
+    campos: Optional[List[str]],
+    disponibles: Dict[str, str],
+    obligatorias: Iterable[str] = (),
+) -> str:
+    """
+    Arma la lista del `SELECT` con los `campos` pedidos (todas las columnas si no se indican).
+
+    Args:
+        campos: Nombres pedidos por el cliente.
+        disponibles: Lista permitida: nombre en la respuesta -> expresión SQL.
+        obligatorias: Columnas que se seleccionan siempre (p. ej. las del cursor).
+
+    Raises:
+        FiltroInvalidoError: Si algún campo no está en `disponibles`.
+    """
+    if not campos:
+        nombres = list(disponibles)
+    else:
+        invalidos = [campo for campo in campos if campo not in disponibles]
+        if invalidos:
+            raise FiltroInvalidoError(
+                f"Campos no permitidos: {', '.join(invalidos)}. Permitidos: {', '.join(disponibles)}"
+            )
+        nombres = list(dict.fromkeys([*campos, *obligatorias]))
+
+    columnas = []
+    for nombre in nombres:
+        expresion = disponibles[nombre]
+        columnas.append(expresion if expresion.split(".")[-1] == nombre else f"{expresion} AS {nombre}")
+    return ", ".join(columnas)
+
+
+def parsear_campos(fields: Optional[str]) -> Optional[List[str]]:
+    """Convierte `fields=a,b,c` en ["a", "b", "c"] (None si no se indicó)."""
+    if not fields:
+        return None
+    campos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+    return campos or None
+
+
+def parsear_rangos(rangos: Optional[List[str]]) -> Dict[str, tuple]:
+    """
+    Convierte parámetros `columna:minimo:maximo` en {columna: (minimo, maximo)}.
+    Cualquiera de los extremos puede omitirse (`num_aprendices_certificados::10`).
+
+    Raises:
+        FiltroInvalidoError: Si el formato no es válido o los extremos no son enteros.
+    """
+    resultado = {}
+    for rango in rangos or []:
+        partes = rango.split(":")
+        if len(partes) != 3 or not partes[0]:
+            raise FiltroInvalidoError(f"Rango inválido '{rango}': use columna:minimo:maximo")
+        columna, minimo, maximo = partes
+        try:
+            resultado[columna] = (
+                int(minimo) if minimo.strip() else None,
+                int(maximo) if maximo.strip() else None,
+            )
+        except ValueError:
+            raise FiltroInvalidoError(f"Rango inválido '{rango}': los extremos deben ser enteros")
+    return resultado
@@ -0,0 +1,187 @@
+import logging
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from openpyxl import load_workbook
+
+logger = logging.getLogger(__name__)
+
+# Número máximo de filas que se inspeccionan buscando el encabezado
+MAX_FILAS_BUSQUEDA_ENCABEZADO = 10
+
+# Filas que se leen y procesan juntas durante la carga por bloques
+TAMANO_BLOQUE_DEFECTO = 5000
+
+
+def normalizar_encabezado(valor: Any) -> str:
+    """Normaliza un encabezado para comparación: mayúsculas, sin espacios repetidos."""
+    if valor is None:
+        return ""
+    texto = " ".join(str(valor).strip().split())
+    return texto.upper()
+
+
+def _variantes(nombre: str) -> set:
+    """Variantes de un encabezado (exacta, sin espacios y con guión bajo)."""
+    nombre = normalizar_encabezado(nombre)
+    return {nombre, nombre.replace(" ", ""), nombre.replace(" ", "_")}
+
+
+def _celda_a_texto(valor: Any) -> Optional[str]:
+    """Convierte el valor de una celda a texto, igual que `pd.read_excel(dtype=str)`."""
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        return valor if valor.strip() != "" else None
+    return str(valor)
+
+
+def _desduplicar_columnas(columnas: List[str]) -> List[str]:
+    """Renombra encabezados repetidos como lo hace pandas (`COL`, `COL.1`, ...)."""
+    vistos: Dict[str, int] = {}
+    resultado = []
+    for idx, col in enumerate(columnas):
+        col = col if col else f"Unnamed: {idx}"
+        if col in vistos:
+            vistos[col] += 1
+            resultado.append(f"{col}.{vistos[col]}")
+        else:
+            vistos[col] = 0
+            resultado.append(col)
+    return resultado
+
+
+def detectar_fila_encabezado(
+    filas: Iterable[Tuple[Any, ...]],
+    alias_columnas: Iterable[str],
+    max_filas: int = MAX_FILAS_BUSQUEDA_ENCABEZADO,
+) -> Tuple[int, Tuple[Any, ...]]:
+    """
+    Busca entre las primeras `max_filas` filas la que más coincide con los alias conocidos.
+
+    Returns:
+        tuple: (índice de la fila de encabezado, valores de esa fila).
+        Si ninguna fila coincide se toma la primera fila no vacía.
+    """
+    alias = set()
+    for nombre in alias_columnas:
+        alias |= _variantes(nombre)
+
+    mejor_idx, mejor_fila, mejor_puntaje = -1, (), 0
+    primera_no_vacia = None
+    for idx, fila in enumerate(filas):
+        if idx >= max_filas:
+            break
+        if primera_no_vacia is None and any(v is not None for v in fila):
+            primera_no_vacia = (idx, fila)
+        puntaje = sum(1 for v in fila if v is not None and _variantes(v) & alias)
+        if puntaje > mejor_puntaje:
+            mejor_idx, mejor_fila, mejor_puntaje = idx, fila, puntaje
+
+    if mejor_puntaje == 0:
+        if primera_no_vacia is None:
+            return -1, ()
+        return primera_no_vacia
+    return mejor_idx, mejor_fila
+
+
+def iterar_bloques_excel(
+    fuente,
+    alias_columnas: Optional[Iterable[str]] = None,
+    tamano_bloque: int = TAMANO_BLOQUE_DEFECTO,
+    max_filas_busqueda: int = MAX_FILAS_BUSQUEDA_ENCABEZADO,
+) -> Iterator[pd.DataFrame]:
+    """
+    Recorre la primera hoja de un Excel en bloques de a lo sumo `tamano_bloque` filas.
+
+    El libro se abre una sola vez en modo `read_only` y las filas se leen con
+    `iter_rows`, por lo que la memoria usada depende del tamaño del bloque y no
+    del tamaño del archivo. Si se indican `alias_columnas`, la fila de encabezado
+    se detecta comparando las primeras filas con esos alias; en caso contrario se
+    usa la primera fila. Todas las celdas se devuelven como texto (equivalente a
+    `dtype=str`) y las filas completamente vacías se omiten.
+
+    Cada bloque conserva un índice global (0, 1, 2, ... a lo largo de todo el
+    archivo) y guarda en `attrs["fila_encabezado"]` el índice 0-based del encabezado.
+
+    Args:
+        fuente: Ruta, bytes envueltos en BytesIO u objeto tipo archivo con `seek`.
+        alias_columnas: Nombres de columna esperados (p. ej. las llaves de un mapeo).
+        tamano_bloque: Número máximo de filas por bloque.
+        max_filas_busqueda: Filas a inspeccionar buscando el encabezado.
+    """
+    if hasattr(fuente, "seek"):
+        fuente.seek(0)
+    wb = load_workbook(fuente, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        filas: Iterator[Tuple[Any, ...]] = ws.iter_rows(values_only=True)
+
+        # Guardar las primeras filas para poder seguir leyendo después del encabezado
+        primeras = []
+        for fila in filas:
+            primeras.append(fila)
+            if len(primeras) >= max_filas_busqueda:
+                break
+
+        if alias_columnas is not None:
+            idx_encabezado, encabezado = detectar_fila_encabezado(primeras, alias_columnas, max_filas_busqueda)
+        else:
+            idx_encabezado, encabezado = (0, primeras[0]) if primeras else (-1, ())
+
+        if idx_encabezado < 0:
+            return
+
+        # Conservar el texto original del encabezado (sin espacios repetidos)
+        columnas = _desduplicar_columnas(
+            [" ".join(str(c).strip().split()) if c is not None else "" for c in encabezado]
+        )
+        ancho = len(columnas)
+
+        def _bloque(datos: list, inicio: int) -> pd.DataFrame:
+            df = pd.DataFrame(datos, columns=columnas, dtype=object,
+                              index=pd.RangeIndex(inicio, inicio + len(datos)))
+            df.attrs["fila_encabezado"] = idx_encabezado
+            return df
+
+        datos = []
+        leidas = 0
+        for fila in chain(primeras[idx_encabezado + 1:], filas):
+            valores = [_celda_a_texto(v) for v in fila[:ancho]]
+            if not any(v is not None for v in valores):
+                continue
+            datos.append(valores + [None] * (ancho - len(valores)))
+            if len(datos) >= tamano_bloque:
+                yield _bloque(datos, leidas)
+                leidas += len(datos)
+                datos = []
+
+        if datos or leidas == 0:
+            # Un archivo sin filas de datos produce un único bloque vacío con las columnas
+            yield _bloque(datos, leidas)
+    finally:
+        wb.close()
+
+
+def leer_excel_con_encabezado(
+    fuente,
+    alias_columnas: Optional[Iterable[str]] = None,
+    max_filas_busqueda: int = MAX_FILAS_BUSQUEDA_ENCABEZADO,
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Lee completa la primera hoja de un Excel abriendo el libro una sola vez.
+
+    Para archivos grandes es preferible `iterar_bloques_excel`, que no carga
+    todas las filas en memoria.
+
+    Returns:
+        tuple: (DataFrame con los datos, índice 0-based de la fila de encabezado).
+    """
+    bloques = list(iterar_bloques_excel(fuente, alias_columnas, max_filas_busqueda=max_filas_busqueda))
+    if not bloques:
+        return pd.DataFrame(), -1
+    idx_encabezado = bloques[0].attrs["fila_encabezado"]
+    df = pd.concat(bloques) if len(bloques) > 1 else bloques[0]
+    logger.debug("Excel leído: encabezado en fila %s, %s registros", idx_encabezado, len(df))
+    return df, idx_encabezado
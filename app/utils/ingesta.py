@@ -0,0 +1,89 @@
+import logging
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+import pandas as pd
+
+from app.utils.excel import TAMANO_BLOQUE_DEFECTO, iterar_bloques_excel
+
+logger = logging.getLogger(__name__)
+
+
+class ArchivoInvalidoError(Exception):
+    """
+    Se lanza desde una función de procesamiento de bloque cuando el archivo no
+    puede cargarse (p. ej. falta una columna obligatoria). `resumen` es la
+    respuesta que se devuelve al cliente.
+    """
+
+    def __init__(self, resumen: dict):
+        super().__init__(resumen.get("mensaje", "Archivo inválido"))
+        self.resumen = resumen
+
+
+def acumular_resumen(total: dict, parcial: dict) -> dict:
+    """
+    Suma en `total` el resumen de un bloque: los contadores enteros se suman,
+    las listas se concatenan, `exitoso` se combina con AND y el resto de
+    valores se reemplaza por el último recibido.
+    """
+    for clave, valor in parcial.items():
+        if isinstance(valor, bool):
+            if clave == "exitoso":
+                total[clave] = total.get(clave, True) and valor
+            else:
+                total[clave] = valor
+        elif isinstance(valor, (int, float)) and isinstance(total.get(clave, 0), (int, float)):
+            total[clave] = total.get(clave, 0) + valor
+        elif isinstance(valor, list):
+            total.setdefault(clave, []).extend(valor)
+        elif isinstance(valor, dict) and isinstance(total.get(clave), dict):
+            acumular_resumen(total[clave], valor)
+        else:
+            total[clave] = valor
+    return total
+
+
+def procesar_excel_por_bloques(
+    fuente,
+    procesar_bloque: Callable[[pd.DataFrame], Dict],
+    alias_columnas: Optional[Iterable[str]] = None,
+    tamano_bloque: int = TAMANO_BLOQUE_DEFECTO,
+    progreso: Optional[Callable[[int, int, Dict], None]] = None,
+) -> Dict:
+    """
+    Lee un Excel por bloques y aplica `procesar_bloque` a cada uno antes de leer el siguiente.
+
+    `procesar_bloque` recibe el DataFrame del bloque (todas las celdas como texto,
+    índice global de fila) y debe normalizarlo, guardarlo en la base de datos y
+    devolver su resumen; los resúmenes se combinan con `acumular_resumen`.
+    Si se indica `progreso`, se llama tras cada bloque con
+    (filas leídas, bloques procesados, resumen acumulado).
+
+    Returns:
+        dict: Resumen acumulado más `filas_leidas`, `bloques_procesados` y
+        `tiempo_segundos`. Si `procesar_bloque` lanza `ArchivoInvalidoError`
+        se devuelve el resumen de la excepción.
+    """
+    inicio = time.perf_counter()
+    resumen: Dict = {}
+    filas_leidas = 0
+    bloques = 0
+
+    try:
+        for bloque in iterar_bloques_excel(fuente, alias_columnas, tamano_bloque):
+            bloques += 1
+            filas_leidas += len(bloque)
+            acumular_resumen(resumen, procesar_bloque(bloque))
+            logger.debug("Bloque %s procesado (%s filas leídas)", bloques, filas_leidas)
+            if progreso is not None:
+                progreso(filas_leidas, bloques, resumen)
+    except ArchivoInvalidoError as e:
+        return e.resumen
+
+    duracion = time.perf_counter() - inicio
+    logger.info("Carga por bloques: %s filas en %s bloques (%.2f s)", filas_leidas, bloques, duracion)
+    resumen["filas_leidas"] = filas_leidas
+    resumen["bloques_procesados"] = bloques
+    resumen["tiempo_segundos"] = round(duracion, 3)
+    return resumen
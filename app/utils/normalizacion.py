@@ -0,0 +1,143 @@
+import datetime
+import logging
+from typing import Any, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from dateutil import parser as dateutil_parser
+
+logger = logging.getLogger(__name__)
+
+# Formatos de fecha conocidos, en orden de prioridad (día primero, como en SOFIA)
+FORMATOS_FECHA = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%d/%m/%Y",
+    "%d-%m-%Y",
+    "%Y/%m/%d",
+    "%d.%m.%Y",
+    "%d/%m/%Y %H:%M:%S",
+    "%d %b %Y",
+    "%d %B %Y",
+)
+
+# Rango plausible de números de serie de Excel para fechas modernas (1954-2036)
+SERIAL_EXCEL_MIN = 20000
+SERIAL_EXCEL_MAX = 50000
+ORIGEN_EXCEL = "1899-12-30"
+
+# "1.234", "12,345,678": separadores de miles sin parte decimal
+_PATRON_MILES = r"^\d{1,3}(?:[.,]\d{3})+$"
+
+
+def _como_texto(serie: pd.Series) -> pd.Series:
+    """Convierte la serie a texto recortado; vacíos y nulos quedan como NA."""
+    texto = serie.astype("string").str.strip()
+    return texto.mask(texto == "")
+
+
+def _fecha_difusa(valor: str) -> Optional[datetime.date]:
+    """Último recurso para un texto de fecha: dateutil (tolerante) y luego pandas."""
+    try:
+        return dateutil_parser.parse(valor, dayfirst=True, fuzzy=True).date()
+    except (ValueError, OverflowError, TypeError):
+        pass
+    fecha = pd.to_datetime(valor, dayfirst=True, errors="coerce")
+    return None if pd.isna(fecha) else fecha.date()
+
+
+def normalizar_fechas(serie: pd.Series, formatos: Sequence[str] = FORMATOS_FECHA) -> pd.Series:
+    """
+    Convierte una columna completa a `datetime.date` (o None) sin recorrerla celda por celda.
+
+    Orden de resolución:
+        1. Valores que ya son fecha/datetime.
+        2. Números de serie de Excel (p. ej. "45000").
+        3. Cada formato de `formatos` con `pd.to_datetime(format=...)` sobre las celdas pendientes.
+        4. Las celdas que quedan se envían al parser tolerante, una vez por valor distinto.
+
+    Returns:
+        pd.Series: dtype object con `datetime.date` o None, mismo índice que `serie`.
+    """
+    resultado = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    if serie.empty:
+        return pd.Series([], index=serie.index, dtype=object)
+
+    # 1. Objetos fecha ya tipados (celdas de Excel leídas como datetime)
+    es_fecha = serie.map(lambda v: isinstance(v, (datetime.date, pd.Timestamp)))
+    if es_fecha.any():
+        resultado[es_fecha] = pd.to_datetime(serie[es_fecha], errors="coerce")
+
+    texto = _como_texto(serie.where(~es_fecha))
+    pendientes = texto.notna().astype(bool)
+
+    # 2. Números de serie de Excel
+    es_numero = texto.str.fullmatch(r"\d+(?:\.\d+)?", na=False).astype(bool)
+    numeros = pd.to_numeric(texto.where(es_numero).astype(object), errors="coerce").astype("float64")
+    es_serial = numeros.between(SERIAL_EXCEL_MIN, SERIAL_EXCEL_MAX)
+    if es_serial.any():
+        resultado[es_serial] = pd.to_datetime(numeros[es_serial].astype(int), unit="D", origin=ORIGEN_EXCEL)
+        pendientes &= ~es_serial
+
+    # 3. Formatos conocidos sobre la columna completa
+    for formato in formatos:
+        if not pendientes.any():
+            break
+        convertidas = pd.to_datetime(texto[pendientes], format=formato, errors="coerce")
+        validas = convertidas.notna().astype(bool)
+        if validas.any():
+            indices = validas[validas].index
+            resultado[indices] = convertidas[indices]
+            pendientes[indices] = False
+
+    # 4. Parser tolerante solo para los valores distintos que quedan
+    fechas = resultado.dt.date.astype(object).where(resultado.notna(), None)
+    if pendientes.any():
+        restantes = texto[pendientes]
+        cache = {valor: _fecha_difusa(valor) for valor in restantes.unique()}
+        fechas[restantes.index] = restantes.map(cache).astype(object)
+        logger.debug("Fechas resueltas con parser tolerante: %s de %s", len(restantes), len(serie))
+
+    return fechas.where(fechas.notna(), None)
+
+
+def normalizar_enteros(serie: pd.Series, extraer_digitos: bool = False) -> pd.Series:
+    """
+    Convierte una columna completa a enteros (`Int64`, con NA para lo no convertible).
+
+    Reconoce separadores de miles ("1.234", "12,345") y decimales exactos de
+    Excel ("24.0"). Con `extraer_digitos=True` los textos restantes se reducen
+    a sus dígitos ("FICHA-123" -> 123), como hacía `_to_int_safe`.
+    """
+    if serie.empty:
+        return pd.Series([], index=serie.index, dtype="Int64")
+
+    texto = _como_texto(serie)
+
+    # Separadores de miles: quitar puntos/comas antes de convertir
+    es_miles = texto.str.fullmatch(_PATRON_MILES, na=False)
+    texto = texto.mask(es_miles, texto.str.replace(r"[.,]", "", regex=True))
+
+    numeros = pd.to_numeric(texto.astype(object), errors="coerce").astype("float64")
+
+    if extraer_digitos:
+        pendientes = numeros.isna() & texto.notna()
+        if pendientes.any():
+            digitos = texto[pendientes].str.replace(r"\D", "", regex=True)
+            numeros[pendientes] = pd.to_numeric(digitos.mask(digitos == "").astype(object), errors="coerce")
+
+    # Truncar hacia cero (como int()) y descartar infinitos o valores fuera de rango
+    numeros = np.trunc(numeros.where(numeros.abs() < 2 ** 63))
+    return numeros.astype("Int64")
+
+
+def a_valor_python(valor: Any) -> Any:
+    """Convierte NA/NaT/NaN de pandas a None y deja el resto intacto."""
+    if valor is None:
+        return None
+    try:
+        if pd.isna(valor):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return valor
@@ -0,0 +1,76 @@
+import base64
+import binascii
+import json
+from typing import Any, Dict, Optional
+
+
+class CursorInvalidoError(ValueError):
+    """El cursor recibido no se pudo decodificar o no corresponde al endpoint."""
+
+
+def codificar_cursor(valores: Dict[str, Any]) -> str:
+    """Codifica la posición de la última fila devuelta como un texto opaco (base64 URL-safe)."""
+    crudo = json.dumps(valores, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: Optional[str], claves=()) -> Optional[Dict[str, Any]]:
+    """
+    Decodifica un cursor generado por `codificar_cursor`.
+
+    Args:
+        cursor: Texto recibido del cliente (None o vacío = primera página).
+        claves: Claves que el cursor debe contener.
+
+    Raises:
+        CursorInvalidoError: Si el cursor está mal formado o le faltan claves.
+    """
+    if not cursor:
+        return None
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (binascii.Error, ValueError, UnicodeDecodeError) as e:
+        raise CursorInvalidoError("Cursor inválido") from e
+    if not isinstance(valores, dict) or any(clave not in valores for clave in claves):
+        raise CursorInvalidoError("Cursor inválido")
+    return valores
+
+
+def condicion_keyset(
+    columna: str,
+    valor: Any,
+    columna_id: str,
+    valor_id: Any,
+    descendente: bool = False,
+    prefijo: str = "cursor",
+):
+    """
+    Construye la condición `WHERE` que continúa un recorrido ordenado por
+    (`columna`, `columna_id`) a partir de la última fila devuelta.
+
+    Respeta el orden de NULL de MySQL (primero en ASC, al final en DESC).
+
+    Returns:
+        tuple: (fragmento SQL, parámetros)
+    """
+    p_valor, p_id = f"{prefijo}_valor", f"{prefijo}_id"
+    parametros = {p_valor: valor, p_id: valor_id}
+    if columna == columna_id:
+        operador = "<" if descendente else ">"
+        return f"{columna_id} {operador} :{p_id}", {p_id: valor_id}
+
+    if not descendente:
+        if valor is None:
+            sql = f"(({columna} IS NULL AND {columna_id} > :{p_id}) OR {columna} IS NOT NULL)"
+        else:
+            sql = f"({columna} > :{p_valor} OR ({columna} = :{p_valor} AND {columna_id} > :{p_id}))"
+    else:
+        if valor is None:
+            sql = f"({columna} IS NULL AND {columna_id} < :{p_id})"
+        else:
+            sql = (
+                f"({columna} < :{p_valor} OR ({columna} = :{p_valor} AND {columna_id} < :{p_id})"
+                f" OR {columna} IS NULL)"
+            )
+    return sql, {nombre: v for nombre, v in parametros.items() if f":{nombre}" in sql}
@@ -0,0 +1,221 @@
+"""
+Escritura de XLSX en streaming.
+
+`pd.ExcelWriter`/openpyxl arman el libro completo en memoria (o en un archivo
+temporal en modo write-only) y solo al final lo comprimen, así que el primer
+byte sale cuando todo el reporte ya está construido. Aquí cada hoja se escribe
+como una entrada del zip mientras llegan las filas y los bytes comprimidos se
+entregan por bloques: la memoria no depende del número de filas.
+"""
+import math
+import numbers
+import re
+import zipfile
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+# Filas que se escriben antes de entregar los bytes acumulados al cliente
+FILAS_POR_BLOQUE = 500
+
+MEDIA_TYPE_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+MEDIA_TYPE_ZIP = "application/zip"
+
+# Índices de estilo de xl/styles.xml
+_ESTILO_FECHA = 1
+_ESTILO_FECHA_HORA = 2
+
+_EPOCH_EXCEL = datetime(1899, 12, 30)
+_CARACTERES_INVALIDOS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_NOMBRE_HOJA_INVALIDO = re.compile(r"[\[\]\:\*\?\/\\]")
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+{hojas}
+</Types>"""
+
+_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="4">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>
+</cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+_ESTILO_ENCABEZADO = 3
+
+_INICIO_HOJA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetData>'
+)
+_FIN_HOJA = "</sheetData></worksheet>"
+
+
+class _SalidaPorBloques:
+    """Destino del zip sin `seek`/`tell`: zipfile escribe en modo streaming (data descriptors)."""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+
+    def write(self, datos: bytes) -> int:
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self) -> None:
+        pass
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def _celda(valor: Any, estilo: Optional[int] = None) -> str:
+    """XML de una celda (sin referencia `r`, que es opcional)."""
+    # `valor != valor` cubre NaN, Decimal('NaN') y pd.NaT
+    if valor is None or valor != valor:
+        return "<c/>"
+    atributo_estilo = f' s="{estilo}"' if estilo is not None else ""
+    if isinstance(valor, bool):
+        return f'<c t="b"{atributo_estilo}><v>{int(valor)}</v></c>'
+    if isinstance(valor, (numbers.Real, Decimal)) and math.isfinite(valor):
+        return f"<c{atributo_estilo}><v>{valor}</v></c>"
+    if isinstance(valor, datetime):
+        serial = (valor.replace(tzinfo=None) - _EPOCH_EXCEL).total_seconds() / 86400
+        return f'<c s="{_ESTILO_FECHA_HORA}"><v>{serial}</v></c>'
+    if isinstance(valor, date):
+        return f'<c s="{_ESTILO_FECHA}"><v>{(valor - _EPOCH_EXCEL.date()).days}</v></c>'
+    if isinstance(valor, time):
+        valor = valor.isoformat()
+    texto = escape(_CARACTERES_INVALIDOS.sub("", str(valor)))
+    return f'<c t="inlineStr"{atributo_estilo}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila(valores: Iterable[Any], estilo: Optional[int] = None) -> str:
+    return "<row>" + "".join(_celda(valor, estilo) for valor in valores) + "</row>"
+
+
+def nombre_hoja(nombre: str, usados: Optional[set] = None) -> str:
+    """Nombre de hoja válido para Excel: sin `[]:*?/\\`, máximo 31 caracteres y único en `usados`."""
+    base = _NOMBRE_HOJA_INVALIDO.sub("_", str(nombre)).strip("'") or "Hoja"
+    base = base[:31]
+    if usados is None:
+        return base
+    candidato, sufijo = base, 2
+    while candidato.lower() in usados:
+        marca = f" ({sufijo})"
+        candidato = base[:31 - len(marca)] + marca
+        sufijo += 1
+    usados.add(candidato.lower())
+    return candidato
+
+
+def xlsx_en_streaming(
+    hojas: Iterable[Tuple[str, Sequence[str], Iterable[Sequence[Any]]]],
+    filas_por_bloque: int = FILAS_POR_BLOQUE,
+) -> Iterator[bytes]:
+    """
+    Genera un libro XLSX por bloques de bytes, listo para un `StreamingResponse`.
+
+    Args:
+        hojas: Iterable de (nombre, encabezados, filas); cada fila es una secuencia
+            de valores en el orden de los encabezados. Tanto las hojas como las
+            filas pueden ser generadores: se consumen una sola vez, a medida que
+            se escriben.
+        filas_por_bloque: Filas que se escriben entre cada entrega de bytes.
+    """
+    salida = _SalidaPorBloques()
+    nombres: List[str] = []
+    usados: set = set()
+
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_DEFLATED) as libro:
+        for nombre, encabezados, filas in hojas:
+            nombres.append(nombre_hoja(nombre, usados))
+            with libro.open(f"xl/worksheets/sheet{len(nombres)}.xml", "w", force_zip64=True) as hoja:
+                hoja.write(_INICIO_HOJA.encode())
+                hoja.write(_fila(encabezados, _ESTILO_ENCABEZADO).encode())
+                pendientes = []
+                for fila in filas:
+                    pendientes.append(_fila(fila))
+                    if len(pendientes) >= filas_por_bloque:
+                        hoja.write("".join(pendientes).encode())
+                        pendientes.clear()
+                        datos = salida.vaciar()
+                        if datos:
+                            yield datos
+                hoja.write(("".join(pendientes) + _FIN_HOJA).encode())
+            yield salida.vaciar()
+
+        if not nombres:
+            # Un libro sin hojas no abre en Excel
+            nombres.append("Hoja1")
+            libro.writestr("xl/worksheets/sheet1.xml", _INICIO_HOJA + _FIN_HOJA)
+
+        # Las partes que enumeran las hojas se escriben al final, cuando ya se conocen
+        libro.writestr("[Content_Types].xml", _CONTENT_TYPES.format(hojas="\n".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, len(nombres) + 1)
+        )))
+        libro.writestr("_rels/.rels", _RELS)
+        libro.writestr("xl/styles.xml", _STYLES)
+        libro.writestr("xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + "".join(
+                f'<sheet name="{escape(nombre, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+                for i, nombre in enumerate(nombres, start=1)
+            )
+            + "</sheets></workbook>"
+        ))
+        libro.writestr("xl/_rels/workbook.xml.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(
+                f'<Relationship Id="rId{i}" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                f'Target="worksheets/sheet{i}.xml"/>'
+                for i in range(1, len(nombres) + 1)
+            )
+            + f'<Relationship Id="rId{len(nombres) + 1}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+            "</Relationships>"
+        ))
+    yield salida.vaciar()
+
+
+def zip_en_streaming(archivos: Iterable[Tuple[str, Iterable[bytes]]]) -> Iterator[bytes]:
+    """
+    Genera un ZIP por bloques de bytes con los `archivos` (nombre, bloques de
+    contenido), p. ej. varios libros de `xlsx_en_streaming`. Las entradas se
+    guardan sin volver a comprimir: un XLSX ya es un zip comprimido.
+    """
+    salida = _SalidaPorBloques()
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_STORED) as paquete:
+        for nombre, bloques in archivos:
+            with paquete.open(nombre, "w", force_zip64=True) as destino:
+                for bloque in bloques:
+                    destino.write(bloque)
+                    datos = salida.vaciar()
+                    if datos:
+                        yield datos
+            yield salida.vaciar()
+    yield salida.vaciar()
@@ -0,0 +1,95 @@
+"""
+Compara el tiempo de lectura del Excel de histórico: enfoque anterior
+(`pd.read_excel` repetido por cada opción de `skiprows`) contra el lector de
+una sola pasada `leer_excel_con_encabezado`.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.lectura_historico ruta/al/archivo.xlsx
+    python -m benchmarks.lectura_historico --filas 50000   # genera un libro sintético
+"""
+import argparse
+import os
+import tempfile
+import time
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import Workbook
+
+from app.router.cargar_archivos_historico import COLUMNAS_MAPEO_HISTORICO
+from app.utils.excel import leer_excel_con_encabezado
+
+ENCABEZADO_SOFIA = [
+    "CODIGO_REGIONAL", "NOMBRE_REGIONAL", "CODIGO_CENTRO", "NOMBRE_CENTRO", "DATOS",
+    "CODIGO_PROGRAMA_FORMACION", "VERSION", "TIPO_PROGRAMA", "NIVEL", "JORNADA",
+    "ID_MUNICIPIO", "MUNICIPIO", "FIC_MC", "MODALIDAD", "FICHA", "FECHA_INICIO",
+    "FECHA_FIN", "MESES_DURACION", "ESTADO", "CODIGO_ESTADO", "NOMBRE_ESTADO",
+    "INSCRITOS", "MATRICULADOS", "EN_TRAINING", "FORMACION", "INDUCCION",
+    "CONDICIONADOS", "APLAZADOS", "RETIRO", "CANCELADOS", "REPROBADOS",
+    "NO_APROBADOS", "REINGRESO", "POR_CERTIFICAR", "CERTIFICADOS", "TRASLADOS",
+]
+
+
+def generar_libro(filas: int, filas_titulo: int = 2) -> str:
+    """Genera un libro tipo SOFIA con `filas_titulo` filas de título antes del encabezado."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for i in range(filas_titulo):
+        ws.append([f"REPORTE DE FICHAS - título {i + 1}"])
+    ws.append(ENCABEZADO_SOFIA)
+    for i in range(filas):
+        ws.append([
+            66, "REGIONAL RISARALDA", 9121, "CENTRO", "DATOS", "228106", 1, "TITULADA",
+            "TECNÓLOGO", "DIURNA", "66001", "PEREIRA", "CE", "PRESENCIAL", 2000000 + i,
+            "2024-01-15", "2025-06-30", 24, "EN EJECUCION", 1, "ACTIVO",
+        ] + [i % 30] * 15)
+    fd, ruta = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    wb.save(ruta)
+    return ruta
+
+
+def lectura_anterior(contents: bytes) -> pd.DataFrame:
+    """Reproduce el enfoque previo del endpoint (varias lecturas completas)."""
+    for skip_rows in [0, 1, 2, 3, 4, 5]:
+        df_test = pd.read_excel(BytesIO(contents), engine="openpyxl", skiprows=skip_rows, nrows=0)
+        if len(df_test.columns) > 0:
+            return pd.read_excel(BytesIO(contents), engine="openpyxl", skiprows=skip_rows, dtype=str)
+    return pd.read_excel(BytesIO(contents), engine="openpyxl", dtype=str)
+
+
+def medir(nombre: str, funcion, contents: bytes):
+    inicio = time.perf_counter()
+    resultado = funcion(contents)
+    duracion = time.perf_counter() - inicio
+    print(f"{nombre:<28} {duracion:8.2f} s")
+    return duracion, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archivo", nargs="?", help="Excel de histórico a leer")
+    parser.add_argument("--filas", type=int, default=20000, help="Filas del libro sintético")
+    args = parser.parse_args()
+
+    ruta = args.archivo or generar_libro(args.filas)
+    with open(ruta, "rb") as f:
+        contents = f.read()
+    print(f"Archivo: {ruta} ({len(contents) / 1024 / 1024:.1f} MB)")
+
+    t_anterior, _ = medir("Lectura anterior", lectura_anterior, contents)
+    t_nueva, (df, fila) = medir(
+        "Lectura en una pasada",
+        lambda c: leer_excel_con_encabezado(BytesIO(c), COLUMNAS_MAPEO_HISTORICO.keys()),
+        contents,
+    )
+    print(f"Encabezado detectado en la fila {fila + 1}, {len(df)} registros")
+    if t_nueva > 0:
+        print(f"Aceleración: {t_anterior / t_nueva:.1f}x")
+
+    if not args.archivo:
+        os.remove(ruta)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compara la normalización celda por celda (`_parse_date` / `_to_int_safe`) con
+la normalización por columna de `app.utils.normalizacion`, en filas por segundo.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.normalizacion --filas 100000
+"""
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from app.crud.cargar_archivos import _parse_date, _to_int_safe
+from app.utils.normalizacion import normalizar_enteros, normalizar_fechas
+
+# Mezcla representativa de lo que llega en los Excel de SOFIA y del catálogo
+MUESTRAS_FECHA = [
+    "2024-01-15 00:00:00", "2023-11-30", "15/01/2024", "30-06-2025", "45123",
+    "2024/02/29", "01.03.2022", "", None, "sin fecha",
+]
+MUESTRAS_ENTERO = ["2501234", "1.234", "12,345", "24.0", "  17 ", "", None, "FICHA-99", "n/a"]
+
+
+def generar_datos(filas: int, semilla: int = 7) -> pd.DataFrame:
+    aleatorio = random.Random(semilla)
+    return pd.DataFrame({
+        "fecha": [aleatorio.choice(MUESTRAS_FECHA) for _ in range(filas)],
+        "entero": [aleatorio.choice(MUESTRAS_ENTERO) for _ in range(filas)],
+    })
+
+
+def por_celda(df: pd.DataFrame):
+    return [_parse_date(v) for v in df["fecha"]], [_to_int_safe(v) for v in df["entero"]]
+
+
+def por_columna(df: pd.DataFrame):
+    return normalizar_fechas(df["fecha"]), normalizar_enteros(df["entero"], extraer_digitos=True)
+
+
+def medir(nombre: str, funcion, df: pd.DataFrame) -> float:
+    inicio = time.perf_counter()
+    funcion(df)
+    duracion = time.perf_counter() - inicio
+    print(f"{nombre:<24} {duracion:8.2f} s  {len(df) / duracion:12,.0f} filas/s")
+    return duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=100000, help="Filas sintéticas a normalizar")
+    args = parser.parse_args()
+
+    df = generar_datos(args.filas)
+    print(f"{args.filas} filas (1 columna de fecha + 1 de enteros)")
+    t_celda = medir("Celda por celda", por_celda, df)
+    t_columna = medir("Por columna", por_columna, df)
+    if t_columna > 0:
+        print(f"Aceleración: {t_celda / t_columna:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compara la latencia de la página 1 contra la página N de `/historico/obtener-todos`:
+paginación por OFFSET (`get_all_historicos`) frente a paginación por cursor
+(`get_historicos_pagina`).
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.paginacion_historico                     # BD configurada en .env
+    python -m benchmarks.paginacion_historico --sintetico 500000  # SQLite en memoria
+"""
+import argparse
+import time
+
+from sqlalchemy import text
+
+from app.crud.historico import get_all_historicos, get_historicos_pagina
+from tests.bd_sintetica import crear_bd_sintetica
+
+def medir(funcion, repeticiones: int) -> float:
+    """Mejor tiempo (ms) de `repeticiones` ejecuciones."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limite", type=int, default=1000, help="Filas por página")
+    parser.add_argument("--pagina", type=int, default=100, help="Página profunda a comparar con la primera")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--sintetico", type=int, default=0, help="Filas de una BD SQLite en memoria (0 = usar la BD configurada)")
+    args = parser.parse_args()
+
+    if args.sintetico:
+        db = crear_bd_sintetica(args.sintetico)
+    else:
+        from core.database import SessionLocal
+        db = SessionLocal()
+
+    try:
+        offset = (args.pagina - 1) * args.limite
+        # Cursor de la página N: id_historico de la última fila de la página N-1
+        despues_de = db.execute(
+            text("SELECT id_historico FROM historico ORDER BY id_historico LIMIT 1 OFFSET :offset"),
+            {"offset": offset - 1},
+        ).scalar() if offset else None
+
+        print(f"Páginas de {args.limite} filas; página 1 contra página {args.pagina}")
+        for nombre, pagina_1, pagina_n in (
+            ("OFFSET",
+             lambda: get_all_historicos(db, skip=0, limit=args.limite),
+             lambda: get_all_historicos(db, skip=offset, limit=args.limite)),
+            ("Cursor",
+             lambda: get_historicos_pagina(db, None, args.limite),
+             lambda: get_historicos_pagina(db, despues_de, args.limite)),
+        ):
+            t1 = medir(pagina_1, args.repeticiones)
+            tn = medir(pagina_n, args.repeticiones)
+            print(f"{nombre:<8} página 1: {t1:8.1f} ms   página {args.pagina}: {tn:8.1f} ms   ({tn / t1:5.1f}x)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
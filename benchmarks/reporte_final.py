@@ -0,0 +1,272 @@
+"""
+Compara el constructor anterior del reporte final (`iter_unified_rows`: cuatro
+consultas unidas en Python, en serie o en paralelo) con la consulta única
+`SQL_REPORTE_FINAL` (`iter_reporte_final`): tiempo hasta consumir todas las
+filas y filas generadas.
+
+En SQLite en memoria todas las consultas comparten una conexión, así que el
+paralelismo solo se aprecia contra la BD configurada (MySQL).
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.reporte_final                       # BD configurada en .env
+    python -m benchmarks.reporte_final --sintetico 20000     # SQLite en memoria
+"""
+import argparse
+import random
+from typing import Any, Dict, Iterator
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.crud.reporte_final import _fila_alerta, iter_reporte_final
+from benchmarks.paginacion_historico import medir
+from core.consultas_paralelas import ejecutar_consultas
+
+
+def crear_bd_sintetica(programas: int, grupos_por_programa: int = 5, normas_por_programa: int = 3,
+                       semilla: int = 7) -> Session:
+    """Crea en SQLite las tablas del reporte con `programas` programas de formación."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+    @event.listens_for(engine, "connect")
+    def _concat(conexion, _):
+        # CONCAT existe en MySQL pero no en el SQLite de Python
+        conexion.create_function("CONCAT", -1, lambda *partes: "".join("" if p is None else str(p) for p in partes))
+
+    aleatorio = random.Random(semilla)
+    centros = [9100 + i for i in range(40)]
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE programas_formacion (cod_programa TEXT, cod_version TEXT, PRF_version INTEGER, "
+            "tipo_formacion TEXT, nombre_programa TEXT, nivel_formacion TEXT, duracion_maxima INTEGER, "
+            "resolucion TEXT, fecha_resolucion DATE, modalidad TEXT, apuestas_prioritarias TEXT, red_conocimiento TEXT)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE registro_calificado (cod_programa TEXT, tipo_tramite TEXT, numero_resolucion INTEGER, fecha_resolucion DATE)"
+        ))
+        conn.execute(text("CREATE TABLE estado_de_normas (cod_programa TEXT, nombre_ncl TEXT, version TEXT)"))
+        conn.execute(text(
+            "CREATE TABLE grupos (ficha INTEGER PRIMARY KEY, cod_programa TEXT, cupo_asignado INTEGER, fecha_inicio DATE, "
+            "fecha_fin DATE, jornada TEXT, cod_municipio TEXT, cod_centro INTEGER)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE historico (id_historico INTEGER PRIMARY KEY, id_grupo INTEGER, num_aprendices_inscritos INTEGER, "
+            "num_aprendices_en_transito INTEGER, num_aprendices_certificados INTEGER)"
+        ))
+        conn.execute(text("CREATE TABLE centros_formacion (cod_centro INTEGER PRIMARY KEY, nombre_centro TEXT, nombre_regional TEXT)"))
+
+        conn.execute(
+            text("INSERT INTO centros_formacion VALUES (:cod, :nombre, :regional)"),
+            [{"cod": c, "nombre": f"CENTRO {c}", "regional": f"REGIONAL {c % 10}"} for c in centros],
+        )
+        codigos = [str(200000 + i) for i in range(programas)]
+        conn.execute(
+            text("INSERT INTO programas_formacion VALUES (:cod, '1', 1, 'TITULADA', :nombre, 'TECNÓLOGO', 2640, "
+                 "'', '2023-05-10', 'PRESENCIAL', '', 'INFORMÁTICA')"),
+            [{"cod": cod, "nombre": f"PROGRAMA {cod}"} for cod in codigos],
+        )
+        conn.execute(
+            text("INSERT INTO registro_calificado VALUES (:cod, :tramite, :num, :fecha)"),
+            [{"cod": cod, "tramite": tramite, "num": aleatorio.randint(1000, 9999), "fecha": fecha}
+             for cod in codigos for tramite, fecha in (("OTORGAMIENTO", "2018-03-01"), ("RENOVACIÓN", "2024-03-01"))],
+        )
+        conn.execute(
+            text("INSERT INTO estado_de_normas VALUES (:cod, :ncl, '1')"),
+            [{"cod": cod, "ncl": f"NCL {cod}-{n}"} for cod in codigos for n in range(normas_por_programa)],
+        )
+        fichas = [
+            {"ficha": ficha, "cod": cod, "cupo": 30, "jornada": aleatorio.choice(["DIURNA", "NOCTURNA", "MIXTA"]),
+             "municipio": str(66000 + aleatorio.randint(1, 20)), "centro": aleatorio.choice(centros)}
+            for ficha, cod in enumerate((cod for cod in codigos for _ in range(grupos_por_programa)), start=1)
+        ]
+        conn.execute(
+            text("INSERT INTO grupos VALUES (:ficha, :cod, :cupo, '2024-02-01', '2025-12-01', :jornada, :municipio, :centro)"),
+            fichas,
+        )
+        conn.execute(
+            text("INSERT INTO historico (id_grupo, num_aprendices_inscritos, num_aprendices_en_transito, "
+                 "num_aprendices_certificados) VALUES (:ficha, :inscritos, 2, :certificados)"),
+            [{"ficha": f["ficha"], "inscritos": 25, "certificados": aleatorio.randint(0, 12)} for f in fichas],
+        )
+    return Session(engine)
+
+
+def iter_unified_rows(db, paralelo: bool = True) -> Iterator[Dict[str, Any]]:
+    """Genera las filas del reporte final una a una (ver COLUMNAS_REPORTE_FINAL).
+
+    Tablas usadas: `programas_formacion`, `registro_calificado`, `estado_de_normas`,
+    `grupos`, `historico`, `centros_formacion`. Las cuatro consultas (programas y
+    las agregaciones por programa) se ejecutan a la vez con `ejecutar_consultas`,
+    cada una en su conexión (`paralelo=False` las ejecuta en orden sobre la sesión).
+    Las filas de alerta (certificados > 30%) se emiten al final.
+
+    Constructor anterior a `iter_reporte_final` (cuatro consultas unidas en
+    Python); se conserva aquí solo como referencia para la comparación.
+    """
+    # Consulta base de programas con datos de registro y normas
+    sql_programas = text("""
+        SELECT p.cod_programa, p.cod_version, p.PRF_version, p.tipo_formacion, p.nombre_programa,
+            p.nivel_formacion, p.duracion_maxima, p.resolucion, p.fecha_resolucion as prf_fecha_resolucion,
+            p.modalidad, p.apuestas_prioritarias, p.red_conocimiento,
+            r.tipo_tramite AS registro_tipo_tramite,
+            r.numero_resolucion AS registro_num_resolucion,
+            r.fecha_resolucion AS registro_fecha_resolucion,
+            e.nombre_ncl AS norma_nombre_ncl, e.version AS norma_version
+        FROM programas_formacion p
+        LEFT JOIN registro_calificado r ON p.cod_programa = r.cod_programa
+        LEFT JOIN estado_de_normas e ON p.cod_programa = e.cod_programa
+    """)
+
+    # Agregaciones por programa desde grupos
+    sql_grupos = text("""
+        SELECT cod_programa,
+            COUNT(*) AS grupos_count,
+            SUM(COALESCE(cupo_asignado,0)) AS cupos_sum,
+            MIN(fecha_inicio) AS primera_fecha_inicio,
+            MAX(fecha_fin) AS ultima_fecha_fin,
+            GROUP_CONCAT(DISTINCT jornada) AS jornadas,
+            GROUP_CONCAT(DISTINCT cod_municipio) AS municipios,
+            GROUP_CONCAT(DISTINCT cod_centro) AS cod_centros
+        FROM grupos
+        GROUP BY cod_programa
+    """)
+
+    # Agregación historico por programa (uniendo por grupo -> programa)
+    sql_historico = text("""
+        SELECT g.cod_programa,
+            SUM(COALESCE(h.num_aprendices_inscritos,0)) AS inscritos_sum,
+            SUM(COALESCE(h.num_aprendices_en_transito,0)) AS inscritos_segunda,
+            SUM(COALESCE(h.num_aprendices_certificados,0)) AS certificados_sum
+        FROM historico h
+        JOIN grupos g ON g.ficha = h.id_grupo
+        GROUP BY g.cod_programa
+    """)
+
+    # Mapa rápido de centros_formacion por codigo (para nombre y regional)
+    sql_centros = text("SELECT cod_centro, nombre_centro, nombre_regional FROM centros_formacion")
+
+    # Las cuatro consultas son independientes: cada una en su propia conexión
+    resultados = ejecutar_consultas(
+        db.get_bind() if paralelo else db.connection(),
+        {
+            "programas": sql_programas,
+            "grupos": sql_grupos,
+            "historico": sql_historico,
+            "centros": sql_centros,
+        },
+        paralelo=paralelo,
+    )
+    grupos_map = {r['cod_programa']: r for r in resultados["grupos"]}
+    historico_map = {r['cod_programa']: r for r in resultados["historico"]}
+    centros_map = {str(r['cod_centro']): r for r in resultados["centros"]}
+    programas_rows = resultados["programas"]
+
+    alert_rows = []
+    for p in programas_rows:
+        cod = p.get('cod_programa')
+        g = grupos_map.get(cod, {})
+        h = historico_map.get(cod, {})
+
+        # Tomar primer centro si existe (lista en cod_centros separada por commas)
+        centro_codigo = None
+        if g and g.get('cod_centros'):
+            centro_codigo = str(g['cod_centros']).split(',')[0]
+
+        centro_info = centros_map.get(centro_codigo) if centro_codigo else None
+
+        fila = {
+            'OFERTA': p.get('tipo_formacion') or '',
+            'CÓDIGO CENTRO': centro_codigo or '',
+            'CENTRO DE FORMACIÓN': centro_info.get('nombre_centro') if centro_info else '',
+            'DENOMINACIÓN': p.get('nombre_programa') or '',
+            'TIPO OFERTA': p.get('tipo_formacion') or '',
+            'NIVEL': p.get('nivel_formacion') or '',
+            '1. DENOMINACIÓN DE LA FORMACIÓN': p.get('nombre_programa') or '',
+            '2. MODALIDAD': p.get('modalidad') or '',
+            '3. CÓDIGO PROGRAMA': p.get('cod_programa') or '',
+            '4. VERSIÓN DEL PROGRAMA': p.get('cod_version') or p.get('PRF_version') or '',
+            'CÓDIGO-VERSIÓN': f"{p.get('cod_programa','')}-{p.get('cod_version','')}",
+            'NOMBRE DENOMINACIÓN DEL PROGRAMA EN EL CATALOGO': p.get('nombre_programa') or '',
+            'VALIDACIÓN': p.get('registro_tipo_tramite') or '',
+            'RESOLUCIÓN': p.get('resolucion') or p.get('registro_num_resolucion') or '',
+            'FECHA DE RESOLUCIÓN': p.get('prf_fecha_resolucion') or p.get('registro_fecha_resolucion') or None,
+            'CODIGO SNIES': '',
+            '5. NO. RESOLUCIÓN, FECHA Y CÓDIGO SNIES': '',
+            'ACTA COMITÉ PRIMARIO CENTRO DE FORMACION': '',
+            '6. JUSTIFICACIÓN DE LA OFERTA EDUCATIVA': '',
+            '7. GRUPOS': int(g.get('grupos_count') or 0),
+            '8. CUPOS': int(g.get('cupos_sum') or 0),
+            'DURACIÓN DEL PROGRAMA HORAS': p.get('duracion_maxima') or '',
+            'DURACIÓN EN CATALOGO  22/04/2024': p.get('duracion_maxima') or '',
+            'VALIDACIÓN COMPARACIÓN CON CATALOGO  22/04/2024': '',
+            '9. DURACIÓN DEL PROGRAMA (MESES)': '',
+            '10. MUNICIPIO': g.get('municipios') if g else '',
+            '11. SEDE': centro_info.get('nombre_centro') if centro_info else '',
+            'CÓDIGO INDICATIVA': '',
+            'HORARIO FORMACIÓN': g.get('jornadas') if g else '',
+            'Jornada': g.get('jornadas') if g else '',
+            'Apuesta prioritaria': p.get('apuestas_prioritarias') or '',
+            'ESTRATEGIA': '',
+            'FECHA INICIO': g.get('primera_fecha_inicio') if g else None,
+            'FECHA FINALIZACIÓN': g.get('ultima_fecha_fin') if g else None,
+            'ESTADO EN ACTA': '',
+            'ESTADO EN SOFIA PLUS': '',
+            'CONCEPTO GRUPO': '',
+            'COORDINACIÓN DE FPI (REGIONAL)': centro_info.get('nombre_regional') if centro_info else '',
+            'INSCRITOS PRIMERA OPCIÓN': int(h.get('inscritos_sum') or 0),
+            'INSCRITOS SEGUNDA OPCIÓN': int(h.get('inscritos_segunda') or 0),
+            'CERTIFICADOS': int(h.get('certificados_sum') or 0),
+            # porcentaje como float 0-100 (más útil para cálculos), se puede formatear luego
+            'PORCENTAJE_CERTIFICADOS': (
+                (int(h.get('certificados_sum') or 0) / int(h.get('inscritos_sum') or 1)) * 100
+                if (int(h.get('inscritos_sum') or 0) > 0) else 0
+            ),
+            'RED DE CONOCIMIENTO': p.get('red_conocimiento') or ''
+        }
+
+        yield fila
+
+        # Fila adicional de alerta cuando certificados > 30% de inscritos
+        try:
+            pct = float(fila.get('PORCENTAJE_CERTIFICADOS') or 0)
+        except Exception:
+            pct = 0
+        if pct > 30:
+            alert_rows.append(_fila_alerta(fila))
+
+    # Añadir alertas al final
+    yield from alert_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--sintetico", type=int, default=0, help="Programas de una BD SQLite en memoria (0 = usar la BD configurada)")
+    args = parser.parse_args()
+
+    if args.sintetico:
+        db = crear_bd_sintetica(args.sintetico)
+    else:
+        from core.database import SessionLocal
+        db = SessionLocal()
+
+    try:
+        programas = db.execute(text("SELECT COUNT(*) FROM programas_formacion")).scalar()
+        print(f"{programas} programas de formación")
+        for nombre, construir in (
+            ("4 consultas en serie", lambda: sum(1 for _ in iter_unified_rows(db, paralelo=False))),
+            ("4 consultas paralelas", lambda: sum(1 for _ in iter_unified_rows(db))),
+            ("Consulta única", lambda: sum(1 for _ in iter_reporte_final(db))),
+        ):
+            filas = construir()
+            tiempo = medir(construir, args.repeticiones)
+            print(f"{nombre:<22} {tiempo:9.1f} ms   {filas} filas")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from core.config import settings
+
+try:
+    import redis
+except ImportError:  # Redis es opcional: sin él solo se usa la caché en proceso
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Marca de arranque del proceso: forma parte de las generaciones locales para que
+# un reinicio nunca reutilice claves (ni ETags) de la ejecución anterior
+INICIO_PROCESO = int(time.time())
+
+# Clave de `Session.info` donde se anotan las tablas modificadas por la sesión
+_CLAVE_TABLAS_MODIFICADAS = "tablas_modificadas"
+_PREFIJO_REDIS = "oferta:cache"
+
+
+class _CacheLRU:
+    """LRU en proceso, segura entre hilos, con caducidad por entrada."""
+
+    def __init__(self, max_entradas: int, ttl: int):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str):
+        """Devuelve (encontrado, valor)."""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return False, None
+            valor, _, expira = entrada
+            if expira < time.monotonic():
+                del self._entradas[clave]
+                return False, None
+            self._entradas.move_to_end(clave)
+            return True, valor
+
+    def guardar(self, clave: str, valor: Any, tablas: Iterable[str]) -> None:
+        with self._lock:
+            self._entradas[clave] = (valor, frozenset(tablas), time.monotonic() + self.ttl)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def descartar_tabla(self, tabla: str) -> int:
+        """Elimina las entradas que dependen de `tabla`; devuelve cuántas eran."""
+        with self._lock:
+            claves = [clave for clave, (_, tablas, _) in self._entradas.items() if tabla in tablas]
+            for clave in claves:
+                del self._entradas[clave]
+            return len(claves)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+
+_lru = _CacheLRU(settings.CACHE_MAX_ENTRADAS, settings.CACHE_TTL_SEGUNDOS)
+_generaciones: Dict[str, int] = {}
+_metricas = {"aciertos_local": 0, "aciertos_compartido": 0, "fallos": 0, "invalidaciones": 0, "errores_compartido": 0}
+_lock = threading.Lock()
+# Funciones a las que se avisa cada vez que cambia la generación de alguna tabla
+_suscriptores: List[Callable[[Tuple[str, ...]], None]] = []
+
+_redis = None
+if settings.CACHE_REDIS_URL:
+    if redis is None:
+        logger.warning("CACHE_REDIS_URL está definido pero el paquete 'redis' no está instalado; se usa solo la caché local")
+    else:
+        _redis = redis.Redis.from_url(settings.CACHE_REDIS_URL, socket_timeout=1)
+
+
+def _contar(metrica: str) -> None:
+    with _lock:
+        _metricas[metrica] += 1
+
+
+def _error_compartido(e: Exception) -> None:
+    _contar("errores_compartido")
+    logger.warning(f"Caché compartida no disponible, se continúa solo con la local: {e}")
+
+
+# -----------------------------------------------------
+# Generaciones por tabla
+# -----------------------------------------------------
+def generaciones(tablas: Iterable[str]) -> Dict[str, str]:
+    """
+    Token de generación actual de cada tabla. Cambia cada vez que se confirma
+    (commit) una escritura marcada con `marcar_modificadas` sobre la tabla.
+    """
+    tablas = sorted(set(tablas))
+    if _redis is not None:
+        try:
+            valores = _redis.mget([f"{_PREFIJO_REDIS}:gen:{tabla}" for tabla in tablas])
+            return {tabla: f"r{int(valor or 0)}" for tabla, valor in zip(tablas, valores)}
+        except Exception as e:
+            _error_compartido(e)
+    with _lock:
+        return {tabla: f"{INICIO_PROCESO}.{_generaciones.get(tabla, 0)}" for tabla in tablas}
+
+
+def incrementar_generacion(*tablas: str) -> None:
+    """Invalida todo lo cacheado que depende de `tablas`."""
+    for tabla in tablas:
+        with _lock:
+            _generaciones[tabla] = _generaciones.get(tabla, 0) + 1
+            _metricas["invalidaciones"] += 1
+        _lru.descartar_tabla(tabla)
+        if _redis is not None:
+            try:
+                _redis.incr(f"{_PREFIJO_REDIS}:gen:{tabla}")
+            except Exception as e:
+                _error_compartido(e)
+    for suscriptor in list(_suscriptores):
+        try:
+            suscriptor(tablas)
+        except Exception:
+            logger.exception(f"Error notificando la invalidación de {', '.join(tablas)}")
+
+
+def suscribir_invalidaciones(funcion: Callable[[Tuple[str, ...]], None]) -> None:
+    """
+    Registra `funcion(tablas)` para que se llame tras cada `incrementar_generacion`
+    de este proceso (p. ej. para regenerar snapshots). Debe ser rápida: corre en
+    el hilo que confirmó la transacción.
+    """
+    _suscriptores.append(funcion)
+
+
+def marcar_modificadas(db: Session, *tablas: str) -> None:
+    """
+    Anota en la sesión que va a escribir en `tablas`. Al confirmar la transacción
+    se incrementa la generación de cada una (ver `_al_confirmar`).
+
+    La marca dura lo que la sesión: todos los commits posteriores vuelven a
+    invalidar, lo que cubre las cargas que confirman por bloques.
+    """
+    db.info.setdefault(_CLAVE_TABLAS_MODIFICADAS, set()).update(tablas)
+
+
+@event.listens_for(Session, "after_commit")
+def _al_confirmar(session: Session) -> None:
+    tablas = session.info.get(_CLAVE_TABLAS_MODIFICADAS)
+    if tablas:
+        incrementar_generacion(*sorted(tablas))
+
+
+# -----------------------------------------------------
+# Consulta con caché
+# -----------------------------------------------------
+def _clave(consulta: str, parametros: Dict[str, Any], generaciones_actuales: Dict[str, str]) -> str:
+    contenido = json.dumps(
+        {"p": jsonable_encoder(parametros), "g": generaciones_actuales}, sort_keys=True, separators=(",", ":")
+    )
+    return f"{_PREFIJO_REDIS}:{consulta}:{hashlib.sha1(contenido.encode()).hexdigest()}"
+
+
+def cache_consulta(consulta: str, tablas: Iterable[str], parametros: Dict[str, Any], calcular: Callable[[], Any]) -> Any:
+    """
+    Devuelve el resultado de `calcular()` cacheado por consulta, parámetros y
+    generación de las tablas de las que depende.
+
+    Args:
+        consulta: Nombre estable de la consulta (p. ej. "historico.consultar").
+        tablas: Tablas que lee la consulta; una carga sobre cualquiera la invalida.
+        parametros: Todo lo que cambia el resultado (filtros, campos, cursor...).
+        calcular: Función que ejecuta la consulta en la base de datos.
+    """
+    if not settings.CACHE_HABILITADA:
+        return calcular()
+
+    tablas = list(tablas)
+    clave = _clave(consulta, parametros, generaciones(tablas))
+
+    encontrado, valor = _lru.obtener(clave)
+    if encontrado:
+        _contar("aciertos_local")
+        return valor
+
+    if _redis is not None:
+        try:
+            guardado = _redis.get(clave)
+            if guardado is not None:
+                valor = json.loads(guardado)
+                _lru.guardar(clave, valor, tablas)
+                _contar("aciertos_compartido")
+                return valor
+        except Exception as e:
+            _error_compartido(e)
+
+    _contar("fallos")
+    valor = calcular()
+    _lru.guardar(clave, valor, tablas)
+    if _redis is not None:
+        try:
+            _redis.set(clave, json.dumps(jsonable_encoder(valor)), ex=settings.CACHE_TTL_SEGUNDOS)
+        except Exception as e:
+            _error_compartido(e)
+    return valor
+
+
+def etag_generaciones(recurso: str, tablas: Iterable[str]) -> str:
+    """
+    ETag débil de `recurso` (p. ej. ruta + query string) para los datos actuales
+    de `tablas`: cambia en cuanto se confirma una escritura sobre cualquiera.
+    """
+    contenido = json.dumps({"r": recurso, "g": generaciones(tablas)}, sort_keys=True)
+    return f'W/"{hashlib.sha1(contenido.encode()).hexdigest()[:32]}"'
+
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """Evalúa la cabecera If-None-Match (lista separada por comas, `*` o ETags débiles)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    propio = etag[2:] if etag.startswith("W/") else etag
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if (candidato[2:] if candidato.startswith("W/") else candidato) == propio:
+            return True
+    return False
+
+
+def metricas_cache() -> Dict[str, Any]:
+    """Contadores de aciertos/fallos y estado actual de la caché."""
+    with _lock:
+        metricas = dict(_metricas)
+        generaciones_locales = dict(_generaciones)
+    consultas = metricas["aciertos_local"] + metricas["aciertos_compartido"] + metricas["fallos"]
+    aciertos = metricas["aciertos_local"] + metricas["aciertos_compartido"]
+    return {
+        **metricas,
+        "tasa_aciertos": round(aciertos / consultas, 4) if consultas else None,
+        "entradas_local": len(_lru),
+        "max_entradas_local": _lru.max_entradas,
+        "backend_compartido": "redis" if _redis is not None else None,
+        "habilitada": settings.CACHE_HABILITADA,
+        "generaciones": generaciones_locales,
+    }
+
+
+def limpiar_cache() -> None:
+    """Vacía la caché local (las entradas compartidas caducan por TTL o generación)."""
+    _lru.limpiar()
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 
@@ -20,6 +21,30 @@ class Settings(BaseSettings):
     
     UPLOAD_DOCS: str = os.getenv("UPLOAD_DOCS", "static/docs")
 
+    # Carga del histórico con tabla temporal + LOAD DATA LOCAL INFILE (requiere local_infile=1 en el servidor)
+    HISTORICO_LOAD_DATA: bool = os.getenv("HISTORICO_LOAD_DATA", "false").lower() in ("1", "true", "si", "yes")
+
+    # Trabajos de carga en segundo plano
+    JOBS_MAX_WORKERS: int = int(os.getenv("JOBS_MAX_WORKERS", "2"))
+    JOBS_DIR: str = os.getenv("JOBS_DIR", os.path.join(tempfile.gettempdir(), "oferta_cargas"))
+
+    # Caché de resultados de consultas (LRU en proceso + Redis opcional compartido)
+    CACHE_HABILITADA: bool = os.getenv("CACHE_HABILITADA", "true").lower() in ("1", "true", "si", "yes")
+    CACHE_MAX_ENTRADAS: int = int(os.getenv("CACHE_MAX_ENTRADAS", "256"))
+    CACHE_TTL_SEGUNDOS: int = int(os.getenv("CACHE_TTL_SEGUNDOS", "3600"))
+    CACHE_REDIS_URL: str = os.getenv("CACHE_REDIS_URL", "")
+
+    # Hilos para ejecutar consultas independientes en paralelo (cada una con su conexión)
+    CONSULTAS_PARALELAS_WORKERS: int = int(os.getenv("CONSULTAS_PARALELAS_WORKERS", "4"))
+
+    # Snapshots de reportes en disco, uno por generación de datos
+    REPORTES_DIR: str = os.getenv("REPORTES_DIR", os.path.join(tempfile.gettempdir(), "oferta_reportes"))
+    REPORTES_VERSIONES: int = int(os.getenv("REPORTES_VERSIONES", "3"))
+    # Espera tras la última escritura antes de regenerar (las cargas confirman por bloques)
+    REPORTES_RETARDO_SEGUNDOS: float = float(os.getenv("REPORTES_RETARDO_SEGUNDOS", "30"))
+    # Máximo que una descarga espera al snapshot en curso antes de generar el reporte en vivo
+    REPORTES_ESPERA_SEGUNDOS: float = float(os.getenv("REPORTES_ESPERA_SEGUNDOS", "120"))
+
     DATABASE_URL: str = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     
     # Configuración JWT
@@ -0,0 +1,99 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql.elements import TextClause
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Consulta: sentencia sola o (sentencia, parámetros)
+Consulta = Union[TextClause, Tuple[TextClause, Mapping[str, Any]]]
+
+# Pool compartido por todos los pedidos: acota cuántas conexiones extra se toman
+# del pool de la base de datos a la vez
+_executor = ThreadPoolExecutor(max_workers=settings.CONSULTAS_PARALELAS_WORKERS, thread_name_prefix="consulta")
+
+
+def _separar(consulta: Consulta) -> Tuple[TextClause, Mapping[str, Any]]:
+    if isinstance(consulta, tuple):
+        return consulta
+    return consulta, {}
+
+
+def _ejecutar(conexion: Connection, consulta: Consulta) -> Tuple[List[Dict[str, Any]], float]:
+    sentencia, parametros = _separar(consulta)
+    inicio = time.perf_counter()
+    filas = [dict(fila) for fila in conexion.execute(sentencia, parametros).mappings().all()]
+    return filas, time.perf_counter() - inicio
+
+
+def _ejecutar_con_conexion(engine: Engine, consulta: Consulta) -> Tuple[List[Dict[str, Any]], float]:
+    # Conexión propia del pool; solo lectura, así que al cerrarla basta el rollback implícito
+    with engine.connect() as conexion:
+        return _ejecutar(conexion, consulta)
+
+
+def ejecutar_consultas(
+    bind: Union[Engine, Connection],
+    consultas: Mapping[str, Consulta],
+    paralelo: bool = True,
+    timeout: Optional[float] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Ejecuta consultas de solo lectura independientes entre sí y devuelve sus filas.
+
+    Con `paralelo` cada consulta corre en un hilo del pool compartido y en su
+    propia conexión del pool de `bind`, así que no ven cambios sin confirmar de
+    la sesión que las lanza. Sin `paralelo` se ejecutan en orden sobre `bind`.
+    Se registra en el log lo que tarda cada una.
+
+    No llamar desde una tarea del mismo pool: esperaría por hilos ocupados.
+
+    Args:
+        bind: Engine (o conexión, p. ej. `db.get_bind()`) de donde tomar conexiones.
+        consultas: {nombre: sentencia} o {nombre: (sentencia, parámetros)}.
+        paralelo: False para ejecutarlas una tras otra (p. ej. dentro de una transacción).
+        timeout: Segundos máximos de espera por todas las consultas.
+
+    Returns:
+        {nombre: [fila como dict, ...]} en el mismo orden que `consultas`.
+
+    Raises:
+        La excepción de la primera consulta que falle (o TimeoutError).
+    """
+    inicio = time.perf_counter()
+    paralelo = paralelo and len(consultas) > 1
+    if not paralelo:
+        resultados = {}
+        for nombre, consulta in consultas.items():
+            if isinstance(bind, Engine):
+                resultados[nombre] = _ejecutar_con_conexion(bind, consulta)
+            else:
+                resultados[nombre] = _ejecutar(bind, consulta)
+    else:
+        engine = bind.engine if isinstance(bind, Connection) else bind
+        futuros = {
+            nombre: _executor.submit(_ejecutar_con_conexion, engine, consulta)
+            for nombre, consulta in consultas.items()
+        }
+        limite = None if timeout is None else time.monotonic() + timeout
+        resultados = {}
+        try:
+            for nombre, futuro in futuros.items():
+                restante = None if limite is None else max(0.0, limite - time.monotonic())
+                resultados[nombre] = futuro.result(timeout=restante)
+        finally:
+            for futuro in futuros.values():
+                futuro.cancel()
+
+    logger.info(
+        f"{len(consultas)} consultas {'en paralelo' if paralelo else 'en serie'} en "
+        f"{(time.perf_counter() - inicio) * 1000:.1f} ms: "
+        + ", ".join(f"{nombre}={duracion * 1000:.1f} ms ({len(filas)} filas)"
+                    for nombre, (filas, duracion) in resultados.items())
+    )
+    return {nombre: filas for nombre, (filas, _) in resultados.items()}
@@ -24,7 +24,9 @@ engine = create_engine(
     pool_size=20,        # Número máximo de conexiones permanentes en el pool
     max_overflow=30,     # Conexiones adicionales permitidas temporalmente cuando el pool está lleno
     pool_timeout=30,     # Tiempo máximo de espera para obtener una conexión del pool
-    poolclass=QueuePool  # Clase de pool para manejo eficiente de conexiones
+    poolclass=QueuePool,  # Clase de pool para manejo eficiente de conexiones
+    # Permite LOAD DATA LOCAL INFILE desde el cliente solo si la carga por staging está activada
+    connect_args={"local_infile": settings.HISTORICO_LOAD_DATA},
 )
 
 # Crear la fábrica de sesiones
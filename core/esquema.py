@@ -0,0 +1,64 @@
+import logging
+import threading
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import NoSuchTableError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from core.cache import incrementar_generacion
+
+logger = logging.getLogger(__name__)
+
+# Registro de columnas por tabla: se consulta al esquema la primera vez que se
+# usa cada tabla y después se sirve desde memoria hasta `refrescar_esquema`
+_columnas: Dict[str, FrozenSet[str]] = {}
+_lock = threading.Lock()
+
+
+def columnas_tabla(db: Session, tabla: str) -> FrozenSet[str]:
+    """Columnas de `tabla` (vacío si no existe o no se pudo leer el esquema)."""
+    columnas = _columnas.get(tabla)
+    if columnas is not None:
+        return columnas
+
+    try:
+        columnas = frozenset(c["name"] for c in inspect(db.connection()).get_columns(tabla))
+    except NoSuchTableError:
+        columnas = frozenset()
+    except SQLAlchemyError as e:
+        # Sin guardar en el registro: se reintenta en la próxima consulta
+        logger.error(f"No se pudieron leer las columnas de {tabla}: {e}")
+        return frozenset()
+
+    with _lock:
+        _columnas[tabla] = columnas
+    logger.info(f"Esquema de {tabla} registrado: {len(columnas)} columnas")
+    return columnas
+
+
+def columnas_existentes(db: Session, tabla: str, candidatas: Iterable[str]) -> List[str]:
+    """Las `candidatas` que existen en `tabla`, en el mismo orden."""
+    columnas = columnas_tabla(db, tabla)
+    return [c for c in candidatas if c in columnas]
+
+
+def refrescar_esquema(tablas: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Olvida las columnas registradas de `tablas` (todas si es None) para que se
+    vuelvan a leer en el siguiente uso, e invalida lo cacheado sobre ellas.
+    Devuelve las tablas olvidadas.
+    """
+    with _lock:
+        olvidadas = list(_columnas) if tablas is None else [t for t in tablas if t in _columnas]
+        for tabla in olvidadas:
+            del _columnas[tabla]
+    if olvidadas:
+        incrementar_generacion(*olvidadas)
+    return olvidadas
+
+
+def esquema_registrado() -> Dict[str, List[str]]:
+    """Columnas registradas actualmente, por tabla."""
+    with _lock:
+        return {tabla: sorted(columnas) for tabla, columnas in _columnas.items()}
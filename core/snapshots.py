@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from core.cache import generaciones, suscribir_invalidaciones
+from core.config import settings
+from core.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class _Reporte:
+    """Reporte registrado: tablas de origen y función que lo escribe por bloques de bytes."""
+
+    def __init__(self, nombre: str, tablas: Iterable[str], generar: Callable[[Session], Iterable[bytes]], extension: str):
+        self.nombre = nombre
+        self.tablas = tuple(tablas)
+        self.generar = generar
+        self.extension = extension
+        self.temporizador: Optional[threading.Timer] = None
+
+
+class AlmacenSnapshots:
+    """
+    Guarda en disco una copia de cada reporte por versión de los datos.
+
+    La versión de un reporte se deriva de la generación de sus tablas de origen
+    (ver core/cache.py), así que cambia con cada escritura confirmada sobre
+    ellas. Cada versión se genera una sola vez, en un hilo aparte y con su propia
+    sesión, y las descargas se sirven desde el archivo. Se conservan las
+    `max_versiones` más recientes de cada reporte.
+    """
+
+    def __init__(self, directorio: str, max_versiones: int, retardo: float, max_workers: int = 1):
+        self.directorio = directorio
+        self.max_versiones = max(1, max_versiones)
+        self.retardo = retardo
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="snapshot")
+        self._reportes: Dict[str, _Reporte] = {}
+        self._en_curso: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        suscribir_invalidaciones(self._al_invalidar)
+
+    def registrar(
+        self,
+        nombre: str,
+        tablas: Iterable[str],
+        generar: Callable[[Session], Iterable[bytes]],
+        extension: str = ".xlsx",
+    ) -> None:
+        """
+        Args:
+            nombre: Identificador del reporte (forma parte del nombre de archivo).
+            tablas: Tablas de las que depende; una escritura en cualquiera crea una versión nueva.
+            generar: Función `(db) -> iterable de bytes` que produce el archivo.
+            extension: Extensión de los archivos guardados.
+        """
+        self._reportes[nombre] = _Reporte(nombre, tablas, generar, extension)
+
+    def version(self, nombre: str) -> str:
+        """Versión actual de los datos de `nombre` (cambia con la generación de sus tablas)."""
+        contenido = json.dumps(generaciones(self._reportes[nombre].tablas), sort_keys=True)
+        return hashlib.sha1(contenido.encode()).hexdigest()[:16]
+
+    def ruta(self, nombre: str, version: str) -> str:
+        return os.path.join(self.directorio, f"{nombre}-{version}{self._reportes[nombre].extension}")
+
+    def programar(self, nombre: str, version: Optional[str] = None) -> Future:
+        """Encola la generación de `version` (la actual si es None); si ya está en curso devuelve la misma."""
+        version = version or self.version(nombre)
+        clave = (nombre, version)
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            if futuro is None:
+                futuro = self._executor.submit(self._generar, nombre, version)
+                self._en_curso[clave] = futuro
+                futuro.add_done_callback(lambda _: self._terminar(clave))
+        return futuro
+
+    def obtener(self, nombre: str, espera: float) -> Tuple[Optional[str], str]:
+        """
+        Ruta del snapshot de la versión actual y la versión.
+
+        Si todavía no existe, encola su generación y espera hasta `espera`
+        segundos; si no termina a tiempo (o falla) la ruta es None y el llamador
+        decide cómo responder.
+        """
+        version = self.version(nombre)
+        ruta = self.ruta(nombre, version)
+        if os.path.exists(ruta):
+            return ruta, version
+        try:
+            self.programar(nombre, version).result(timeout=espera)
+        except FuturesTimeoutError:
+            logger.warning(f"El snapshot {nombre} {version} no estuvo listo en {espera} s")
+            return None, version
+        except Exception:
+            return None, version
+        return (ruta if os.path.exists(ruta) else None), version
+
+    def listar(self, nombre: str) -> List[Dict]:
+        """Snapshots guardados de `nombre`, el más reciente primero."""
+        reporte = self._reportes[nombre]
+        snapshots = []
+        for archivo in self._archivos(reporte):
+            ruta = os.path.join(self.directorio, archivo)
+            estado = os.stat(ruta)
+            snapshots.append({
+                "version": archivo[len(nombre) + 1:-len(reporte.extension)],
+                "bytes": estado.st_size,
+                "generado": estado.st_mtime,
+            })
+        return snapshots
+
+    def _archivos(self, reporte: _Reporte) -> List[str]:
+        try:
+            archivos = [
+                a for a in os.listdir(self.directorio)
+                if a.startswith(f"{reporte.nombre}-") and a.endswith(reporte.extension)
+            ]
+        except FileNotFoundError:
+            return []
+        return sorted(archivos, key=lambda a: os.path.getmtime(os.path.join(self.directorio, a)), reverse=True)
+
+    def _terminar(self, clave: Tuple[str, str]) -> None:
+        with self._lock:
+            self._en_curso.pop(clave, None)
+
+    def _generar(self, nombre: str, version: str) -> str:
+        reporte = self._reportes[nombre]
+        ruta = self.ruta(nombre, version)
+        if os.path.exists(ruta):
+            return ruta
+
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        inicio = time.perf_counter()
+        db = SessionLocal()
+        try:
+            with open(temporal, "wb") as destino:
+                for bloque in reporte.generar(db):
+                    destino.write(bloque)
+            # El archivo solo aparece completo: nadie sirve un snapshot a medio escribir
+            os.replace(temporal, ruta)
+        except Exception:
+            logger.exception(f"Error generando el snapshot {nombre} {version}")
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            raise
+        finally:
+            db.close()
+
+        logger.info(f"Snapshot {nombre} {version} generado en {time.perf_counter() - inicio:.1f} s")
+        self._podar(reporte)
+        return ruta
+
+    def _podar(self, reporte: _Reporte) -> None:
+        """Borra las versiones más antiguas que `max_versiones`."""
+        for archivo in self._archivos(reporte)[self.max_versiones:]:
+            try:
+                os.remove(os.path.join(self.directorio, archivo))
+            except OSError:
+                pass
+
+    def _al_invalidar(self, tablas: Tuple[str, ...]) -> None:
+        """
+        Programa la regeneración de los reportes que dependen de `tablas`. Se
+        espera `retardo` segundos desde la última escritura para no generar una
+        versión por cada bloque de una carga.
+        """
+        for reporte in list(self._reportes.values()):
+            if not set(tablas) & set(reporte.tablas):
+                continue
+            with self._lock:
+                if reporte.temporizador is not None:
+                    reporte.temporizador.cancel()
+                reporte.temporizador = threading.Timer(self.retardo, self.programar, args=(reporte.nombre,))
+                reporte.temporizador.daemon = True
+                reporte.temporizador.start()
+
+
+almacen_snapshots = AlmacenSnapshots(
+    directorio=settings.REPORTES_DIR,
+    max_versiones=settings.REPORTES_VERSIONES,
+    retardo=settings.REPORTES_RETARDO_SEGUNDOS,
+)
@@ -0,0 +1,156 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from core.config import settings
+from core.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Fases por las que pasa un trabajo de carga
+FASE_EN_COLA = "en_cola"
+FASE_PROCESANDO = "procesando"
+FASE_FINALIZADO = "finalizado"
+FASE_ERROR = "error"
+
+# Máximo de errores que se exponen mientras el trabajo está en curso
+MAX_ERRORES_PROGRESO = 50
+
+
+class Trabajo:
+    """Estado de un trabajo de carga en segundo plano."""
+
+    def __init__(self, tipo: str, nombre_archivo: Optional[str], ruta_archivo: str):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.nombre_archivo = nombre_archivo
+        self.ruta_archivo = ruta_archivo
+        self.fase = FASE_EN_COLA
+        self.filas_procesadas = 0
+        self.bloques_procesados = 0
+        self.errores: List[Any] = []
+        self.total_errores = 0
+        self.resumen: Optional[Dict[str, Any]] = None
+        self.creado = time.time()
+        self.inicio: Optional[float] = None
+        self.fin: Optional[float] = None
+
+    def actualizar_progreso(self, filas_leidas: int, bloques: int, resumen: Dict) -> None:
+        """Callback de `procesar_excel_por_bloques`: se llama al terminar cada bloque."""
+        self.filas_procesadas = filas_leidas
+        self.bloques_procesados = bloques
+        errores = resumen.get("errores") or []
+        self.total_errores = len(errores)
+        self.errores = list(errores[:MAX_ERRORES_PROGRESO])
+
+    def a_dict(self) -> Dict[str, Any]:
+        """Representación para el endpoint de consulta."""
+        referencia = self.fin or time.time()
+        duracion = (referencia - self.inicio) if self.inicio else 0.0
+        return {
+            "id": self.id,
+            "tipo": self.tipo,
+            "nombre_archivo": self.nombre_archivo,
+            "fase": self.fase,
+            "filas_procesadas": self.filas_procesadas,
+            "bloques_procesados": self.bloques_procesados,
+            "filas_por_segundo": round(self.filas_procesadas / duracion, 1) if duracion > 0 else 0.0,
+            "duracion_segundos": round(duracion, 3),
+            "total_errores": self.total_errores,
+            "errores": self.errores,
+            "resumen": self.resumen,
+        }
+
+
+class GestorTrabajos:
+    """
+    Ejecuta cargas en un pool acotado de hilos y guarda su estado en memoria.
+
+    El archivo subido se copia a disco antes de encolar el trabajo, de modo que
+    la petición HTTP termina de inmediato. Cada trabajo usa su propia sesión de
+    base de datos. Solo se conservan los `max_trabajos` más recientes.
+    """
+
+    def __init__(self, max_workers: int, directorio: str, max_trabajos: int = 200):
+        self.directorio = directorio
+        self.max_trabajos = max_trabajos
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="carga")
+        self._trabajos: "OrderedDict[str, Trabajo]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def guardar_archivo(self, origen, nombre_archivo: Optional[str]) -> str:
+        """Copia el contenido de `origen` (objeto tipo archivo) a un archivo temporal en disco."""
+        os.makedirs(self.directorio, exist_ok=True)
+        sufijo = os.path.splitext(nombre_archivo or "")[1] or ".xlsx"
+        fd, ruta = tempfile.mkstemp(prefix="carga_", suffix=sufijo, dir=self.directorio)
+        with os.fdopen(fd, "wb") as destino:
+            origen.seek(0)
+            shutil.copyfileobj(origen, destino)
+        return ruta
+
+    def encolar(self, tipo: str, origen, nombre_archivo: Optional[str], cargador: Callable[..., Dict]) -> Trabajo:
+        """
+        Persiste el archivo y encola la carga.
+
+        Args:
+            tipo: Nombre del cargador (histórico, estado de normas, ...).
+            origen: Objeto tipo archivo con el Excel (p. ej. `UploadFile.file`).
+            nombre_archivo: Nombre original del archivo.
+            cargador: Función `(db, ruta, progreso=...) -> dict` que hace la carga.
+        """
+        trabajo = Trabajo(tipo, nombre_archivo, self.guardar_archivo(origen, nombre_archivo))
+        with self._lock:
+            self._trabajos[trabajo.id] = trabajo
+            while len(self._trabajos) > self.max_trabajos:
+                self._trabajos.popitem(last=False)
+        self._executor.submit(self._ejecutar, trabajo, cargador)
+        logger.info(f"Trabajo {trabajo.id} ({tipo}) encolado")
+        return trabajo
+
+    def obtener(self, trabajo_id: str) -> Optional[Trabajo]:
+        with self._lock:
+            return self._trabajos.get(trabajo_id)
+
+    def listar(self) -> List[Trabajo]:
+        with self._lock:
+            return list(reversed(self._trabajos.values()))
+
+    def _ejecutar(self, trabajo: Trabajo, cargador: Callable[..., Dict]) -> None:
+        trabajo.fase = FASE_PROCESANDO
+        trabajo.inicio = time.time()
+        db = SessionLocal()
+        try:
+            resumen = cargador(db, trabajo.ruta_archivo, progreso=trabajo.actualizar_progreso)
+            trabajo.resumen = resumen
+            if isinstance(resumen, dict):
+                trabajo.filas_procesadas = resumen.get("filas_leidas", trabajo.filas_procesadas)
+                errores = resumen.get("errores") or []
+                trabajo.total_errores = len(errores)
+                trabajo.errores = list(errores[:MAX_ERRORES_PROGRESO])
+            trabajo.fase = FASE_FINALIZADO
+        except Exception as e:
+            db.rollback()
+            logger.exception(f"Trabajo {trabajo.id} ({trabajo.tipo}) falló")
+            trabajo.fase = FASE_ERROR
+            trabajo.errores.append(str(e))
+            trabajo.total_errores += 1
+        finally:
+            trabajo.fin = time.time()
+            db.close()
+            try:
+                os.remove(trabajo.ruta_archivo)
+            except OSError:
+                pass
+
+
+gestor_trabajos = GestorTrabajos(
+    max_workers=settings.JOBS_MAX_WORKERS,
+    directorio=settings.JOBS_DIR,
+)
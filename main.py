@@ -1,7 +1,7 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.router import usuarios, auth, reporte_final, programas_formacion, programas, historico, cargar_archivos_historico, estado_normas, catalogo, cargar_archivos_registro_calificado, registro_calificado, cargar_archivos
+from app.router import usuarios, auth, reporte_final, programas_formacion, programas, historico, cargar_archivos_historico, estado_normas, catalogo, cargar_archivos_registro_calificado, registro_calificado, cargar_archivos, trabajos, admin, facetas
 
 
 app = FastAPI()
@@ -19,7 +19,21 @@ app.include_router(registro_calificado.router, prefix="/registro_calificado", ta
 app.include_router(reporte_final.router, prefix="/reportes", tags=["Reporte Final"])
 app.include_router(usuarios.router, prefix="/usuario", tags=["servicios usuarios"])
 app.include_router(auth.router, prefix="/access", tags=["servicios de autenticación"])
+app.include_router(trabajos.router, prefix="/jobs", tags=["Trabajos de carga"])
+app.include_router(facetas.router, prefix="/facets", tags=["Facetas"])
+app.include_router(admin.router, prefix="/admin", tags=["Administración"])
 app.include_router(programas.router)
+
+
+@app.middleware("http")
+async def agregar_etag(request: Request, call_next):
+    """Agrega a la respuesta el ETag calculado por `condicional_por_tablas`."""
+    response = await call_next(request)
+    etag = getattr(request.state, "etag", None)
+    if etag and response.status_code == 200 and "etag" not in response.headers:
+        response.headers["ETag"] = etag
+    return response
+
 # Configuración de CORS para permitir todas las solicitudes desde cualquier origen
 app.add_middleware(
     CORSMiddleware,
@@ -27,6 +41,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],  # Permitir estos métodos HTTP
     allow_headers=["*"],  # Permitir cualquier encabezado en las solicitudes
+    expose_headers=["ETag", "X-Data-Version", "X-Next-Cursor"],  # El front necesita leer el ETag para enviar If-None-Match
 )
 
 @app.get("/")
@@ -175,3 +175,121 @@ CREATE TABLE IF NOT EXISTS `registro_calificado` (
 );
 
 
+-- Registro de archivos cargados: permite omitir la recarga de un Excel idéntico
+CREATE TABLE IF NOT EXISTS `registro_cargas` (
+    `id_carga` INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    `cargador` VARCHAR(40) NOT NULL,          -- historico, estado_normas, catalogo, ...
+    `sha256` CHAR(64) NOT NULL,
+    `nombre_archivo` VARCHAR(255),
+    `resumen` LONGTEXT,                       -- JSON con el resumen devuelto por el cargador
+    `fecha_carga` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY `uq_cargador_sha256` (`cargador`, `sha256`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+
+-- Huella (hash de las 36 columnas del Excel) de cada ficha en la última carga de histórico:
+-- permite la carga incremental (solo fichas nuevas o modificadas)
+CREATE TABLE IF NOT EXISTS `historico_huellas` (
+    `ficha` INT UNSIGNED PRIMARY KEY,
+    `huella` CHAR(16) NOT NULL,               -- hash de 64 bits en hexadecimal
+    `fecha_actualizacion` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+
+-- Tablas resumen del histórico: se recalculan al final de cada carga solo para las
+-- claves de las fichas cargadas (ver app/crud/resumenes.py); /admin/summaries/rebuild las reconstruye
+-- Totales por programa de formación
+CREATE TABLE IF NOT EXISTS `resumen_historico_programa` (
+    `cod_programa` VARCHAR(16) PRIMARY KEY,
+    `num_fichas` INT UNSIGNED NOT NULL DEFAULT 0,
+    `num_registros` INT UNSIGNED NOT NULL DEFAULT 0,
+    `cupo_asignado` INT UNSIGNED NOT NULL DEFAULT 0,
+    `num_aprendices_matriculados` INT UNSIGNED NOT NULL DEFAULT 0,
+    `num_aprendices_inscritos` INT NOT NULL DEFAULT 0,
+    `num_aprendices_en_transito` INT NOT NULL DEFAULT 0,
+    `num_aprendices_formacion` INT NOT NULL DEFAULT 0,
+    `num_aprendices_induccion` INT NOT NULL DEFAULT 0,
+    `num_aprendices_condicionados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_aplazados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_retirado_voluntario` INT NOT NULL DEFAULT 0,
+    `num_aprendices_cancelados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_reprobados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_no_aptos` INT NOT NULL DEFAULT 0,
+    `num_aprendices_reingresados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_por_certificar` INT NOT NULL DEFAULT 0,
+    `num_aprendices_certificados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_trasladados` INT NOT NULL DEFAULT 0,
+    `fecha_actualizacion` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Totales por centro de formación
+CREATE TABLE IF NOT EXISTS `resumen_historico_centro` (
+    `cod_centro` SMALLINT UNSIGNED PRIMARY KEY,
+    `num_fichas` INT UNSIGNED NOT NULL DEFAULT 0,
+    `num_registros` INT UNSIGNED NOT NULL DEFAULT 0,
+    `cupo_asignado` INT UNSIGNED NOT NULL DEFAULT 0,
+    `num_aprendices_matriculados` INT UNSIGNED NOT NULL DEFAULT 0,
+    `num_aprendices_inscritos` INT NOT NULL DEFAULT 0,
+    `num_aprendices_en_transito` INT NOT NULL DEFAULT 0,
+    `num_aprendices_formacion` INT NOT NULL DEFAULT 0,
+    `num_aprendices_induccion` INT NOT NULL DEFAULT 0,
+    `num_aprendices_condicionados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_aplazados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_retirado_voluntario` INT NOT NULL DEFAULT 0,
+    `num_aprendices_cancelados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_reprobados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_no_aptos` INT NOT NULL DEFAULT 0,
+    `num_aprendices_reingresados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_por_certificar` INT NOT NULL DEFAULT 0,
+    `num_aprendices_certificados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_trasladados` INT NOT NULL DEFAULT 0,
+    `fecha_actualizacion` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Totales por municipio
+CREATE TABLE IF NOT EXISTS `resumen_historico_municipio` (
+    `cod_municipio` CHAR(10) PRIMARY KEY,
+    `num_fichas` INT UNSIGNED NOT NULL DEFAULT 0,
+    `num_registros` INT UNSIGNED NOT NULL DEFAULT 0,
+    `cupo_asignado` INT UNSIGNED NOT NULL DEFAULT 0,
+    `num_aprendices_matriculados` INT UNSIGNED NOT NULL DEFAULT 0,
+    `num_aprendices_inscritos` INT NOT NULL DEFAULT 0,
+    `num_aprendices_en_transito` INT NOT NULL DEFAULT 0,
+    `num_aprendices_formacion` INT NOT NULL DEFAULT 0,
+    `num_aprendices_induccion` INT NOT NULL DEFAULT 0,
+    `num_aprendices_condicionados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_aplazados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_retirado_voluntario` INT NOT NULL DEFAULT 0,
+    `num_aprendices_cancelados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_reprobados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_no_aptos` INT NOT NULL DEFAULT 0,
+    `num_aprendices_reingresados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_por_certificar` INT NOT NULL DEFAULT 0,
+    `num_aprendices_certificados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_trasladados` INT NOT NULL DEFAULT 0,
+    `fecha_actualizacion` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Totales por mes de inicio de la ficha
+CREATE TABLE IF NOT EXISTS `resumen_historico_mes` (
+    `periodo` CHAR(7) PRIMARY KEY,              -- AAAA-MM de grupos.fecha_inicio
+    `num_fichas` INT UNSIGNED NOT NULL DEFAULT 0,
+    `num_registros` INT UNSIGNED NOT NULL DEFAULT 0,
+    `cupo_asignado` INT UNSIGNED NOT NULL DEFAULT 0,
+    `num_aprendices_matriculados` INT UNSIGNED NOT NULL DEFAULT 0,
+    `num_aprendices_inscritos` INT NOT NULL DEFAULT 0,
+    `num_aprendices_en_transito` INT NOT NULL DEFAULT 0,
+    `num_aprendices_formacion` INT NOT NULL DEFAULT 0,
+    `num_aprendices_induccion` INT NOT NULL DEFAULT 0,
+    `num_aprendices_condicionados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_aplazados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_retirado_voluntario` INT NOT NULL DEFAULT 0,
+    `num_aprendices_cancelados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_reprobados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_no_aptos` INT NOT NULL DEFAULT 0,
+    `num_aprendices_reingresados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_por_certificar` INT NOT NULL DEFAULT 0,
+    `num_aprendices_certificados` INT NOT NULL DEFAULT 0,
+    `num_aprendices_trasladados` INT NOT NULL DEFAULT 0,
+    `fecha_actualizacion` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,43 @@
+"""
+Base de datos SQLite en memoria con las tablas del join del histórico, para las
+pruebas y para `benchmarks/paginacion_historico.py`.
+"""
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+COLUMNAS_NUM = [
+    "num_aprendices_inscritos", "num_aprendices_en_transito", "num_aprendices_formacion",
+    "num_aprendices_induccion", "num_aprendices_condicionados", "num_aprendices_aplazados",
+    "num_aprendices_retirado_voluntario", "num_aprendices_cancelados", "num_aprendices_reprobados",
+    "num_aprendices_no_aptos", "num_aprendices_reingresados", "num_aprendices_por_certificar",
+    "num_aprendices_certificados", "num_aprendices_trasladados",
+]
+
+
+def crear_bd_sintetica(filas: int) -> Session:
+    """Crea en SQLite las tablas del join con `filas` registros de histórico."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE centros_formacion (cod_centro INTEGER PRIMARY KEY, cod_regional INTEGER, nombre_regional TEXT)"))
+        conn.execute(text(
+            "CREATE TABLE grupos (ficha INTEGER PRIMARY KEY, cod_programa TEXT, cod_centro INTEGER, modalidad TEXT, "
+            "jornada TEXT, etapa_ficha TEXT, estado_curso TEXT, fecha_inicio DATE, fecha_fin DATE, cod_municipio TEXT, "
+            "cod_estrategia TEXT, cupo_asignado INTEGER, num_aprendices_matriculados INTEGER, num_aprendices_activos INTEGER)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE historico (id_historico INTEGER PRIMARY KEY, id_grupo INTEGER, "
+            + ", ".join(f"{col} INTEGER" for col in COLUMNAS_NUM) + ")"
+        ))
+        conn.execute(text("INSERT INTO centros_formacion VALUES (9121, 66, 'RISARALDA')"))
+        conn.execute(
+            text("INSERT INTO grupos (ficha, cod_programa, cod_centro, jornada) VALUES (:ficha, '228106', 9121, 'DIURNA')"),
+            [{"ficha": ficha} for ficha in range(1, filas + 1)],
+        )
+        conn.execute(
+            text(f"INSERT INTO historico (id_grupo, {', '.join(COLUMNAS_NUM)}) VALUES (:id_grupo, {', '.join('3' for _ in COLUMNAS_NUM)})"),
+            [{"id_grupo": ficha} for ficha in range(1, filas + 1)],
+        )
+    return Session(engine)
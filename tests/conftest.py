@@ -0,0 +1,42 @@
+import os
+
+# core.config lee JWT_SECRET al importarse
+os.environ.setdefault("JWT_SECRET", "secreto-de-pruebas")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from core.database import get_db
+from core.security import create_access_token
+from tests.bd_sintetica import crear_bd_sintetica
+
+
+@pytest.fixture
+def db():
+    """SQLite en memoria con centros_formacion, grupos, historico y un usuario activo (id 1)."""
+    sesion = crear_bd_sintetica(20)
+    sesion.execute(text("CREATE TABLE rol (id_rol INTEGER PRIMARY KEY, nombre_rol TEXT)"))
+    sesion.execute(text(
+        "CREATE TABLE usuario (id_usuario INTEGER PRIMARY KEY, nombre_completo TEXT, num_documento TEXT, "
+        "correo TEXT, id_rol INTEGER, estado BOOLEAN, contra_encript TEXT)"
+    ))
+    sesion.execute(text("INSERT INTO rol VALUES (2, 'usuario')"))
+    sesion.execute(text("INSERT INTO usuario VALUES (1, 'Prueba', '1', 'prueba@sena.edu.co', 2, 1, '')"))
+    sesion.commit()
+    yield sesion
+    sesion.close()
+
+
+@pytest.fixture
+def cliente(db):
+    from main import app
+
+    app.dependency_overrides[get_db] = lambda: db
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def token():
+    return create_access_token({"sub": "1"})
@@ -0,0 +1,15 @@
+import pandas as pd
+
+from app.crud.cargar_archivos_catalogo import insertar_datos_en_bd
+from core.cache import generaciones
+
+
+def test_carga_de_catalogo_invalida_catalogo(db):
+    antes = generaciones(["catalogo", "programas_formacion"])
+
+    insertar_datos_en_bd(db, pd.DataFrame())
+    db.commit()
+
+    despues = generaciones(["catalogo", "programas_formacion"])
+    assert despues["catalogo"] != antes["catalogo"]
+    assert despues["programas_formacion"] == antes["programas_formacion"]
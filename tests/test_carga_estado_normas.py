@@ -0,0 +1,16 @@
+import pandas as pd
+
+from app.crud.cargar_archivos import insertar_estado_normas_lote
+from core.cache import generaciones
+
+
+def test_carga_de_estado_normas_invalida_programas(db):
+    # La carga crea programas placeholder, así que también cambia programas_formacion
+    antes = generaciones(["estado_de_normas", "programas_formacion"])
+
+    insertar_estado_normas_lote(db, pd.DataFrame())
+    db.commit()
+
+    despues = generaciones(["estado_de_normas", "programas_formacion"])
+    assert despues["estado_de_normas"] != antes["estado_de_normas"]
+    assert despues["programas_formacion"] != antes["programas_formacion"]
@@ -0,0 +1,108 @@
+import io
+
+from openpyxl import Workbook
+
+from app.router import cargar_archivos_historico as carga
+from app.router.cargar_archivos_historico import (
+    COLUMNAS_MAPEO_HISTORICO,
+    _normalizar_tipos_historico,
+    _renombrar_columnas_historico,
+)
+from app.utils.excel import leer_excel_con_encabezado
+
+
+def _excel(filas):
+    libro = Workbook()
+    hoja = libro.active
+    for fila in filas:
+        hoja.append(fila)
+    contenido = io.BytesIO()
+    libro.save(contenido)
+    contenido.seek(0)
+    return contenido
+
+
+def test_celdas_vacias_quedan_en_none():
+    encabezado = ["IDENTIFICADOR_FICHA", "CODIGO_REGIONAL", "NOMBRE_REGIONAL", "CODIGO_PROGRAMA",
+                  "TIPO_PROGRAMA", "NOMBRE_ESTADO", "DATOS"]
+    fuente = _excel([
+        encabezado,
+        [2501234, 66, "REGIONAL RISARALDA", 228106, "TITULADA", "EN EJECUCION", "CENTRO 1"],
+        [2501235, 66, "REGIONAL RISARALDA", None, None, None, None],
+        [2501236, 66, "REGIONAL RISARALDA", "   ", "  ", None, None],
+    ])
+
+    df, _ = leer_excel_con_encabezado(fuente, COLUMNAS_MAPEO_HISTORICO.keys())
+    df = _normalizar_tipos_historico(_renombrar_columnas_historico(df))
+
+    assert df["cod_programa"].tolist() == ["228106", None, None]
+    for columna in ("tipo_programa", "nombre_estado", "datos_centro"):
+        assert df[columna].iloc[1:].isna().all()
+        assert "None" not in df[columna].tolist()
+        assert "nan" not in df[columna].tolist()
+    # Las fichas sin programa no generan un programa "None"
+    assert df["cod_programa"].dropna().tolist() == ["228106"]
+
+
+ENCABEZADO_HUELLAS = ["IDENTIFICADOR_FICHA", "CODIGO_REGIONAL", "NOMBRE_REGIONAL", "NOMBRE_ESTADO"]
+FILAS_HUELLAS = [
+    [2501234, 66, "REGIONAL RISARALDA", "EN EJECUCION"],
+    [2501235, 66, "REGIONAL RISARALDA", "EN EJECUCION"],
+    [2501234, 66, "REGIONAL RISARALDA", "TERMINADA"],
+]
+
+
+refrescos = []
+
+
+def _cargar(monkeypatch, tamano_bloque, guardadas, modo_delta=False):
+    """Carga FILAS_HUELLAS con la BD simulada; devuelve las fichas enviadas a insertar."""
+    cargadas = []
+    refrescos.clear()
+
+    def insertar(db, df, fichas_reemplazadas=None, claves_resumenes=None):
+        cargadas.extend(int(f) for f in df["ficha"])
+        fichas_reemplazadas.update(int(f) for f in df["ficha"])
+        claves_resumenes.setdefault("programa", set()).add(f"previo-{len(cargadas)}")
+        return {"registros_insertados": len(df), "errores": []}
+
+    def refrescar(db, fichas, claves_previas):
+        refrescos.append((set(fichas), {nombre: set(v) for nombre, v in claves_previas.items()}))
+        return 1
+
+    monkeypatch.setattr(carga, "insertar_historico_completo_en_bd", insertar)
+    monkeypatch.setattr(carga, "obtener_huellas_historico", lambda db, fichas: dict(guardadas))
+    monkeypatch.setattr(carga, "refrescar_resumenes_historico", refrescar)
+    monkeypatch.setattr(carga, "guardar_huellas_historico", lambda db, huellas: guardadas.update(huellas))
+    resumen = carga.procesar_excel_historico(
+        None, _excel([ENCABEZADO_HUELLAS, *FILAS_HUELLAS]), tamano_bloque=tamano_bloque, modo_delta=modo_delta
+    )
+    return resumen, cargadas
+
+
+def test_huella_de_ficha_repartida_en_varios_bloques(monkeypatch):
+    en_un_bloque, en_bloques = {}, {}
+    _cargar(monkeypatch, 10, en_un_bloque)
+    resumen, _ = _cargar(monkeypatch, 1, en_bloques)
+
+    assert resumen["bloques_procesados"] == 3
+    assert en_bloques == en_un_bloque
+    assert set(en_bloques) == {2501234, 2501235}
+
+
+def test_modo_delta_omite_fichas_repartidas_sin_cambios(monkeypatch):
+    guardadas = {}
+    _cargar(monkeypatch, 1, guardadas)
+
+    resumen, cargadas = _cargar(monkeypatch, 1, guardadas, modo_delta=True)
+
+    assert cargadas == []
+    assert (resumen["fichas_nuevas"], resumen["fichas_modificadas"], resumen["fichas_sin_cambios"]) == (0, 0, 2)
+
+
+def test_resumenes_se_recalculan_una_vez_al_final(monkeypatch):
+    resumen, _ = _cargar(monkeypatch, 1, {})
+
+    assert resumen["bloques_procesados"] == 3
+    assert refrescos == [({2501234, 2501235}, {"programa": {"previo-1", "previo-2", "previo-3"}})]
+    assert resumen["resumenes_recalculados"] == 1
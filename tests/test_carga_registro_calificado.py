@@ -0,0 +1,32 @@
+import pandas as pd
+from sqlalchemy import text
+
+from app.crud import cargar_archivos_registro_calificado as carga
+
+
+def _registros(numero_resolucion, fecha_resolucion):
+    return pd.DataFrame([{
+        "cod_programa": 228106, "tipo_tramite": "RENOVACIÓN", "numero_resolucion": numero_resolucion,
+        "fecha_resolucion": fecha_resolucion, "modalidad": "PRESENCIAL",
+    }])
+
+
+def test_cada_carga_agrega_una_resolucion(db, monkeypatch):
+    # `IN :claves` con tupla es de PyMySQL; en SQLite se responde la existencia directamente
+    monkeypatch.setattr(carga, "consultar_claves_existentes", lambda *_: {"228106"})
+    db.execute(text("CREATE TABLE programas_formacion (cod_programa TEXT PRIMARY KEY, nombre_programa TEXT, estado BOOLEAN)"))
+    db.execute(text(
+        "CREATE TABLE registro_calificado (id INTEGER PRIMARY KEY, cod_programa TEXT, tipo_tramite TEXT, "
+        "numero_resolucion INTEGER, fecha_resolucion DATE, modalidad TEXT)"
+    ))
+    db.execute(text("INSERT INTO programas_formacion VALUES ('228106', 'PROGRAMA', 1)"))
+    db.commit()
+
+    primera = carga.insertar_registro_calificado_en_bd(db, _registros(1234, "2018-03-01"))
+    segunda = carga.insertar_registro_calificado_en_bd(db, _registros(5678, "2024-03-01"))
+
+    assert (primera["insertados"], segunda["insertados"], segunda["actualizados"]) == (1, 1, 0)
+    resoluciones = db.execute(text(
+        "SELECT numero_resolucion FROM registro_calificado WHERE cod_programa = '228106' ORDER BY id"
+    )).scalars().all()
+    assert resoluciones == [1234, 5678]
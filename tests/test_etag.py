@@ -0,0 +1,27 @@
+import pytest
+
+URL = "/historico/obtener-todos?limit=5"
+
+
+def test_get_condicional_autenticado_responde_304(cliente, token):
+    auth = {"Authorization": f"Bearer {token}"}
+    respuesta = cliente.get(URL, headers=auth)
+    assert respuesta.status_code == 200
+    etag = respuesta.headers["etag"]
+
+    respuesta = cliente.get(URL, headers={**auth, "If-None-Match": etag})
+    assert respuesta.status_code == 304
+
+
+@pytest.mark.parametrize("autorizacion", [None, "Bearer token-invalido"])
+@pytest.mark.parametrize("if_none_match", ["*", "etag-valido"])
+def test_get_condicional_sin_token_valido_responde_401(cliente, token, autorizacion, if_none_match):
+    if if_none_match == "etag-valido":
+        if_none_match = cliente.get(URL, headers={"Authorization": f"Bearer {token}"}).headers["etag"]
+    headers = {"If-None-Match": if_none_match}
+    if autorizacion:
+        headers["Authorization"] = autorizacion
+
+    respuesta = cliente.get(URL, headers=headers)
+    assert respuesta.status_code == 401
+    assert "etag" not in respuesta.headers
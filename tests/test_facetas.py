@@ -0,0 +1,39 @@
+from sqlalchemy import text
+
+from app.crud.facetas import calcular_facetas
+from core.esquema import refrescar_esquema
+
+
+def test_facetas_por_columna_con_orden_de_la_bd(db):
+    db.execute(text(
+        "CREATE TABLE programas_formacion (cod_programa TEXT, nivel_formacion TEXT, tipo_formacion TEXT, "
+        "red_conocimiento TEXT, estado BOOLEAN)"
+    ))
+    db.execute(text(
+        "INSERT INTO programas_formacion VALUES "
+        "('1', 'TECNÓLOGO', 'TITULADA', 'INFORMÁTICA', 1), ('2', 'TÉCNICO', 'TITULADA', NULL, 0), "
+        "('3', 'TECNÓLOGO', NULL, 'INFORMÁTICA', NULL), ('4', 'AUXILIAR', 'COMPLEMENTARIA', 'AMBIENTAL', 1)"
+    ))
+    db.commit()
+    refrescar_esquema(["programas_formacion"])
+
+    facetas = calcular_facetas(db, "programas_formacion")
+
+    assert facetas["nivel"] == [
+        {"valor": "AUXILIAR", "total": 1}, {"valor": "TECNÓLOGO", "total": 2}, {"valor": "TÉCNICO", "total": 1},
+    ]
+    assert [f["valor"] for f in facetas["red_conocimiento"]] == ["AMBIENTAL", "INFORMÁTICA"]
+    # /valores-estado conserva los nulos y el orden descendente
+    assert [f["valor"] for f in facetas["estado"]] == [1, 0, None]
+
+
+def test_valores_estado_incluye_nulos(db, cliente):
+    db.execute(text("CREATE TABLE programas_formacion (cod_programa TEXT, estado BOOLEAN)"))
+    db.execute(text("INSERT INTO programas_formacion VALUES ('1', 1), ('2', NULL), ('3', 0)"))
+    db.commit()
+    refrescar_esquema(["programas_formacion"])
+
+    respuesta = cliente.get("/programas_formacion/valores-estado")
+
+    assert respuesta.status_code == 200
+    assert respuesta.json() == [True, False, None]
@@ -0,0 +1,57 @@
+from sqlalchemy import text
+
+
+def test_obtener_todos_con_skip_respeta_fields(cliente, token):
+    auth = {"Authorization": f"Bearer {token}"}
+
+    respuesta = cliente.get("/historico/obtener-todos?skip=2&limit=3&fields=ficha,id_historico", headers=auth)
+
+    assert respuesta.status_code == 200
+    filas = respuesta.json()
+    assert len(filas) == 3
+    assert all(set(fila) == {"ficha", "id_historico"} for fila in filas)
+    assert filas[0]["id_historico"] == 3
+
+
+def test_obtener_todos_con_skip_rechaza_fields_desconocidos(cliente, token):
+    auth = {"Authorization": f"Bearer {token}"}
+
+    respuesta = cliente.get("/historico/obtener-todos?skip=2&fields=no_existe", headers=auth)
+
+    assert respuesta.status_code == 400
+
+
+def test_obtener_todos_devuelve_lista_y_cursor_en_cabecera(cliente, token):
+    auth = {"Authorization": f"Bearer {token}"}
+
+    primera = cliente.get("/historico/obtener-todos?limit=15", headers=auth)
+    assert primera.status_code == 200
+    assert isinstance(primera.json(), list) and len(primera.json()) == 15
+
+    cursor = primera.headers["x-next-cursor"]
+    segunda = cliente.get(f"/historico/obtener-todos?limit=15&cursor={cursor}", headers=auth)
+    assert segunda.status_code == 200
+    assert segunda.json()[0]["id_historico"] == primera.json()[-1]["id_historico"] + 1
+    assert "x-next-cursor" not in segunda.headers
+
+
+def test_obtener_todos_por_defecto_devuelve_hasta_5000_filas(cliente, token):
+    respuesta = cliente.get("/historico/obtener-todos", headers={"Authorization": f"Bearer {token}"})
+
+    assert respuesta.status_code == 200
+    assert isinstance(respuesta.json(), list)
+    assert "x-next-cursor" not in respuesta.headers
+
+
+def test_agregados_responde_400_si_supera_limit(cliente, db, token):
+    db.execute(text("UPDATE grupos SET jornada = 'NOCTURNA' WHERE ficha > 10"))
+    db.commit()
+    auth = {"Authorization": f"Bearer {token}"}
+    url = "/historico/agregados?agrupar=jornada&medida=count"
+
+    recortada = cliente.get(f"{url}&limit=1", headers=auth)
+    completa = cliente.get(f"{url}&limit=2", headers=auth)
+
+    assert recortada.status_code == 400
+    assert completa.status_code == 200
+    assert [(f["jornada"], f["total_registros"]) for f in completa.json()] == [("DIURNA", 10), ("NOCTURNA", 10)]